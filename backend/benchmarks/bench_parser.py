@@ -0,0 +1,129 @@
+"""Compare the two-tier telegraf.conf parser with the full-tomlkit path.
+
+Usage (from backend/):
+    python -m benchmarks.bench_parser --nodes 5000 --devices 5
+    python -m benchmarks.bench_parser --nodes 60000 --devices 20 --no-legacy
+
+The full-tomlkit path grows much faster than linearly; use --no-legacy to time
+only the two-tier parser on very large configs.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+
+def make_config(n_nodes: int, n_devices: int, grouped_share: float = 0.5) -> str:
+    """Synthetic legacy config: influx outputs, OPC UA inputs and passthrough plugins."""
+    lines = [
+        "# Legacy Telegraf configuration",
+        "[global_tags]",
+        '  site = "plant-1"',
+        "",
+        "[agent]",
+        '  interval = "10s"',
+        "  metric_batch_size = 1000",
+        "",
+        "[[outputs.influxdb_v2]]",
+        '  urls = ["http://influxdb:8086"]',
+        '  token = "secret"',
+        '  organization = "acme"',
+        '  bucket = "plant"',
+        "",
+        "[[outputs.file]]",
+        '  files = ["stdout"]',
+        '  data_format = """influx"""',
+        "",
+        "[[inputs.cpu]]",
+        "  percpu = true",
+        "  totalcpu = true",
+        "",
+    ]
+    per_device = max(1, n_nodes // max(1, n_devices))
+    for d in range(n_devices):
+        lines += [
+            "[[inputs.opcua]]",
+            f'  name = "plc_{d}"',
+            f'  endpoint = "opc.tcp://plc-{d}:4840"',
+            '  security_policy = "None"',
+        ]
+        n_grouped = int(per_device * grouped_share)
+        lines.append("  nodes = [")
+        for i in range(per_device - n_grouped):
+            lines.append(
+                f'    {{name = "Tag_{d}_{i}", namespace = "2", identifier_type = "s", '
+                f'identifier = "Line{i // 100}.Tag{i}", tags = {{measurement = "m{d}"}}}},'
+            )
+        lines.append("  ]")
+        for g in range(0, n_grouped, 500):
+            lines += [
+                "  [[inputs.opcua.group]]",
+                f'    name = "group_{d}_{g}"',
+                '    namespace = "3"',
+                '    identifier_type = "i"',
+                "    nodes = [",
+            ]
+            for i in range(g, min(g + 500, n_grouped)):
+                lines.append(f'      {{name = "G_{i}", identifier = "{1000 + i}"}},')
+            lines.append("    ]")
+        lines.append("")
+    lines += [
+        "[[processors.rename]]",
+        "  [[processors.rename.replace]]",
+        '    field = "value"',
+        '    dest = "val"',
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _measure(fn, text: str, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_s": statistics.median(samples), "min_s": min(samples), "peak_mb": round(peak / 2**20, 1)}
+
+
+def run(n_nodes: int, n_devices: int, repeat: int, legacy: bool = True) -> dict:
+    from services.telegraf_parser import parse_telegraf_config, _parse_telegraf_config_tomlkit
+
+    text = make_config(n_nodes, n_devices)
+    fast = parse_telegraf_config(text)
+    results = {"two_tier": _measure(parse_telegraf_config, text, repeat)}
+    if legacy:
+        expected = _parse_telegraf_config_tomlkit(text)
+        if json.dumps(fast, sort_keys=True) != json.dumps(expected, sort_keys=True):
+            raise AssertionError("two-tier parser output differs from full tomlkit parse")
+        results["tomlkit"] = _measure(_parse_telegraf_config_tomlkit, text, repeat)
+        results["speedup"] = round(results["tomlkit"]["median_s"] / results["two_tier"]["median_s"], 2)
+    return {
+        "nodes": sum(len(d["tags"]) for d in fast["devices"]),
+        "devices": n_devices,
+        "bytes": len(text),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-legacy", action="store_true", help="skip the full-tomlkit path")
+    args = parser.parse_args(argv)
+    json.dump(run(args.nodes, args.devices, args.repeat, legacy=not args.no_legacy), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compare the Pydantic list responses with the ``?fast=true`` path.
+
+Usage (from backend/):
+    python -m benchmarks.bench_responses --tags 20000 --devices 200
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _setup_db(path: str, n_tags: int, n_devices: int):
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from database import Base, engine, SessionLocal
+    import models
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        sc = models.ScanClass(name="1s", interval_ms=1000, is_default=True)
+        inst = models.TelegrafInstance(name="default")
+        influx = models.InfluxDBConfig(name="influx", url="http://localhost:8086", token="t", bucket="b")
+        db.add_all([sc, inst, influx])
+        db.flush()
+        devices = [
+            models.Device(name=f"plc-{i:04d}", endpoint_url=f"opc.tcp://plc-{i}:4840",
+                          influxdb_config_id=influx.id, telegraf_instance_id=inst.id)
+            for i in range(n_devices)
+        ]
+        db.add_all(devices)
+        db.flush()
+        rows = [
+            {
+                "device_id": devices[0].id, "node_id": f"ns=2;s=Line{i // 100}.Tag{i}",
+                "namespace": 2, "identifier": f"Line{i // 100}.Tag{i}", "identifier_type": "s",
+                "display_name": f"Tag{i}", "path": f"Plant/Line{i // 100}/Tag{i}", "data_type": "i=11",
+                "measurement_name": "", "scan_class_id": sc.id, "telegraf_instance_id": inst.id,
+                "enabled": True,
+            }
+            for i in range(n_tags)
+        ]
+        db.bulk_insert_mappings(models.Tag, rows)
+        db.commit()
+        return devices[0].id
+    finally:
+        db.close()
+
+
+def _time(client, url: str, repeat: int) -> dict:
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(url)
+        samples.append(time.perf_counter() - start)
+        resp.raise_for_status()
+        size = len(resp.content)
+    return {"median_s": statistics.median(samples), "min_s": min(samples), "bytes": size}
+
+
+def run(n_tags: int, n_devices: int, repeat: int) -> dict:
+    tmp = tempfile.mkdtemp(prefix="fluxforge-bench-")
+    device_id = _setup_db(os.path.join(tmp, "bench.db"), n_tags, n_devices)
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routers import devices
+
+    app = FastAPI()
+    app.include_router(devices.router, prefix="/api")
+    client = TestClient(app)
+
+    results = {}
+    for label, url in [
+        ("get_device_tags", f"/api/devices/{device_id}/tags"),
+        ("list_devices", "/api/devices"),
+    ]:
+        slow = _time(client, url, repeat)
+        fast = _time(client, url + "?fast=true", repeat)
+        if json.loads(client.get(url).content) != json.loads(client.get(url + "?fast=true").content):
+            raise AssertionError(f"{label}: fast path output differs")
+        results[label] = {
+            "pydantic": slow,
+            "fast": fast,
+            "speedup": round(slow["median_s"] / fast["median_s"], 2),
+        }
+    return {"tags": n_tags, "devices": n_devices, "repeat": repeat, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=20000)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    json.dump(run(args.tags, args.devices, args.repeat), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Time the key FluxForge paths against a synthetic plant.
+
+Starts a local OPC UA server with a generated address space, builds a large
+SQLite fixture database and times:
+
+- OPC UA: ``scan_all_variables``, ``browse_node``, ``read_values``
+- config: loading an instance's tags, loading all devices for the legacy
+  config (against the old joined eager loading), rendering every instance
+  per instance and batched, ``generate_config_from_tags``, ``generate_config``,
+  ``parse_telegraf_config``, ``import_confirm``
+- API: ``get_metrics``, ``list_devices`` (Pydantic and ``?fast=true``)
+
+Results are written as JSON.  Pass ``--baseline`` with an earlier result file
+to flag regressions (median slower by more than ``--threshold``).
+
+Usage (from backend/):
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --variables 100000 --depth 3 --fanout 10 --devices 5000
+    python -m benchmarks.bench_suite --only config,api --output after.json --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+GROUPS = ("opcua", "config", "api")
+
+
+def _measure(fn, repeat: int, setup=None, **extra) -> dict:
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        fn(arg) if setup is not None else fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "max_s": max(samples),
+        "repeat": repeat,
+        **extra,
+    }
+
+
+def _bench_opcua(args, results: dict) -> dict:
+    from benchmarks.opcua_server import SyntheticServer
+    from services import opcua_service
+
+    with SyntheticServer(args.variables, args.depth, args.fanout) as server:
+        url = server.endpoint_url
+        read_ids = server.variable_ids[:args.read_nodes]
+        leaf = server.leaf_folder_ids[0]
+
+        nodes = []
+        results["scan_all_variables"] = _measure(
+            lambda: nodes.__setitem__(slice(None), opcua_service.scan_all_variables(url, max_depth=args.depth + 2)),
+            args.scan_repeat,
+        )
+        results["scan_all_variables"]["nodes"] = len(nodes)
+        results["scan_all_variables"]["nodes_per_s"] = len(nodes) / results["scan_all_variables"]["median_s"]
+        results["browse_node_root"] = _measure(lambda: opcua_service.browse_node(url), args.repeat)
+        results["browse_node_leaf"] = _measure(
+            lambda: opcua_service.browse_node(url, leaf), args.repeat,
+            children=len(opcua_service.browse_node(url, leaf)),
+        )
+        results["read_values"] = _measure(
+            lambda: opcua_service.read_values(url, read_ids), args.repeat, nodes=len(read_ids),
+        )
+        return {"variables": args.variables, "depth": args.depth, "fanout": args.fanout,
+                "leaf_folders": len(server.leaf_folder_ids), "build_s": server.build_s}
+
+
+def _bench_config(args, results: dict) -> None:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session, joinedload
+    from database import SessionLocal, Base
+    import models
+    import schemas
+    from benchmarks.bench_parser import make_config
+    from routers.system import _get_config_dict
+    from routers.telegraf import _import_config
+    from services import telegraf_generator, config_loading
+    from services.telegraf_parser import parse_telegraf_config
+
+    db = SessionLocal()
+    try:
+        inst = db.query(models.TelegrafInstance).order_by(models.TelegrafInstance.id).first()
+        system_cfg = _get_config_dict(db)
+        default_influx = db.query(models.InfluxDBConfig).filter(models.InfluxDBConfig.is_default == True).first()
+        default_sc = db.query(models.ScanClass).filter(models.ScanClass.is_default == True).first()
+
+        def load_tags():
+            db.expunge_all()
+            return config_loading.load_instance_tags(db, inst.id)
+
+        def load_devices_joined():
+            # The loading used before config_loading, kept as the reference
+            db.expunge_all()
+            return db.query(models.Device).options(
+                joinedload(models.Device.tags).joinedload(models.Tag.scan_class),
+                joinedload(models.Device.node_includes).joinedload(models.NodeInclude.scan_class),
+                joinedload(models.Device.influxdb_config),
+            ).filter(models.Device.enabled == True).order_by(models.Device.name).all()
+
+        def load_devices():
+            db.expunge_all()
+            return config_loading.load_devices(db)
+
+        tags = load_tags()
+        results["load_instance_tags"] = _measure(load_tags, args.repeat, tags=len(tags))
+        results["load_devices_joinedload"] = _measure(load_devices_joined, args.repeat)
+        devices = load_devices()
+        results["load_devices"] = _measure(load_devices, args.repeat, devices=len(devices))
+        results["generate_config_from_tags"] = _measure(
+            lambda: telegraf_generator.generate_config_from_tags(
+                tags, system_cfg, default_influx, scan_cache={}, default_scan_class=default_sc,
+            ),
+            args.repeat, tags=len(tags),
+        )
+        instance_ids = [i for (i,) in db.query(models.TelegrafInstance.id).order_by(models.TelegrafInstance.id)]
+
+        def render_per_instance():
+            db.expunge_all()
+            for instance_id in instance_ids:
+                telegraf_generator.generate_config_from_tags(
+                    config_loading.load_instance_tags(db, instance_id), system_cfg, default_influx,
+                    default_scan_class=default_sc,
+                )
+
+        def render_batched(processes=0):
+            rows = db.execute(config_loading.all_instance_tags_stmt(instance_ids)).all()
+            telegraf_generator.render_instances(
+                config_loading.group_instance_tags(rows), system_cfg,
+                config_loading.influx_target(default_influx), config_loading.scan_class_row(default_sc),
+                processes=processes,
+            )
+
+        results["render_all_per_instance"] = _measure(render_per_instance, args.repeat, instances=len(instance_ids))
+        results["render_all_batched"] = _measure(render_batched, args.repeat, instances=len(instance_ids))
+        if args.render_processes > 1:
+            render_batched(args.render_processes)  # start the pool outside the timing
+            results["render_all_batched_pool"] = _measure(
+                lambda: render_batched(args.render_processes), args.repeat,
+                instances=len(instance_ids), processes=args.render_processes,
+            )
+        results["generate_config"] = _measure(
+            lambda: telegraf_generator.generate_config(
+                devices, system_cfg, default_influx, scan_cache={}, default_scan_class=default_sc,
+            ),
+            args.repeat, devices=len(devices),
+        )
+    finally:
+        db.close()
+
+    text = make_config(args.parser_nodes, args.parser_devices)
+    parsed = parse_telegraf_config(text)
+    results["parse_telegraf_config"] = _measure(
+        lambda: parse_telegraf_config(text), args.repeat, nodes=args.parser_nodes, bytes=len(text),
+    )
+
+    payload = schemas.ImportConfirmRequest(
+        influxdb_configs=parsed["influxdb_configs"], devices=parsed["devices"],
+        passthrough_sections=parsed["passthrough_sections"],
+    )
+    tmp = tempfile.mkdtemp(prefix="fluxforge-import-")
+
+    def fresh_db():
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, f'import-{time.monotonic_ns()}.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = Session(engine)
+        db.add(models.ScanClass(name="1s", interval_ms=1000, is_default=True))
+        db.commit()
+        return db
+
+    def run_import(import_db):
+        try:
+            _import_config(payload, import_db)
+        finally:
+            import_db.close()
+
+    results["import_confirm"] = _measure(run_import, args.repeat, setup=fresh_db, nodes=args.parser_nodes)
+
+
+def _bench_api(args, results: dict) -> None:
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from routers import devices, metrics
+
+    app = FastAPI()
+    app.include_router(devices.router, prefix="/api")
+    app.include_router(metrics.router, prefix="/api")
+    with TestClient(app) as client:
+        for name, url in (
+            ("get_metrics", "/api/metrics"),
+            ("list_devices", "/api/devices"),
+            ("list_devices_fast", "/api/devices?fast=true"),
+        ):
+            client.get(url).raise_for_status()
+            results[name] = _measure(lambda: client.get(url).raise_for_status(), args.repeat)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Benchmarks whose median got slower than ``threshold`` x the baseline median."""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or not before.get("median_s"):
+            continue
+        ratio = current["median_s"] / before["median_s"]
+        if ratio > threshold:
+            regressions.append({
+                "name": name, "baseline_s": before["median_s"], "current_s": current["median_s"],
+                "ratio": round(ratio, 2),
+            })
+    return regressions
+
+
+def run(args) -> dict:
+    groups = set(args.only.split(",")) if args.only else set(GROUPS)
+    tmp = tempfile.mkdtemp(prefix="fluxforge-bench-")
+    # Must be set before the app modules (database, shared_state) are imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("DATA_DIR", tmp)
+    os.environ.setdefault("STATE_URL", "memory://")
+
+    from database import engine
+    from benchmarks.fixtures import build_fixture_db
+
+    meta = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+    start = time.perf_counter()
+    meta["fixture"] = build_fixture_db(
+        engine, args.devices, args.tags_per_device, args.instances,
+        includes_per_device=args.includes_per_device,
+    )
+    meta["fixture"]["build_s"] = time.perf_counter() - start
+
+    results: dict = {}
+    if "opcua" in groups:
+        meta["opcua_server"] = _bench_opcua(args, results)
+    if "config" in groups:
+        _bench_config(args, results)
+    if "api" in groups:
+        _bench_api(args, results)
+
+    out = {"meta": meta, "results": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            out["regressions"] = compare(results, json.load(f), args.threshold)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", default="", help=f"comma-separated groups: {','.join(GROUPS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--variables", type=int, default=5000, help="OPC UA server variables (up to 100k)")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--scan-repeat", type=int, default=1)
+    parser.add_argument("--read-nodes", type=int, default=2000)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--tags-per-device", type=int, default=50)
+    parser.add_argument("--instances", type=int, default=4)
+    parser.add_argument("--includes-per-device", type=int, default=1,
+                        help="branch subscriptions on every twentieth device")
+    parser.add_argument("--render-processes", type=int, default=0,
+                        help="also time batched rendering with this many worker processes")
+    parser.add_argument("--parser-nodes", type=int, default=5000)
+    parser.add_argument("--parser-devices", type=int, default=5)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="earlier result file to compare medians against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    out = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(out, f, indent=2)
+            f.write("\n")
+    else:
+        json.dump(out, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    if out.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Synthetic SQLite fixture databases for benchmarks.
+
+``build_fixture_db`` fills a database with scan classes, Telegraf instances,
+InfluxDB targets, devices and tags in the proportions of a large plant:
+devices spread round-robin over instances and targets, tags spread over scan
+classes, a share of them disabled, and branch subscriptions on one device
+in twenty.
+"""
+
+from typing import Dict
+
+
+def build_fixture_db(engine, devices: int = 1000, tags_per_device: int = 50, instances: int = 4,
+                     influx_targets: int = 2, disabled_share: float = 0.1,
+                     includes_per_device: int = 1) -> Dict:
+    """Create all tables on ``engine`` and fill them; returns the row counts."""
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+    from database import Base
+    import models
+
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        scan_classes = [
+            models.ScanClass(name=name, interval_ms=ms, is_default=(ms == 1000))
+            for name, ms in (("fast", 250), ("1s", 1000), ("10s", 10000), ("1m", 60000))
+        ]
+        insts = [models.TelegrafInstance(name=f"telegraf-{i}") for i in range(instances)]
+        influxes = [
+            models.InfluxDBConfig(name=f"influx-{i}", url=f"http://influx-{i}:8086", token="token",
+                                  org="acme", bucket=f"plant-{i}", is_default=(i == 0))
+            for i in range(influx_targets)
+        ]
+        db.add_all(scan_classes + insts + influxes)
+        db.flush()
+
+        device_rows = [
+            {
+                "name": f"plc-{d:05d}", "endpoint_url": f"opc.tcp://plc-{d}:4840",
+                "username": "", "password": "", "security_policy": "None", "enabled": True,
+                "influxdb_config_id": influxes[d % len(influxes)].id,
+                "telegraf_instance_id": insts[d % len(insts)].id,
+            }
+            for d in range(devices)
+        ]
+        db.execute(insert(models.Device), device_rows)
+        device_ids = [row[0] for row in db.query(models.Device.id).order_by(models.Device.id)]
+
+        disabled_every = int(1 / disabled_share) if disabled_share else 0
+        tag_rows = []
+        for d, device_id in enumerate(device_ids):
+            inst_id = insts[d % len(insts)].id
+            for t in range(tags_per_device):
+                identifier = f"Line{t // 100}.Tag{t}"
+                tag_rows.append({
+                    "device_id": device_id, "node_id": f"ns=2;s={identifier}", "namespace": 2,
+                    "identifier": identifier, "identifier_type": "s", "display_name": f"Tag{t}",
+                    "path": f"Plant/Line{t // 100}/Tag{t}", "data_type": "i=11",
+                    "measurement_name": f"line{t // 100}" if t % 3 == 0 else "",
+                    "scan_class_id": scan_classes[t % len(scan_classes)].id,
+                    "telegraf_instance_id": inst_id,
+                    "enabled": not (disabled_every and t % disabled_every == disabled_every - 1),
+                })
+            if len(tag_rows) >= 20000:
+                db.execute(insert(models.Tag), tag_rows)
+                tag_rows = []
+        if tag_rows:
+            db.execute(insert(models.Tag), tag_rows)
+
+        db.execute(insert(models.NodeInclude), [
+            {
+                "device_id": device_id, "parent_node_id": f"ns=2;s=Line{i}", "parent_path": f"Plant/Line{i}",
+                "namespace": 2, "identifier": f"Line{i}", "identifier_type": "s", "display_name": f"Line{i}",
+                "scan_class_id": scan_classes[1].id, "telegraf_instance_id": insts[d % len(insts)].id,
+                "enabled": True,
+            }
+            for d, device_id in enumerate(device_ids[:max(1, devices // 20)])
+            for i in range(includes_per_device)
+        ])
+        db.commit()
+    return {
+        "devices": devices,
+        "tags": devices * tags_per_device,
+        "instances": instances,
+        "influx_targets": influx_targets,
+    }
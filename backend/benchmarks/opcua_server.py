@@ -0,0 +1,174 @@
+"""Local asyncua server with a generated address space, for benchmarks.
+
+The address space is a folder tree ``depth`` levels deep with ``fanout``
+sub-folders per folder; ``variables`` variables are spread evenly over the
+leaf folders.  Nodes are created with batched AddNodes calls straight on the
+server session (100k variables take about a minute to build).
+
+Standalone (from backend/):
+    python -m benchmarks.opcua_server --variables 100000 --depth 3 --fanout 10
+"""
+
+import argparse
+import asyncio
+import logging
+import socket
+import threading
+import time
+from typing import List, Optional
+
+_BATCH = 2000
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SyntheticServer:
+    """Runs the server on its own thread and event loop; use as a context manager."""
+
+    def __init__(self, variables: int = 5000, depth: int = 3, fanout: int = 5, port: Optional[int] = None):
+        self.variables = variables
+        self.depth = depth
+        self.fanout = fanout
+        self.port = port or _free_port()
+        self.endpoint_url = f"opc.tcp://127.0.0.1:{self.port}/bench"
+        self.variable_ids: List[str] = []
+        self.leaf_folder_ids: List[str] = []
+        self.build_s = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _add_nodes(self, server, items) -> None:
+        for i in range(0, len(items), _BATCH):
+            results = await server.iserver.isession.add_nodes(items[i:i + _BATCH])
+            for res in results:
+                res.StatusCode.check()
+
+    @staticmethod
+    def _item(ua, parent, nodeid, name: str, node_class, attrs, ref, type_def):
+        item = ua.AddNodesItem()
+        item.RequestedNewNodeId = nodeid
+        item.BrowseName = ua.QualifiedName(name, nodeid.NamespaceIndex)
+        item.NodeClass = node_class
+        item.ParentNodeId = parent
+        item.ReferenceTypeId = ua.NodeId(ref)
+        item.TypeDefinition = ua.NodeId(type_def)
+        attrs.DisplayName = ua.LocalizedText(name)
+        attrs.Description = ua.LocalizedText(name)
+        item.NodeAttributes = attrs
+        return item
+
+    async def _build(self, server, ns: int) -> None:
+        from asyncua import ua
+
+        folders = []
+        parents = [(ua.NodeId(ua.ObjectIds.ObjectsFolder), "")]
+        for level in range(self.depth):
+            children = []
+            for parent, key in parents:
+                for f in range(self.fanout):
+                    child_key = f"{key}.{f}" if key else str(f)
+                    nodeid = ua.NodeId(f"F{child_key}", ns)
+                    folders.append(self._item(
+                        ua, parent, nodeid, f"Folder{f}" if level else f"Area{f}", ua.NodeClass.Object,
+                        ua.ObjectAttributes(), ua.ObjectIds.Organizes, ua.ObjectIds.FolderType,
+                    ))
+                    children.append((nodeid, child_key))
+            parents = children
+        await self._add_nodes(server, folders)
+        self.leaf_folder_ids = [nodeid.to_string() for nodeid, _ in parents]
+
+        variants = [
+            lambda n: ua.Variant(float(n), ua.VariantType.Double),
+            lambda n: ua.Variant(n, ua.VariantType.Int32),
+            lambda n: ua.Variant(bool(n % 2), ua.VariantType.Boolean),
+        ]
+        data_types = [ua.ObjectIds.Double, ua.ObjectIds.Int32, ua.ObjectIds.Boolean]
+        items = []
+        for n in range(self.variables):
+            parent, _ = parents[n % len(parents)]
+            nodeid = ua.NodeId(f"V{n}", ns)
+            attrs = ua.VariableAttributes()
+            attrs.Value = variants[n % 3](n)
+            attrs.DataType = ua.NodeId(data_types[n % 3])
+            attrs.ValueRank = ua.ValueRank.Scalar
+            attrs.AccessLevel = ua.AccessLevel.CurrentRead.mask
+            attrs.UserAccessLevel = ua.AccessLevel.CurrentRead.mask
+            items.append(self._item(
+                ua, parent, nodeid, f"Var{n}", ua.NodeClass.Variable, attrs,
+                ua.ObjectIds.HasComponent, ua.ObjectIds.BaseDataVariableType,
+            ))
+            self.variable_ids.append(nodeid.to_string())
+        await self._add_nodes(server, items)
+
+    async def _serve(self) -> None:
+        from asyncua import Server
+
+        logging.getLogger("asyncua").setLevel(logging.WARNING)
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = Server()
+        await server.init()
+        server.set_endpoint(self.endpoint_url)
+        ns = await server.register_namespace("urn:fluxforge:bench")
+        start = time.perf_counter()
+        await self._build(server, ns)
+        self.build_s = time.perf_counter() - start
+        async with server:
+            self._ready.set()
+            await self._stop.wait()
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._serve())
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+
+    def start(self, timeout: float = 600) -> "SyntheticServer":
+        self._thread = threading.Thread(target=self._run, name="bench-opcua-server", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Synthetic OPC UA server did not start in time")
+        if self._error is not None:
+            raise RuntimeError(f"Synthetic OPC UA server failed: {self._error}")
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+    def __enter__(self) -> "SyntheticServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variables", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--port", type=int, default=4840)
+    args = parser.parse_args(argv)
+    server = SyntheticServer(args.variables, args.depth, args.fanout, args.port).start()
+    print(f"{server.endpoint_url}: {args.variables} variables in {len(server.leaf_folder_ids)} "
+          f"leaf folders (built in {server.build_s:.1f}s); Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
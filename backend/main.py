@@ -7,16 +7,16 @@ import threading
 import logging
 
 from sqlalchemy import inspect, text
-from database import engine, Base, SessionLocal
+from database import engine, async_engine, Base, SessionLocal
 import models  # noqa: F401 — ensures all models are registered
-from routers import system, devices, scan_classes, influxdb_config, metrics, telegraf, telegraf_instances, deployment
+from routers import system, devices, scan_classes, influxdb_config, metrics, telegraf, telegraf_instances, deployment, jobs, tags, search
+import profiling
 from services.opcua_certs import ensure_certs_exist
+from services import search_index
+from services.shared_state import locked
 
 logger = logging.getLogger(__name__)
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
-
 # Lightweight migrations for new columns on existing tables (SQLite)
 def _migrate():
     insp = inspect(engine)
@@ -43,6 +43,9 @@ def _migrate():
         if "telegraf_instance_id" not in cols:
             with engine.begin() as conn:
                 conn.execute(text("ALTER TABLE tags ADD COLUMN telegraf_instance_id INTEGER REFERENCES telegraf_instances(id)"))
+        # create_all only creates indexes together with their table
+        for index in models.Tag.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
 
     if "node_includes" in insp.get_table_names():
         cols = [c["name"] for c in insp.get_columns("node_includes")]
@@ -71,7 +74,11 @@ def _migrate():
         finally:
             db.close()
 
-_migrate()
+# Create all tables and migrate, one worker at a time
+with locked("startup-migrate", timeout=120):
+    Base.metadata.create_all(bind=engine)
+    _migrate()
+    search_index.ensure_schema(engine)
 
 # Generate OPC UA client certificate if it doesn't exist
 ensure_certs_exist()
@@ -93,16 +100,25 @@ app.add_middleware(
 # API routes
 app.include_router(system.router, prefix="/api")
 app.include_router(devices.router, prefix="/api")
+app.include_router(tags.router, prefix="/api")
+app.include_router(search.router, prefix="/api")
 app.include_router(scan_classes.router, prefix="/api")
 app.include_router(influxdb_config.router, prefix="/api")
 app.include_router(metrics.router, prefix="/api")
 app.include_router(telegraf.router, prefix="/api")
 app.include_router(telegraf_instances.router, prefix="/api")
 app.include_router(deployment.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+
+# Opt-in request profiling (PROFILE_REQUESTS=true), served under /api/profiling
+if profiling.ENABLED:
+    from routers import profiling as profiling_router
+    profiling.install(app, engines=[engine, async_engine.sync_engine])
+    app.include_router(profiling_router.router, prefix="/api")
 
 # Auto-scan devices with NodeIncludes on startup so tags are populated
 def _startup_scan():
-    """Background thread: scan devices that have branch subscriptions."""
+    """Background thread: scan the branch-subscription subtrees of devices that have them."""
     db = SessionLocal()
     try:
         device_ids = [
@@ -121,7 +137,7 @@ def _startup_scan():
             try:
                 devices._do_scan(
                     device.id, device.endpoint_url, device.username, device.password,
-                    security_policy=device.security_policy or "None",
+                    security_policy=device.security_policy or "None", scope="includes",
                 )
             except Exception as e:
                 logger.warning(f"Startup scan failed for {device.name}: {e}")
@@ -135,6 +151,11 @@ def on_startup():
     thread.start()
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await async_engine.dispose()
+
+
 # Serve built React frontend from /app/static
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 if os.path.isdir(STATIC_DIR):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -95,6 +95,17 @@ class Tag(Base):
     scan_class = relationship("ScanClass", back_populates="tags")
     telegraf_instance = relationship("TelegrafInstance")
 
+    # Keyset pagination walks these in (sort column, id) order; id is the
+    # rowid, which SQLite appends to every index entry
+    __table_args__ = (
+        Index("ix_tags_device_path", "device_id", "path"),
+        Index("ix_tags_device_display_name", "device_id", "display_name"),
+        Index("ix_tags_path", "path"),
+        Index("ix_tags_display_name", "display_name"),
+        Index("ix_tags_instance", "telegraf_instance_id", "device_id", "scan_class_id", "path"),
+        Index("ix_tags_scan_class", "scan_class_id"),
+    )
+
 
 class NodeInclude(Base):
     __tablename__ = "node_includes"
@@ -115,3 +126,20 @@ class NodeInclude(Base):
     device = relationship("Device", back_populates="node_includes")
     scan_class = relationship("ScanClass", back_populates="node_includes")
     telegraf_instance = relationship("TelegrafInstance")
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    type = Column(String, nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)
+    title = Column(String, default="")
+    progress = Column(Float, default=0.0)
+    message = Column(String, default="")
+    result = Column(Text, nullable=True)  # JSON
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,379 @@
+"""Opt-in request profiling (``PROFILE_REQUESTS=true``).
+
+When enabled, every API request records its wall time, the SQL statements it
+ran (count and time, from SQLAlchemy engine events), the time spent validating
+and serializing the response, and the time spent waiting on OPC UA servers.
+Per-route totals and a rolling top-N of the slowest requests, with their query
+lists, are served under ``/api/profiling``.  Statements repeated many times in
+one request are flagged, which is how N+1 loops show up.
+
+A sampling profiler can be armed for the next request(s) to a route; its
+output is in the collapsed-stack format understood by flamegraph.pl and
+speedscope.
+
+State is kept per worker process.
+"""
+
+import collections
+import contextvars
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+ENABLED = os.environ.get("PROFILE_REQUESTS", "false").lower() in ("1", "true", "yes")
+TOP_N = int(os.environ.get("PROFILE_TOP_N", "20"))
+SAMPLE_INTERVAL_S = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+
+# A statement run this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = 10
+_MAX_SQL_LEN = 500
+_MAX_SAMPLES = 10
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "request_profile", default=None,
+)
+
+
+def add_time(kind: str, seconds: float) -> None:
+    """Charge ``seconds`` of ``kind`` ("serialize", "opcua") to the current request, if profiled."""
+    profile = _current.get()
+    if profile is not None:
+        profile.times[kind] = profile.times.get(kind, 0.0) + seconds
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, route: str):
+        self.method = method
+        self.path = path
+        self.route = route
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self.wall_s = 0.0
+        self.sql_count = 0
+        self.sql_s = 0.0
+        self.times: Dict[str, float] = {}
+        # statement -> [count, total seconds], in first-executed order
+        self.queries: Dict[str, List] = {}
+
+    def add_query(self, statement: str, seconds: float) -> None:
+        self.sql_count += 1
+        self.sql_s += seconds
+        entry = self.queries.get(statement)
+        if entry is None:
+            self.queries[statement] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def repeated(self) -> List[Dict]:
+        return [
+            {"sql": sql[:_MAX_SQL_LEN], "count": count, "total_s": total}
+            for sql, (count, total) in self.queries.items() if count >= N_PLUS_ONE_THRESHOLD
+        ]
+
+    def to_dict(self) -> Dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started_at": self.started_at,
+            "wall_s": self.wall_s,
+            "sql_count": self.sql_count,
+            "sql_s": self.sql_s,
+            "serialize_s": self.times.get("serialize", 0.0),
+            "opcua_s": self.times.get("opcua", 0.0),
+            "queries": [
+                {"sql": sql[:_MAX_SQL_LEN], "count": count, "total_s": total}
+                for sql, (count, total) in self.queries.items()
+            ],
+            "n_plus_one": self.repeated(),
+        }
+
+
+class RouteStats:
+    def __init__(self, route: str):
+        self.route = route
+        self.count = 0
+        self.wall_s = 0.0
+        self.max_wall_s = 0.0
+        self.sql_count = 0
+        self.sql_s = 0.0
+        self.serialize_s = 0.0
+        self.opcua_s = 0.0
+        self.max_repeat = 0
+        self.repeated_sql: Optional[str] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        self.count += 1
+        self.wall_s += profile.wall_s
+        self.max_wall_s = max(self.max_wall_s, profile.wall_s)
+        self.sql_count += profile.sql_count
+        self.sql_s += profile.sql_s
+        self.serialize_s += profile.times.get("serialize", 0.0)
+        self.opcua_s += profile.times.get("opcua", 0.0)
+        for sql, (count, _) in profile.queries.items():
+            if count > self.max_repeat:
+                self.max_repeat, self.repeated_sql = count, sql[:_MAX_SQL_LEN]
+
+    def to_dict(self) -> Dict:
+        n = self.count or 1
+        return {
+            "route": self.route,
+            "count": self.count,
+            "total_s": self.wall_s,
+            "mean_s": self.wall_s / n,
+            "max_s": self.max_wall_s,
+            "mean_sql_count": self.sql_count / n,
+            "mean_sql_s": self.sql_s / n,
+            "mean_serialize_s": self.serialize_s / n,
+            "mean_opcua_s": self.opcua_s / n,
+            "max_statement_repeat": self.max_repeat,
+            "likely_n_plus_one": self.repeated_sql if self.max_repeat >= N_PLUS_ONE_THRESHOLD else None,
+        }
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of every thread running backend code at a fixed interval."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_S):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.samples = 0
+        self.stacks: collections.Counter = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            self.samples += 1
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                # Skip ourselves and shared-lock renewers
+                if thread_id == me or names.get(thread_id, "").startswith("lock-"):
+                    continue
+                stack = []
+                ours = False
+                while frame is not None:
+                    code = frame.f_code
+                    filename = code.co_filename
+                    if filename.startswith(_BACKEND_DIR) and "site-packages" not in filename:
+                        ours = True
+                    stack.append(f"{code.co_name} ({os.path.basename(filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                # Idle threads (event loop in select, pool workers waiting) have no backend frames
+                if ours:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    def __init__(self, top_n: int = TOP_N):
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._routes: Dict[str, RouteStats] = {}
+        self._slow: List = []  # min-heap of (wall_s, seq, profile dict)
+        self._seq = itertools.count()
+        self._armed: Dict[str, int] = {}
+        self._samples: collections.OrderedDict = collections.OrderedDict()
+
+    def record(self, profile: RequestProfile) -> None:
+        with self._lock:
+            stats = self._routes.get(profile.route)
+            if stats is None:
+                stats = self._routes[profile.route] = RouteStats(profile.route)
+            stats.add(profile)
+            if len(self._slow) < self.top_n or profile.wall_s > self._slow[0][0]:
+                item = (profile.wall_s, next(self._seq), profile.to_dict())
+                if len(self._slow) < self.top_n:
+                    heapq.heappush(self._slow, item)
+                else:
+                    heapq.heapreplace(self._slow, item)
+
+    def routes(self) -> List[Dict]:
+        with self._lock:
+            stats = [s.to_dict() for s in self._routes.values()]
+        return sorted(stats, key=lambda s: s["total_s"], reverse=True)
+
+    def slowest(self) -> List[Dict]:
+        with self._lock:
+            items = sorted(self._slow, reverse=True)
+        return [item[2] for item in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+            self._slow.clear()
+
+    # ── Sampling profiler ────────────────────────────────────────────────
+
+    def arm(self, route: str, count: int = 1) -> None:
+        """Sample the next ``count`` requests whose route template or path is ``route``."""
+        with self._lock:
+            self._armed[route] = count
+
+    def take_armed(self, route: str, path: str) -> bool:
+        with self._lock:
+            for key in (route, path):
+                remaining = self._armed.get(key)
+                if remaining:
+                    if remaining > 1:
+                        self._armed[key] = remaining - 1
+                    else:
+                        del self._armed[key]
+                    return True
+        return False
+
+    def add_sample(self, profile: RequestProfile, sampler: StackSampler) -> None:
+        sample_id = f"{int(profile.started_at * 1000)}-{next(self._seq)}"
+        with self._lock:
+            self._samples[sample_id] = {
+                "id": sample_id,
+                "route": profile.route,
+                "path": profile.path,
+                "wall_s": profile.wall_s,
+                "samples": sampler.samples,
+                "interval_ms": sampler.interval * 1000,
+                "collapsed": sampler.collapsed(),
+            }
+            while len(self._samples) > _MAX_SAMPLES:
+                self._samples.popitem(last=False)
+
+    def samples(self) -> List[Dict]:
+        with self._lock:
+            return [{k: v for k, v in s.items() if k != "collapsed"} for s in reversed(self._samples.values())]
+
+    def sample(self, sample_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._samples.get(sample_id)
+
+
+profiler = Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles each HTTP request into ``profiler``."""
+
+    def __init__(self, app, exclude_prefix: str = "/api/profiling"):
+        self.app = app
+        self.exclude_prefix = exclude_prefix
+
+    def _route_template(self, scope) -> str:
+        from starlette.routing import Match
+
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", scope["path"])
+        return scope["path"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], self._route_template(scope))
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+            await send(message)
+
+        sampler = None
+        if profiler.take_armed(profile.route, profile.path):
+            sampler = StackSampler()
+            sampler.start()
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.wall_s = time.perf_counter() - start
+            _current.reset(token)
+            if sampler is not None:
+                sampler.stop()
+                profiler.add_sample(profile, sampler)
+            # Long-lived event streams would swamp the slow-request list
+            if not streaming:
+                profiler.record(profile)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("profile_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    profile = _current.get()
+    if profile is not None:
+        profile.add_query(statement, elapsed)
+
+
+def _timed(fn, kind: str):
+    if getattr(fn, "_profiled", False):
+        return fn
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            add_time(kind, time.perf_counter() - start)
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def _timed_async(fn, kind: str):
+    if getattr(fn, "_profiled", False):
+        return fn
+
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            add_time(kind, time.perf_counter() - start)
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def install(app, engines) -> None:
+    """Add the middleware, hook SQL events and time response serialization."""
+    import fastapi.routing
+    from fastapi.responses import JSONResponse
+    from responses import FastJSONResponse
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    # Response-model validation + jsonable_encoder, then rendering to bytes
+    fastapi.routing.serialize_response = _timed_async(fastapi.routing.serialize_response, "serialize")
+    for cls in (JSONResponse, FastJSONResponse):
+        cls.render = _timed(cls.render, "serialize")
+
+    app.add_middleware(ProfilingMiddleware)
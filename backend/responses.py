@@ -0,0 +1,74 @@
+"""Fast JSON path for large list endpoints.
+
+Endpoints that can return tens of thousands of rows (tags, devices, instance
+configs) offer an opt-in ``?fast=true`` mode that skips per-row Pydantic
+validation: rows are built straight from SQL result tuples and encoded with
+orjson when it is installed (stdlib json otherwise).
+
+Polled endpoints also answer conditional GETs: ``etag`` builds a strong
+validator from version counters (see ``services.versions``) and
+``not_modified`` short-circuits with a 304 before anything is loaded or
+rendered.  Responses carry ``Cache-Control: no-cache``, so browsers keep the
+body and revalidate it on every request without any frontend changes.
+"""
+
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def result_rows(result) -> List[Dict[str, Any]]:
+    """Turn a column-projection Result into plain dicts keyed by column label."""
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def etag(*parts: Any) -> str:
+    """Strong ETag over ``parts`` (ids, version counters, representation flags)."""
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest() + '"'
+
+
+def not_modified(request: Request, tag: str) -> Optional[Response]:
+    """A 304 for ``tag`` if the client already holds it, else None.
+
+    Weak forms of the tag match too: nginx weakens ETags it gzips.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = [c.strip() for c in header.split(",")]
+    if "*" in candidates or tag in (c[2:] if c.startswith("W/") else c for c in candidates):
+        return Response(status_code=304, headers=etag_headers(tag))
+    return None
+
+
+def etag_headers(tag: str) -> Dict[str, str]:
+    return {"ETag": tag, "Cache-Control": "no-cache"}
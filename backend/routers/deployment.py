@@ -1,15 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from database import get_db
+from sqlalchemy.orm import Session
+from typing import Optional
+from database import get_db, SessionLocal
 import models
 import schemas
 from services.docker_service import docker_service, _sanitize_container_name
-from services import telegraf_generator
+from services import telegraf_generator, telegraf_metrics, config_loading, jobs
+from services.shared_state import shared_state
 from routers.system import _get_config_dict, _set_key
 from routers.devices import _scan_cache
+from routers.telegraf_instances import _validate_instance_tags
 
 router = APIRouter(prefix="/deployment", tags=["deployment"])
 
+# How long a deploy waits for another worker's deploy of the same instance
+DEPLOY_LOCK_TIMEOUT = 120
+
+
+def _deploy_lock(instance_id: int):
+    """Take the cross-worker lock serializing deploys/actions on one instance."""
+    lock = shared_state.lock(f"deploy:{instance_id}", ttl=60)
+    if not lock.acquire(timeout=DEPLOY_LOCK_TIMEOUT):
+        raise HTTPException(status_code=409, detail="Another deployment of this instance is in progress")
+    return lock
+
 
 def _get_default_influxdb(db: Session):
     return db.query(models.InfluxDBConfig).filter(
@@ -38,6 +52,9 @@ def _get_deployment_settings(db: Session) -> dict:
         "docker_tls_ca_path": cfg.get("docker_tls_ca_path", ""),
         "docker_tls_cert_path": cfg.get("docker_tls_cert_path", ""),
         "docker_tls_key_path": cfg.get("docker_tls_key_path", ""),
+        "telegraf_internal_metrics": cfg.get("telegraf_internal_metrics", "false").lower() == "true",
+        "telegraf_metrics_base_port": int(cfg.get("telegraf_metrics_base_port", "9273")),
+        "telegraf_metrics_host": cfg.get("telegraf_metrics_host", ""),
     }
 
 
@@ -71,10 +88,6 @@ def get_deployment_status(db: Session = Depends(get_db)):
             "started_at": None,
             "image": None,
         }
-        tag_count = db.query(models.Tag).join(models.Device).filter(
-            models.Device.telegraf_instance_id == inst.id,
-            models.Tag.enabled == True,
-        ).count()
         container_statuses.append(schemas.ContainerStatusOut(
             instance_id=inst.id,
             instance_name=inst.name,
@@ -92,7 +105,8 @@ def get_deployment_status(db: Session = Depends(get_db)):
 
 
 @router.post("/instances/{instance_id}/deploy")
-def deploy_instance(instance_id: int, db: Session = Depends(get_db)):
+def deploy_instance(instance_id: int, validate: bool = False, disable_broken: bool = False,
+                    db: Session = Depends(get_db)):
     _apply_docker_settings(db)
     settings = _get_deployment_settings(db)
     if not settings["telegraf_config_host_path"]:
@@ -110,28 +124,30 @@ def deploy_instance(instance_id: int, db: Session = Depends(get_db)):
     if not inst:
         raise HTTPException(status_code=404, detail="Telegraf instance not found")
 
-    system_cfg = _get_config_dict(db)
-    default_influx = _get_default_influxdb(db)
-    default_sc = _get_default_scan_class(db)
-    tags = db.query(models.Tag).options(
-        joinedload(models.Tag.scan_class),
-        joinedload(models.Tag.device).joinedload(models.Device.influxdb_config),
-    ).filter(
-        models.Tag.telegraf_instance_id == instance_id,
-        models.Tag.enabled == True,
-    ).all()
-    config_content = telegraf_generator.generate_config_from_tags(
-        tags, system_cfg, default_influx,
-        scan_cache=_scan_cache, default_scan_class=default_sc,
-    )
+    with _deploy_lock(instance_id):
+        validation = None
+        if validate or disable_broken:
+            validation = _validate_instance_tags(db, instance_id, disable_broken=disable_broken)
 
-    docker_service.write_config(inst.name, config_content)
+        system_cfg = _get_config_dict(db)
+        default_influx = _get_default_influxdb(db)
+        default_sc = _get_default_scan_class(db)
+        tags = config_loading.load_instance_tags(db, instance_id)
+        config_content = telegraf_generator.generate_config_from_tags(
+            tags, system_cfg, default_influx,
+            scan_cache=_scan_cache, default_scan_class=default_sc,
+            metrics_port=telegraf_generator.instance_metrics_port(system_cfg, instance_id),
+        )
 
-    result = docker_service.deploy(
-        inst.name,
-        config_host_path=settings["telegraf_config_host_path"],
-        telegraf_image=settings["telegraf_image"],
-    )
+        docker_service.write_config(inst.name, config_content)
+
+        result = docker_service.deploy(
+            inst.name,
+            config_host_path=settings["telegraf_config_host_path"],
+            telegraf_image=settings["telegraf_image"],
+        )
+    if validation is not None:
+        result["validation"] = validation.model_dump()
     return result
 
 
@@ -148,14 +164,14 @@ def instance_action(instance_id: int, payload: schemas.ContainerActionRequest, d
         raise HTTPException(status_code=404, detail="Telegraf instance not found")
 
     action = payload.action
-    if action == "stop":
-        return docker_service.stop(inst.name)
-    elif action == "restart":
-        return docker_service.restart(inst.name)
-    elif action == "remove":
-        return docker_service.remove(inst.name)
-    else:
+    if action not in ("stop", "restart", "remove"):
         raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+    with _deploy_lock(instance_id):
+        if action == "stop":
+            return docker_service.stop(inst.name)
+        elif action == "restart":
+            return docker_service.restart(inst.name)
+        return docker_service.remove(inst.name)
 
 
 @router.get("/instances/{instance_id}/logs")
@@ -171,8 +187,7 @@ def get_instance_logs(instance_id: int, tail: int = 100, db: Session = Depends(g
     return {"logs": logs}
 
 
-@router.post("/deploy-all")
-def deploy_all(db: Session = Depends(get_db)):
+def _check_deploy_ready(db: Session) -> dict:
     _apply_docker_settings(db)
     settings = _get_deployment_settings(db)
     if not settings["telegraf_config_host_path"]:
@@ -182,7 +197,11 @@ def deploy_all(db: Session = Depends(get_db)):
         )
     if not docker_service.is_available():
         raise HTTPException(status_code=503, detail="Docker is not available")
+    return settings
 
+
+def _deploy_all(db: Session, settings: dict, validate: bool, disable_broken: bool,
+                ctx: Optional[jobs.JobContext] = None) -> dict:
     instances = db.query(models.TelegrafInstance).filter(
         models.TelegrafInstance.enabled == True
     ).all()
@@ -191,30 +210,129 @@ def deploy_all(db: Session = Depends(get_db)):
     default_influx = _get_default_influxdb(db)
     default_sc = _get_default_scan_class(db)
 
+    # Validation may disable tags, so it runs for every instance before rendering
+    validations = {}
+    checking = validate or disable_broken
+    if checking:
+        for i, inst in enumerate(instances):
+            if ctx is not None:
+                ctx.check_cancelled()
+                ctx.progress(50 * i / len(instances), f"Validating {inst.name}", force=True)
+            validations[inst.id] = _validate_instance_tags(db, inst.id, disable_broken=disable_broken)
+
+    # Every instance's config from one tag query
+    rows = db.execute(config_loading.all_instance_tags_stmt([inst.id for inst in instances])).all()
+    rendered = telegraf_generator.render_instances(
+        config_loading.group_instance_tags(rows), system_cfg,
+        config_loading.influx_target(default_influx), config_loading.scan_class_row(default_sc),
+    )
+
     results = []
-    for inst in instances:
-        tags = db.query(models.Tag).options(
-            joinedload(models.Tag.scan_class),
-            joinedload(models.Tag.device).joinedload(models.Device.influxdb_config),
-        ).filter(
-            models.Tag.telegraf_instance_id == inst.id,
-            models.Tag.enabled == True,
-        ).all()
-        config_content = telegraf_generator.generate_config_from_tags(
-            tags, system_cfg, default_influx,
-            scan_cache=_scan_cache, default_scan_class=default_sc,
-        )
-        docker_service.write_config(inst.name, config_content)
-        result = docker_service.deploy(
-            inst.name,
-            config_host_path=settings["telegraf_config_host_path"],
-            telegraf_image=settings["telegraf_image"],
-        )
+    base, span = (50, 50) if checking else (0, 100)
+    for i, inst in enumerate(instances):
+        if ctx is not None:
+            ctx.check_cancelled()
+            ctx.progress(base + span * i / len(instances), f"Deploying {inst.name}", force=True)
+        if inst.id in rendered:
+            config_content = rendered[inst.id]["config"]
+        else:
+            config_content = telegraf_generator.generate_config_from_tags(
+                [], system_cfg, default_influx, default_scan_class=default_sc,
+                metrics_port=telegraf_generator.instance_metrics_port(system_cfg, inst.id),
+            )
+        with _deploy_lock(inst.id):
+            docker_service.write_config(inst.name, config_content)
+            result = docker_service.deploy(
+                inst.name,
+                config_host_path=settings["telegraf_config_host_path"],
+                telegraf_image=settings["telegraf_image"],
+            )
+        if inst.id in validations:
+            result["validation"] = validations[inst.id].model_dump()
         results.append({"instance": inst.name, **result})
 
     return {"deployed": len(results), "results": results}
 
 
+@router.post("/deploy-all")
+def deploy_all(validate: bool = False, disable_broken: bool = False, db: Session = Depends(get_db)):
+    settings = _check_deploy_ready(db)
+    return _deploy_all(db, settings, validate, disable_broken)
+
+
+def _deploy_all_job(ctx: jobs.JobContext, settings: dict, validate: bool, disable_broken: bool) -> dict:
+    db = SessionLocal()
+    try:
+        return _deploy_all(db, settings, validate, disable_broken, ctx=ctx)
+    finally:
+        db.close()
+
+
+@router.post("/deploy-all/jobs", response_model=schemas.JobStarted)
+def start_deploy_all_job(validate: bool = False, disable_broken: bool = False, db: Session = Depends(get_db)):
+    """Deploy every enabled instance as a background job; follow it under /api/jobs/{job_id}."""
+    settings = _check_deploy_ready(db)
+    job_id = jobs.submit(
+        "deploy", _deploy_all_job, settings, validate, disable_broken, title="Deploy all instances",
+    )
+    return schemas.JobStarted(job_id=job_id)
+
+
+def _input_intervals(db: Session, instance_id: int) -> dict:
+    """Alias -> interval_ms of the opcua inputs generated for an instance."""
+    rows = db.query(models.Device.name, models.ScanClass.name, models.ScanClass.interval_ms).join(
+        models.Tag, models.Tag.device_id == models.Device.id,
+    ).outerjoin(
+        models.ScanClass, models.Tag.scan_class_id == models.ScanClass.id,
+    ).filter(
+        models.Tag.telegraf_instance_id == instance_id,
+        models.Tag.enabled == True,
+        models.Device.enabled == True,
+    ).distinct().all()
+    return {
+        f"{device_name.replace(' ', '_')}_{sc_name or 'default'}": interval_ms or 1000
+        for device_name, sc_name, interval_ms in rows
+    }
+
+
+def _throughput_targets(db: Session, instances) -> list:
+    system_cfg = _get_config_dict(db)
+    if system_cfg.get("telegraf_internal_metrics", "false").lower() != "true":
+        raise HTTPException(
+            status_code=400,
+            detail="Telegraf internal metrics are disabled. Enable them in Administration > Docker Deployment and redeploy.",
+        )
+    host = telegraf_metrics.metrics_host(system_cfg)
+    return [
+        {
+            "instance_id": inst.id,
+            "instance_name": inst.name,
+            "url": f"http://{host}:{telegraf_generator.instance_metrics_port(system_cfg, inst.id)}/metrics",
+            "intervals_ms": _input_intervals(db, inst.id),
+        }
+        for inst in instances
+    ]
+
+
+@router.get("/throughput")
+def get_throughput(db: Session = Depends(get_db)):
+    """Gather time, drops, buffer fullness and write errors of every enabled instance."""
+    instances = db.query(models.TelegrafInstance).filter(
+        models.TelegrafInstance.enabled == True
+    ).order_by(models.TelegrafInstance.name).all()
+    return telegraf_metrics.collect(_throughput_targets(db, instances))
+
+
+@router.get("/instances/{instance_id}/throughput")
+def get_instance_throughput(instance_id: int, db: Session = Depends(get_db)):
+    inst = db.query(models.TelegrafInstance).filter(
+        models.TelegrafInstance.id == instance_id
+    ).first()
+    if not inst:
+        raise HTTPException(status_code=404, detail="Telegraf instance not found")
+    return telegraf_metrics.collect(_throughput_targets(db, [inst]))[0]
+
+
 @router.get("/settings", response_model=schemas.DeploymentSettingsOut)
 def get_settings(db: Session = Depends(get_db)):
     _apply_docker_settings(db)
@@ -245,6 +363,14 @@ def update_settings(payload: schemas.DeploymentSettingsUpdate, db: Session = Dep
         _set_key(db, "docker_tls_cert_path", payload.docker_tls_cert_path)
     if payload.docker_tls_key_path is not None:
         _set_key(db, "docker_tls_key_path", payload.docker_tls_key_path)
+    if payload.telegraf_internal_metrics is not None:
+        _set_key(db, "telegraf_internal_metrics", str(payload.telegraf_internal_metrics).lower())
+    if payload.telegraf_metrics_base_port is not None:
+        if not 1 <= payload.telegraf_metrics_base_port <= 65000:
+            raise HTTPException(status_code=400, detail="telegraf_metrics_base_port must be between 1 and 65000")
+        _set_key(db, "telegraf_metrics_base_port", str(payload.telegraf_metrics_base_port))
+    if payload.telegraf_metrics_host is not None:
+        _set_key(db, "telegraf_metrics_host", payload.telegraf_metrics_host)
     db.commit()
 
     _apply_docker_settings(db)
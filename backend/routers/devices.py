@@ -1,19 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+from sqlalchemy import func, case, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from typing import Optional, List
-from database import get_db, SessionLocal
+from typing import Literal, Optional, List
+from database import get_db, get_async_db, SessionLocal, engine
+import asyncio
+import json
 import logging
 import models
 import schemas
-from services import opcua_service
+from services import opcua_service, opcua_types, jobs, versions, search_index
+from services.browse_cache import browse_cache, browse as cached_browse
+from services.opcua_live import live_hub, DEFAULT_SAMPLING_INTERVAL_MS
+from services.opcua_metrics import opcua_metrics, diagnostics
+from services.scan_snapshot import ScanSnapshot
+from services.scan_cache import scan_cache
+from services.shared_state import shared_state
 from schemas import OpcuaTestRequest
+from responses import FastJSONResponse, result_rows, etag, etag_headers, not_modified
+from routers.system import _get_config_dict
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
-# In-memory scan cache: device_id -> {"status": ..., "nodes": [...]}
-_scan_cache: dict = {}
+# Scan cache shared by all workers: device_id -> {"status": ..., "nodes": ScanSnapshot, "error": ...}
+_scan_cache = scan_cache
+
+# Live-server tag validation results: device_id -> (generation, {node_id: result}).
+# Kept per worker; a rescan or edit bumps the shared generation, which
+# invalidates every worker's copy.
+_validation_cache: dict = {}
+
+
+def _validation_results(device_id: int) -> dict:
+    """This worker's validation results for a device, reset if invalidated elsewhere."""
+    generation = shared_state.get_int(f"validation:{device_id}:generation")
+    cached = _validation_cache.get(device_id)
+    if cached is None or cached[0] != generation:
+        cached = _validation_cache[device_id] = (generation, {})
+    return cached[1]
+
+
+def _invalidate_validation(device_id: int):
+    shared_state.incr(f"validation:{device_id}:generation")
+    _validation_cache.pop(device_id, None)
+
+
+def _scan_lock(device_id: int):
+    return shared_state.lock(f"scan:{device_id}", ttl=60)
 
 
 def _expand_node_includes(device_id: int, db: Session):
@@ -41,11 +77,7 @@ def _expand_node_includes(device_id: int, db: Session):
 
     created = 0
     for ni in node_includes:
-        prefix = ni.parent_path + "/"
-        for node in cached_nodes:
-            node_path = node.get("path", "")
-            if not (node_path.startswith(prefix) or node_path == ni.parent_path):
-                continue
+        for node in cached_nodes.nodes_under(ni.parent_path):
             if not node.get("is_variable", True):
                 continue
             if node["node_id"] in existing_node_ids:
@@ -74,25 +106,75 @@ def _expand_node_includes(device_id: int, db: Session):
     return created
 
 
+def _device_rows_stmt():
+    """DeviceOut-shaped rows with tag counts from one aggregate query."""
+    counts = select(
+        models.Tag.device_id.label("device_id"),
+        func.count(models.Tag.id).label("tag_count"),
+        func.sum(case((models.Tag.enabled == True, 1), else_=0)).label("enabled_tag_count"),
+    ).group_by(models.Tag.device_id).subquery()
+    return select(
+        models.Device.name,
+        models.Device.endpoint_url,
+        models.Device.username,
+        models.Device.password,
+        models.Device.security_policy,
+        models.Device.influxdb_config_id,
+        models.Device.telegraf_instance_id,
+        models.Device.enabled,
+        models.Device.id,
+        models.Device.created_at,
+        models.Device.updated_at,
+        func.coalesce(counts.c.tag_count, 0).label("tag_count"),
+        func.coalesce(counts.c.enabled_tag_count, 0).label("enabled_tag_count"),
+        models.InfluxDBConfig.name.label("influxdb_name"),
+        models.TelegrafInstance.name.label("telegraf_instance_name"),
+    ).outerjoin(
+        counts, counts.c.device_id == models.Device.id,
+    ).outerjoin(
+        models.InfluxDBConfig, models.Device.influxdb_config_id == models.InfluxDBConfig.id,
+    ).outerjoin(
+        models.TelegrafInstance, models.Device.telegraf_instance_id == models.TelegrafInstance.id,
+    ).order_by(models.Device.name)
+
+
+def _tag_rows_select():
+    """TagOut-shaped tag rows, projected straight from SQL."""
+    return select(
+        models.Tag.node_id,
+        models.Tag.namespace,
+        models.Tag.identifier,
+        models.Tag.identifier_type,
+        models.Tag.display_name,
+        models.Tag.path,
+        models.Tag.data_type,
+        models.Tag.measurement_name,
+        models.Tag.scan_class_id,
+        models.Tag.telegraf_instance_id,
+        models.Tag.enabled,
+        models.Tag.id,
+        models.Tag.device_id,
+        models.Tag.created_at,
+        models.ScanClass.name.label("scan_class_name"),
+        models.TelegrafInstance.name.label("telegraf_instance_name"),
+    ).outerjoin(
+        models.ScanClass, models.Tag.scan_class_id == models.ScanClass.id,
+    ).outerjoin(
+        models.TelegrafInstance, models.Tag.telegraf_instance_id == models.TelegrafInstance.id,
+    )
+
+
+def _tag_rows_stmt(device_id: int):
+    """TagOut-shaped rows for a device."""
+    return _tag_rows_select().where(models.Tag.device_id == device_id).order_by(models.Tag.id)
+
+
 @router.get("", response_model=list[schemas.DeviceOut])
-def list_devices(db: Session = Depends(get_db)):
-    devices = db.query(models.Device).options(
-        joinedload(models.Device.influxdb_config),
-        joinedload(models.Device.telegraf_instance),
-    ).order_by(models.Device.name).all()
-    result = []
-    for d in devices:
-        tag_count = db.query(models.Tag).filter(models.Tag.device_id == d.id).count()
-        enabled_tag_count = db.query(models.Tag).filter(
-            models.Tag.device_id == d.id, models.Tag.enabled == True
-        ).count()
-        out = schemas.DeviceOut.model_validate(d)
-        out.tag_count = tag_count
-        out.enabled_tag_count = enabled_tag_count
-        out.influxdb_name = d.influxdb_config.name if d.influxdb_config else None
-        out.telegraf_instance_name = d.telegraf_instance.name if d.telegraf_instance else None
-        result.append(out)
-    return result
+async def list_devices(fast: bool = False, db: AsyncSession = Depends(get_async_db)):
+    rows = result_rows(await db.execute(_device_rows_stmt()))
+    if fast:
+        return FastJSONResponse(rows)
+    return [schemas.DeviceOut(**row) for row in rows]
 
 
 @router.post("", response_model=schemas.DeviceOut)
@@ -120,23 +202,12 @@ def test_connection_unsaved(payload: OpcuaTestRequest):
 
 
 @router.get("/{device_id}", response_model=schemas.DeviceOut)
-def get_device(device_id: int, db: Session = Depends(get_db)):
-    device = db.query(models.Device).options(
-        joinedload(models.Device.influxdb_config),
-        joinedload(models.Device.telegraf_instance),
-    ).filter(models.Device.id == device_id).first()
-    if not device:
+async def get_device(device_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(_device_rows_stmt().where(models.Device.id == device_id))
+    rows = result_rows(result)
+    if not rows:
         raise HTTPException(status_code=404, detail="Device not found")
-    tag_count = db.query(models.Tag).filter(models.Tag.device_id == device_id).count()
-    enabled_tag_count = db.query(models.Tag).filter(
-        models.Tag.device_id == device_id, models.Tag.enabled == True
-    ).count()
-    out = schemas.DeviceOut.model_validate(device)
-    out.tag_count = tag_count
-    out.enabled_tag_count = enabled_tag_count
-    out.influxdb_name = device.influxdb_config.name if device.influxdb_config else None
-    out.telegraf_instance_name = device.telegraf_instance.name if device.telegraf_instance else None
-    return out
+    return schemas.DeviceOut(**rows[0])
 
 
 @router.put("/{device_id}", response_model=schemas.DeviceOut)
@@ -154,6 +225,8 @@ def update_device(device_id: int, payload: schemas.DeviceUpdate, db: Session = D
         setattr(device, field, value)
     db.commit()
     db.refresh(device)
+    _invalidate_validation(device_id)
+    browse_cache.discard_device(device_id)
     tag_count = db.query(models.Tag).filter(models.Tag.device_id == device_id).count()
     enabled_tag_count = db.query(models.Tag).filter(
         models.Tag.device_id == device_id, models.Tag.enabled == True
@@ -171,6 +244,8 @@ def delete_device(device_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Device not found")
     db.delete(device)
     db.commit()
+    search_index.drop_scan(engine, device_id)
+    browse_cache.discard_device(device_id)
     return {"ok": True}
 
 
@@ -185,21 +260,60 @@ def test_connection(device_id: int, db: Session = Depends(get_db)):
     )
 
 
+@router.get("/{device_id}/diagnostics")
+def get_device_diagnostics(device_id: int, db: Session = Depends(get_db)):
+    """OPC UA client metrics for the device's endpoint, merged across workers.
+
+    ``bottleneck`` compares the last scan's wall time with the time it spent
+    waiting on the server: "server" means the PLC is slow to answer, "crawler"
+    means the time goes into our own per-node work.
+    """
+    device = db.query(models.Device).filter(models.Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    stats = opcua_metrics.collect().get(device.endpoint_url)
+    return {
+        "device_id": device.id,
+        "endpoint_url": device.endpoint_url,
+        **diagnostics(stats),
+        "live": live_hub.stats().get(device.id),
+    }
+
+
+@router.get("/{device_id}/data-types", response_model=List[schemas.DataTypeOut])
+def get_data_types(device_id: int, refresh: bool = False, db: Session = Depends(get_db)):
+    """DataTypes the device's server defines, with their base scalar types."""
+    device = db.query(models.Device).filter(models.Device.id == device_id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if refresh:
+        opcua_types.invalidate(device.endpoint_url)
+    try:
+        types = opcua_service.data_types(
+            device.endpoint_url, device.username, device.password,
+            security_policy=device.security_policy or "None",
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return types.rows()
+
+
 @router.post("/{device_id}/browse")
 def browse_node(
     device_id: int,
     node_id: Optional[str] = None,
     db: Session = Depends(get_db),
 ):
+    """Children of ``node_id`` (the Objects folder if omitted).
+
+    Served from the last scan or the browse cache when possible; see
+    ``services.browse_cache``.
+    """
     device = db.query(models.Device).filter(models.Device.id == device_id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     try:
-        nodes = opcua_service.browse_node(
-            device.endpoint_url, node_id, device.username, device.password,
-            security_policy=device.security_policy or "None",
-        )
-        return {"nodes": nodes}
+        return Response(content=cached_browse(device, node_id), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -222,69 +336,258 @@ def read_values(device_id: int, node_ids: List[str], db: Session = Depends(get_d
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _do_scan(device_id: int, endpoint_url: str, username: str, password: str, security_policy: str = "None"):
-    _scan_cache[device_id] = {"status": "scanning", "nodes": [], "error": None}
+async def _receive_node_ids(websocket: WebSocket, subscriber) -> None:
+    """Apply node id changes sent by the browser until it disconnects."""
+    while True:
+        message = await websocket.receive_json()
+        await live_hub.update(subscriber, message.get("node_ids") or [])
+
+
+@router.websocket("/{device_id}/live")
+async def live_values(websocket: WebSocket, device_id: int):
+    """Stream live values over one shared OPC UA subscription per device.
+
+    The client sends ``{"node_ids": [...]}`` to (re)define the watched nodes and
+    receives ``{"values": {node_id: {value, status, timestamp}}}`` batches.
+    """
+    db = SessionLocal()
     try:
-        nodes = opcua_service.scan_all_variables(
-            endpoint_url, username, password, security_policy=security_policy,
-        )
-        _scan_cache[device_id] = {"status": "complete", "nodes": nodes, "error": None}
+        device = db.query(models.Device).filter(models.Device.id == device_id).first()
+        cfg = _get_config_dict(db)
+    finally:
+        db.close()
+    if not device:
+        await websocket.close(code=4404)
+        return
 
-        # Persist tags for any NodeIncludes (branch subscriptions)
-        db = SessionLocal()
+    await websocket.accept()
+    try:
+        sampling_interval_ms = int(cfg.get("live_sampling_interval_ms") or DEFAULT_SAMPLING_INTERVAL_MS)
+    except ValueError:
+        sampling_interval_ms = DEFAULT_SAMPLING_INTERVAL_MS
+
+    subscriber = None
+    try:
+        message = await websocket.receive_json()
+        subscriber = await live_hub.subscribe(
+            device.id, device.endpoint_url, message.get("node_ids") or [],
+            device.username, device.password,
+            security_policy=device.security_policy or "None",
+            sampling_interval_ms=sampling_interval_ms,
+        )
+        receiver = asyncio.create_task(_receive_node_ids(websocket, subscriber))
         try:
-            _expand_node_includes(device_id, db)
+            while not receiver.done():
+                batch = await subscriber.next_batch(timeout=1.0)
+                if subscriber.error:
+                    await websocket.send_json({"error": subscriber.error})
+                    break
+                if batch:
+                    await websocket.send_json({"values": batch})
+            else:
+                # The receiver ended: report why unless the browser just went away
+                error = None if receiver.cancelled() else receiver.exception()
+                if error is not None and not isinstance(error, WebSocketDisconnect):
+                    await websocket.send_json({"error": str(error)})
         finally:
-            db.close()
-    except Exception as e:
-        _scan_cache[device_id] = {"status": "error", "nodes": [], "error": str(e)}
+            receiver.cancel()
+    except WebSocketDisconnect:
+        pass
+    except RuntimeError as e:
+        try:
+            await websocket.send_json({"error": str(e)})
+        except Exception:
+            pass
+    finally:
+        if subscriber is not None:
+            await live_hub.release(subscriber)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+
+def _include_roots(device_id: int) -> dict:
+    """{parent_node_id: parent_path} of the device's enabled NodeIncludes."""
+    db = SessionLocal()
+    try:
+        rows = db.query(models.NodeInclude.parent_node_id, models.NodeInclude.parent_path).filter(
+            models.NodeInclude.device_id == device_id,
+            models.NodeInclude.enabled == True,
+        ).all()
+    finally:
+        db.close()
+    return {node_id: path or "" for node_id, path in rows}
+
+
+class _ScanProgress:
+    """Scan collector that feeds a ScanSnapshot, reports progress to a job and
+    stops the scan once the job is cancelled.
+
+    Progress is the share of the previous scan's node count when there was one.
+    """
+
+    def __init__(self, snapshot: ScanSnapshot, ctx: jobs.JobContext, expected: int):
+        self._snapshot = snapshot
+        self._ctx = ctx
+        self._expected = expected
+        self._folders = 0
+        self.append = snapshot.append
+        self.add_folder = snapshot.add_folder
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def folder_listed(self, path: str, node_id: str) -> None:
+        self._snapshot.folder_listed(path, node_id)
+        self._folders += 1
+        if self._ctx.cancelled:
+            raise opcua_service.ScanStopped()
+        nodes = len(self._snapshot)
+        percent = 100 * nodes / self._expected if self._expected else 0
+        self._ctx.progress(min(percent, 99), f"Scanning: {self._folders} folders, {nodes} variables")
+
+
+def _do_scan(device_id: int, endpoint_url: str, username: str, password: str, security_policy: str = "None",
+             lock=None, scope: str = "full", ctx: Optional[jobs.JobContext] = None, expected: int = 0):
+    """Scan a device into the shared scan cache.
+
+    ``lock`` is the device's scan lock if the caller already holds it;
+    otherwise it is taken here and the scan is skipped when another worker
+    is already scanning the device.  ``scope="includes"`` crawls only the
+    subtrees of the device's NodeIncludes (a full scan if it has none).
+
+    With a job ``ctx`` the scan reports progress (against ``expected`` nodes)
+    and raises JobCancelled, dropping the scan entry, when the job is cancelled.
+    """
+    if lock is None:
+        lock = _scan_lock(device_id)
+        if not lock.acquire(blocking=False):
+            logger.info(f"Scan of device {device_id} already running in another worker")
+            return
+    try:
+        roots = _include_roots(device_id) if scope == "includes" else None
+        scope = "includes" if roots else "full"
+        _scan_cache[device_id] = {"status": "scanning", "nodes": ScanSnapshot(), "error": None, "scope": scope}
+        try:
+            nodes = ScanSnapshot()
+            opcua_service.scan_all_variables(
+                endpoint_url, username, password, security_policy=security_policy,
+                collector=nodes if ctx is None else _ScanProgress(nodes, ctx, expected), roots=roots or None,
+            )
+            _scan_cache[device_id] = {"status": "complete", "nodes": nodes, "error": None, "scope": scope}
+            _invalidate_validation(device_id)
+            try:
+                search_index.index_scan(engine, device_id, nodes)
+            except Exception as e:
+                logger.warning(f"Could not index the scan of device {device_id} for search: {e}")
+
+            # Persist tags for any NodeIncludes (branch subscriptions)
+            db = SessionLocal()
+            try:
+                _expand_node_includes(device_id, db)
+            finally:
+                db.close()
+        except opcua_service.ScanStopped:
+            _scan_cache.discard(device_id)
+            raise jobs.JobCancelled()
+        except Exception as e:
+            _scan_cache[device_id] = {"status": "error", "nodes": ScanSnapshot(), "error": str(e), "scope": scope}
+    finally:
+        lock.release()
+
+
+def _scan_job(ctx: jobs.JobContext, device_id: int, endpoint_url: str, username: str, password: str,
+              security_policy: str, lock, scope: str = "full", expected: int = 0) -> dict:
+    ctx.progress(0, "Scanning", force=True)
+    _do_scan(device_id, endpoint_url, username, password, security_policy=security_policy, lock=lock, scope=scope,
+             ctx=ctx, expected=expected)
+    entry = _scan_cache.get(device_id) or {}
+    if entry.get("status") == "error":
+        raise RuntimeError(entry["error"])
+    return {"device_id": device_id, "nodes": len(entry.get("nodes") or []), "scope": entry.get("scope")}
 
 
 @router.post("/{device_id}/scan")
-def start_scan(device_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def start_scan(device_id: int, scope: Literal["full", "includes"] = "full", db: Session = Depends(get_db)):
+    """Start a scan job; ``scope=includes`` crawls only the device's NodeInclude subtrees."""
     device = db.query(models.Device).filter(models.Device.id == device_id).first()
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    existing = _scan_cache.get(device_id, {})
-    if existing.get("status") == "scanning":
+    if scope == "includes" and not db.query(models.NodeInclude.id).filter(
+        models.NodeInclude.device_id == device_id, models.NodeInclude.enabled == True,
+    ).first():
+        raise HTTPException(status_code=400, detail="Device has no enabled node includes to scan")
+    lock = _scan_lock(device_id)
+    if not lock.acquire(blocking=False):
         return {"status": "scanning", "message": "Scan already in progress"}
-    background_tasks.add_task(
-        _do_scan, device_id, device.endpoint_url, device.username, device.password,
-        security_policy=device.security_policy or "None",
+    # The last scan of the same scope gives the job a progress estimate
+    expected = _scan_cache.count(device_id, scope)
+    _scan_cache[device_id] = {"status": "scanning", "nodes": ScanSnapshot(), "error": None, "scope": scope}
+
+    def cancelled_while_queued():
+        _scan_cache.discard(device_id)
+        lock.release()
+
+    job_id = jobs.submit(
+        "scan", _scan_job, device_id, device.endpoint_url, device.username, device.password,
+        device.security_policy or "None", lock, scope, expected, title=f"Scan {device.name}",
+        on_cancel=cancelled_while_queued,
     )
-    _scan_cache[device_id] = {"status": "scanning", "nodes": [], "error": None}
-    return {"status": "scanning", "message": "Scan started"}
+    return {"status": "scanning", "message": "Scan started", "job_id": job_id}
 
 
 @router.get("/{device_id}/scan")
-def get_scan_status(device_id: int):
-    status = _scan_cache.get(device_id, {"status": "idle", "nodes": [], "error": None})
-    return status
+def get_scan_status(device_id: int, request: Request):
+    signature = _scan_cache.signature(device_id)
+    # The worker running the scan died before finishing it
+    interrupted = (
+        signature is not None and signature[0] == "scanning"
+        and not shared_state.is_locked(f"scan:{device_id}")
+    )
+    tag = etag("scan", device_id, signature, interrupted)
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    status = _scan_cache.get(device_id) if signature is not None else None
+    if status is None:
+        content = '{"status":"idle","error":null,"scope":null,"nodes":[]}'
+    else:
+        if interrupted:
+            status = {**status, "status": "error", "error": "Scan was interrupted"}
+        # Encode the snapshot directly instead of materializing a dict per node
+        content = (
+            '{"status":' + json.dumps(status["status"])
+            + ',"error":' + json.dumps(status["error"])
+            + ',"scope":' + json.dumps(status["scope"])
+            + ',"nodes":' + status["nodes"].to_json() + "}"
+        )
+    return Response(content=content, media_type="application/json", headers=etag_headers(tag))
 
 
 @router.delete("/{device_id}/scan")
 def clear_scan(device_id: int):
-    _scan_cache.pop(device_id, None)
+    _scan_cache.discard(device_id)
+    search_index.drop_scan(engine, device_id)
     return {"ok": True}
 
 
 # Tag management for a device
 @router.get("/{device_id}/tags", response_model=list[schemas.TagOut])
-def get_device_tags(device_id: int, db: Session = Depends(get_db)):
-    device = db.query(models.Device).filter(models.Device.id == device_id).first()
+async def get_device_tags(device_id: int, request: Request, response: Response, fast: bool = False,
+                          db: AsyncSession = Depends(get_async_db)):
+    tag = etag("device-tags", device_id, fast, versions.current("config", "tags", f"device-tags:{device_id}"))
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    device = await db.get(models.Device, device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
-    tags = db.query(models.Tag).options(
-        joinedload(models.Tag.scan_class),
-        joinedload(models.Tag.telegraf_instance),
-    ).filter(models.Tag.device_id == device_id).all()
-    result = []
-    for tag in tags:
-        out = schemas.TagOut.model_validate(tag)
-        out.scan_class_name = tag.scan_class.name if tag.scan_class else None
-        out.telegraf_instance_name = tag.telegraf_instance.name if tag.telegraf_instance else None
-        result.append(out)
-    return result
+    rows = result_rows(await db.execute(_tag_rows_stmt(device_id)))
+    if fast:
+        return FastJSONResponse(rows, headers=etag_headers(tag))
+    response.headers.update(etag_headers(tag))
+    return [schemas.TagOut(**row) for row in rows]
 
 
 @router.put("/{device_id}/tags")
@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from database import get_db
 import models
 import schemas
-from services import influxdb_service
+from services import influxdb_service, jobs
+from routers.system import _get_config_dict
 from schemas import InfluxTestRequest
 
 router = APIRouter(prefix="/influxdb", tags=["influxdb"])
@@ -106,3 +108,92 @@ def list_buckets(cfg_id: int, db: Session = Depends(get_db)):
         return {"buckets": buckets}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _instance_rates(db: Session, cfg: models.InfluxDBConfig) -> list:
+    """Points per second each Telegraf instance sends to ``cfg`` with the current tags."""
+    target = models.Device.influxdb_config_id == cfg.id
+    if cfg.is_default:
+        target = or_(target, models.Device.influxdb_config_id.is_(None))
+    rows = db.query(
+        models.Tag.telegraf_instance_id, models.ScanClass.interval_ms, func.count(models.Tag.id),
+    ).join(models.Device, models.Tag.device_id == models.Device.id).outerjoin(
+        models.ScanClass, models.Tag.scan_class_id == models.ScanClass.id,
+    ).filter(
+        models.Tag.enabled == True,
+        models.Device.enabled == True,
+        models.Tag.telegraf_instance_id.isnot(None),
+        target,
+    ).group_by(models.Tag.telegraf_instance_id, models.ScanClass.interval_ms).all()
+
+    rates = {}
+    for instance_id, interval_ms, count in rows:
+        rates[instance_id] = rates.get(instance_id, 0.0) + count * 1000 / (interval_ms or 1000)
+    names = dict(db.query(models.TelegrafInstance.id, models.TelegrafInstance.name).filter(
+        models.TelegrafInstance.id.in_(rates)
+    ).all()) if rates else {}
+    return [
+        {"instance_id": instance_id, "instance_name": names.get(instance_id, ""), "points_per_s": round(rate, 1)}
+        for instance_id, rate in sorted(rates.items())
+    ]
+
+
+def _write_probe_job(ctx: jobs.JobContext, cfg: dict, payload: schemas.WriteProbeRequest,
+                     rates: list, current: dict) -> dict:
+    def on_step(done, total, step):
+        ctx.check_cancelled()
+        ctx.progress(100 * done / total, f"Batch {step['batch_size']} x {step['concurrency']} writers: "
+                                         f"{step['points_per_s']:.0f} points/s", force=True)
+
+    steps = influxdb_service.probe_write_capacity(
+        cfg["url"], cfg["token"], cfg["org"], payload.bucket, version=cfg["version"],
+        batch_sizes=payload.batch_sizes, concurrency=payload.concurrency,
+        step_seconds=payload.step_seconds, series=payload.series, gzip_body=payload.gzip,
+        on_step=on_step,
+    )
+    return {
+        "target": cfg["name"],
+        "bucket": payload.bucket,
+        "steps": steps,
+        "instances": rates,
+        "current": current,
+        "recommended": influxdb_service.recommend_agent_settings(
+            steps, [r["points_per_s"] for r in rates], outage_seconds=payload.outage_seconds,
+        ),
+    }
+
+
+@router.post("/{cfg_id}/write-probe", response_model=schemas.JobStarted)
+def start_write_probe(cfg_id: int, payload: schemas.WriteProbeRequest, db: Session = Depends(get_db)):
+    """Measure the target's write throughput and latency and recommend agent settings.
+
+    Writes synthetic ``fluxforge_probe`` points to ``payload.bucket`` as a
+    background job; follow it under /api/jobs/{job_id}.
+    """
+    cfg = db.query(models.InfluxDBConfig).filter(models.InfluxDBConfig.id == cfg_id).first()
+    if not cfg:
+        raise HTTPException(status_code=404, detail="InfluxDB config not found")
+    if not payload.bucket.strip():
+        raise HTTPException(status_code=400, detail="A scratch bucket is required")
+    if not payload.batch_sizes or not all(1 <= b <= 100000 for b in payload.batch_sizes):
+        raise HTTPException(status_code=400, detail="batch_sizes must be between 1 and 100000")
+    if not payload.concurrency or not all(1 <= c <= 32 for c in payload.concurrency):
+        raise HTTPException(status_code=400, detail="concurrency must be between 1 and 32")
+    if not 0.5 <= payload.step_seconds <= 60:
+        raise HTTPException(status_code=400, detail="step_seconds must be between 0.5 and 60")
+    if payload.series < 1:
+        raise HTTPException(status_code=400, detail="series must be at least 1")
+    if 1 not in payload.concurrency:
+        payload.concurrency = [1] + payload.concurrency
+
+    system_cfg = _get_config_dict(db)
+    current = {
+        key: system_cfg.get(key)
+        for key in ("agent_metric_batch_size", "agent_metric_buffer_limit", "agent_flush_interval")
+    }
+    target = {"name": cfg.name, "url": cfg.url, "token": cfg.token, "org": cfg.org or "", "version": cfg.version or 2}
+    job_id = jobs.submit(
+        "probe", _write_probe_job, target, payload, _instance_rates(db, cfg), current,
+        title=f"Write probe: {cfg.name}",
+    )
+    return schemas.JobStarted(job_id=job_id)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db, SessionLocal
+import models
+import schemas
+from services import jobs
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# SSE polling interval and keep-alive period (seconds)
+_EVENT_POLL_INTERVAL = 0.5
+_EVENT_KEEPALIVE = 15
+
+
+def _job_out(job: models.Job) -> schemas.JobOut:
+    out = schemas.JobOut.model_validate(job)
+    out.result = jobs.job_result(job)
+    return out
+
+
+def _load_job(db: Session, job_id: str) -> models.Job:
+    job = db.query(models.Job).filter(models.Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    jobs.reap_orphans(db, [job])
+    return job
+
+
+@router.get("", response_model=list[schemas.JobOut])
+def list_jobs(type: Optional[str] = None, status: Optional[str] = None, limit: int = 50,
+              db: Session = Depends(get_db)):
+    query = db.query(models.Job)
+    if type:
+        query = query.filter(models.Job.type == type)
+    if status:
+        query = query.filter(models.Job.status == status)
+    rows = query.order_by(models.Job.created_at.desc()).limit(limit).all()
+    jobs.reap_orphans(db, rows)
+    return [_job_out(job) for job in rows]
+
+
+@router.get("/{job_id}", response_model=schemas.JobOut)
+def get_job(job_id: str, db: Session = Depends(get_db)):
+    return _job_out(_load_job(db, job_id))
+
+
+@router.post("/{job_id}/cancel", response_model=schemas.JobOut)
+def cancel_job(job_id: str, db: Session = Depends(get_db)):
+    job = _load_job(db, job_id)
+    jobs.request_cancel(db, job)
+    return _job_out(job)
+
+
+def _snapshot(job_id: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        job = db.query(models.Job).filter(models.Job.id == job_id).first()
+        if job is None:
+            return None
+        jobs.reap_orphans(db, [job])
+        return _job_out(job).model_dump_json()
+    finally:
+        db.close()
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: one ``data:`` message per job change, ending when the job finishes."""
+    first = await asyncio.to_thread(_snapshot, job_id)
+    if first is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        last, idle = None, 0.0
+        snapshot = first
+        while True:
+            if snapshot != last:
+                yield f"data: {snapshot}\n\n"
+                last, idle = snapshot, 0.0
+                if json.loads(snapshot)["status"] in jobs.TERMINAL_STATUSES:
+                    return
+            elif idle >= _EVENT_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                idle = 0.0
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(_EVENT_POLL_INTERVAL)
+            idle += _EVENT_POLL_INTERVAL
+            snapshot = await asyncio.to_thread(_snapshot, job_id)
+            if snapshot is None:
+                return
+
+    # X-Accel-Buffering stops nginx from holding events back
+    return StreamingResponse(
+        stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,38 +1,60 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import get_db
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from database import get_async_db
 import models
+from services.opcua_metrics import opcua_metrics, render_prometheus
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
 
+async def _count(db: AsyncSession, stmt) -> int:
+    return (await db.execute(stmt)).scalar() or 0
+
+
 @router.get("")
-def get_metrics(db: Session = Depends(get_db)):
-    total_devices = db.query(models.Device).count()
-    enabled_devices = db.query(models.Device).filter(models.Device.enabled == True).count()
-    total_tags = db.query(models.Tag).count()
-    enabled_tags = db.query(models.Tag).filter(models.Tag.enabled == True).count()
-    scan_class_count = db.query(models.ScanClass).count()
-    influxdb_count = db.query(models.InfluxDBConfig).count()
-    instance_count = db.query(models.TelegrafInstance).count()
+async def get_metrics(db: AsyncSession = Depends(get_async_db)):
+    Tag, Device = models.Tag, models.Device
+
+    total_devices = await _count(db, select(func.count(Device.id)))
+    enabled_devices = await _count(db, select(func.count(Device.id)).where(Device.enabled == True))
+    total_tags = await _count(db, select(func.count(Tag.id)))
+    enabled_tags = await _count(db, select(func.count(Tag.id)).where(Tag.enabled == True))
+    scan_class_count = await _count(db, select(func.count(models.ScanClass.id)))
+    influxdb_count = await _count(db, select(func.count(models.InfluxDBConfig.id)))
+    instance_count = await _count(db, select(func.count(models.TelegrafInstance.id)))
+
+    # Enabled tag counts in one grouped pass: (instance, scan class) and per device
+    pair_counts = {
+        (inst_id, sc_id): count
+        for inst_id, sc_id, count in (await db.execute(
+            select(Tag.telegraf_instance_id, Tag.scan_class_id, func.count(Tag.id))
+            .where(Tag.enabled == True)
+            .group_by(Tag.telegraf_instance_id, Tag.scan_class_id)
+        )).all()
+    }
+    device_tag_counts = dict((await db.execute(
+        select(Tag.device_id, func.count(Tag.id))
+        .where(Tag.enabled == True)
+        .group_by(Tag.device_id)
+    )).all())
 
     # Tags per scan class
-    scan_classes = db.query(models.ScanClass).order_by(models.ScanClass.interval_ms).all()
+    scan_classes = (await db.execute(
+        select(models.ScanClass).order_by(models.ScanClass.interval_ms)
+    )).scalars().all()
     tags_by_scan_class = []
     for sc in scan_classes:
-        count = db.query(models.Tag).filter(
-            models.Tag.scan_class_id == sc.id, models.Tag.enabled == True
-        ).count()
+        count = sum(c for (_, sc_id), c in pair_counts.items() if sc_id == sc.id)
         tags_by_scan_class.append({
             "name": sc.name,
             "interval_ms": sc.interval_ms,
             "tag_count": count,
         })
 
-    unassigned_tags = db.query(models.Tag).filter(
-        models.Tag.scan_class_id == None, models.Tag.enabled == True
-    ).count()
+    unassigned_tags = sum(c for (_, sc_id), c in pair_counts.items() if sc_id is None)
     if unassigned_tags > 0:
         tags_by_scan_class.append({
             "name": "Unassigned",
@@ -41,103 +63,52 @@ def get_metrics(db: Session = Depends(get_db)):
         })
 
     # Tags grouped by instance AND scan class (for sankey diagram)
-    instances = db.query(models.TelegrafInstance).order_by(models.TelegrafInstance.name).all()
+    instances = (await db.execute(
+        select(models.TelegrafInstance).order_by(models.TelegrafInstance.name)
+    )).scalars().all()
     instance_map = {inst.id: inst.name for inst in instances}
 
     tags_by_instance_scan_class = []
-    for inst in instances:
-        for sc in scan_classes:
-            count = db.query(models.Tag).filter(
-                models.Tag.telegraf_instance_id == inst.id,
-                models.Tag.scan_class_id == sc.id,
-                models.Tag.enabled == True,
-            ).count()
+    # Instances in name order, then tags with no instance; scan classes by
+    # interval with the unassigned scan class last
+    for inst_id, inst_name in [(inst.id, inst.name) for inst in instances] + [(None, "Unassigned")]:
+        for sc_id, sc_name in [(sc.id, sc.name) for sc in scan_classes] + [(None, "Unassigned")]:
+            count = pair_counts.get((inst_id, sc_id), 0)
             if count > 0:
                 tags_by_instance_scan_class.append({
-                    "instance_name": inst.name,
-                    "scan_class_name": sc.name,
+                    "instance_name": inst_name,
+                    "scan_class_name": sc_name,
                     "tag_count": count,
                 })
-        # Unassigned scan class for this instance
-        count = db.query(models.Tag).filter(
-            models.Tag.telegraf_instance_id == inst.id,
-            models.Tag.scan_class_id == None,
-            models.Tag.enabled == True,
-        ).count()
-        if count > 0:
-            tags_by_instance_scan_class.append({
-                "instance_name": inst.name,
-                "scan_class_name": "Unassigned",
-                "tag_count": count,
-            })
-
-    # Tags with no instance assigned
-    for sc in scan_classes:
-        count = db.query(models.Tag).filter(
-            models.Tag.telegraf_instance_id == None,
-            models.Tag.scan_class_id == sc.id,
-            models.Tag.enabled == True,
-        ).count()
-        if count > 0:
-            tags_by_instance_scan_class.append({
-                "instance_name": "Unassigned",
-                "scan_class_name": sc.name,
-                "tag_count": count,
-            })
-    count = db.query(models.Tag).filter(
-        models.Tag.telegraf_instance_id == None,
-        models.Tag.scan_class_id == None,
-        models.Tag.enabled == True,
-    ).count()
-    if count > 0:
-        tags_by_instance_scan_class.append({
-            "instance_name": "Unassigned",
-            "scan_class_name": "Unassigned",
-            "tag_count": count,
-        })
 
     # Devices with their tag counts, influxdb targets, and instance names
-    devices = db.query(models.Device).order_by(models.Device.name).all()
+    influx_configs = (await db.execute(select(models.InfluxDBConfig))).scalars().all()
+    influx_map = {cfg.id: cfg.name for cfg in influx_configs}
+    devices = (await db.execute(select(Device).order_by(Device.name))).scalars().all()
     device_summary = []
     for d in devices:
-        tag_count = db.query(models.Tag).filter(
-            models.Tag.device_id == d.id, models.Tag.enabled == True
-        ).count()
-        influx_name = None
-        if d.influxdb_config_id:
-            cfg = db.query(models.InfluxDBConfig).filter(
-                models.InfluxDBConfig.id == d.influxdb_config_id
-            ).first()
-            if cfg:
-                influx_name = cfg.name
-        instance_name = None
-        if d.telegraf_instance_id:
-            inst = db.query(models.TelegrafInstance).filter(
-                models.TelegrafInstance.id == d.telegraf_instance_id
-            ).first()
-            if inst:
-                instance_name = inst.name
         device_summary.append({
             "id": d.id,
             "name": d.name,
             "endpoint_url": d.endpoint_url,
             "enabled": d.enabled,
-            "enabled_tag_count": tag_count,
-            "influxdb_name": influx_name,
-            "instance_name": instance_name,
+            "enabled_tag_count": device_tag_counts.get(d.id, 0),
+            "influxdb_name": influx_map.get(d.influxdb_config_id) if d.influxdb_config_id else None,
+            "instance_name": instance_map.get(d.telegraf_instance_id) if d.telegraf_instance_id else None,
         })
 
     # InfluxDB config summaries
-    influx_configs = db.query(models.InfluxDBConfig).all()
+    influx_device_counts = dict((await db.execute(
+        select(Device.influxdb_config_id, func.count(Device.id)).group_by(Device.influxdb_config_id)
+    )).all())
+    influx_tag_totals = {}
+    for d in devices:
+        if d.influxdb_config_id:
+            influx_tag_totals[d.influxdb_config_id] = (
+                influx_tag_totals.get(d.influxdb_config_id, 0) + device_tag_counts.get(d.id, 0)
+            )
     influx_summary = []
     for cfg in influx_configs:
-        device_count = db.query(models.Device).filter(
-            models.Device.influxdb_config_id == cfg.id
-        ).count()
-        tag_count = db.query(models.Tag).join(models.Device).filter(
-            models.Device.influxdb_config_id == cfg.id,
-            models.Tag.enabled == True,
-        ).count()
         influx_summary.append({
             "id": cfg.id,
             "name": cfg.name,
@@ -145,26 +116,22 @@ def get_metrics(db: Session = Depends(get_db)):
             "org": cfg.org,
             "bucket": cfg.bucket,
             "is_default": cfg.is_default,
-            "device_count": device_count,
-            "tag_count": tag_count,
+            "device_count": influx_device_counts.get(cfg.id, 0),
+            "tag_count": influx_tag_totals.get(cfg.id, 0),
         })
 
     # Instance summaries
+    instance_device_counts = dict((await db.execute(
+        select(Device.telegraf_instance_id, func.count(Device.id)).group_by(Device.telegraf_instance_id)
+    )).all())
     instance_summary = []
     for inst in instances:
-        device_count = db.query(models.Device).filter(
-            models.Device.telegraf_instance_id == inst.id
-        ).count()
-        tag_count = db.query(models.Tag).filter(
-            models.Tag.telegraf_instance_id == inst.id,
-            models.Tag.enabled == True,
-        ).count()
         instance_summary.append({
             "id": inst.id,
             "name": inst.name,
             "enabled": inst.enabled,
-            "device_count": device_count,
-            "tag_count": tag_count,
+            "device_count": instance_device_counts.get(inst.id, 0),
+            "tag_count": sum(c for (inst_id, _), c in pair_counts.items() if inst_id == inst.id),
         })
 
     # Flow diagram data: devices -> instances -> influx targets
@@ -172,9 +139,7 @@ def get_metrics(db: Session = Depends(get_db)):
     for d in devices:
         if not d.enabled:
             continue
-        tag_count_for_device = db.query(models.Tag).filter(
-            models.Tag.device_id == d.id, models.Tag.enabled == True
-        ).count()
+        tag_count_for_device = device_tag_counts.get(d.id, 0)
         inst_name = None
         if d.telegraf_instance_id:
             inst_name = instance_map.get(d.telegraf_instance_id)
@@ -187,26 +152,20 @@ def get_metrics(db: Session = Depends(get_db)):
                 "tag_count": tag_count_for_device,
             })
 
+    # Devices in id order so influx targets keep their first-seen order per instance
+    devices_by_id = sorted(devices, key=lambda d: d.id)
     for inst in instances:
         if not inst.enabled:
             continue
         # Find unique influx targets for devices in this instance
-        inst_devices = db.query(models.Device).filter(
-            models.Device.telegraf_instance_id == inst.id,
-            models.Device.enabled == True,
-        ).all()
         influx_tag_counts = {}
-        for d in inst_devices:
-            if d.influxdb_config_id:
-                cfg = db.query(models.InfluxDBConfig).filter(
-                    models.InfluxDBConfig.id == d.influxdb_config_id
-                ).first()
-                if cfg:
-                    tc = db.query(models.Tag).filter(
-                        models.Tag.device_id == d.id,
-                        models.Tag.enabled == True,
-                    ).count()
-                    influx_tag_counts[cfg.name] = influx_tag_counts.get(cfg.name, 0) + tc
+        for d in devices_by_id:
+            if d.telegraf_instance_id != inst.id or not d.enabled:
+                continue
+            influx_name = influx_map.get(d.influxdb_config_id) if d.influxdb_config_id else None
+            if influx_name is not None:
+                tc = device_tag_counts.get(d.id, 0)
+                influx_tag_counts[influx_name] = influx_tag_counts.get(influx_name, 0) + tc
         for influx_name, tc in influx_tag_counts.items():
             if tc > 0:
                 flow_links.append({
@@ -232,3 +191,16 @@ def get_metrics(db: Session = Depends(get_db)):
         "instance_summary": instance_summary,
         "flow_links": flow_links,
     }
+
+
+@router.get("/prometheus")
+async def get_prometheus_metrics(db: AsyncSession = Depends(get_async_db)):
+    """OPC UA client metrics of every worker in the Prometheus text format."""
+    devices = (await db.execute(
+        select(models.Device.id, models.Device.name, models.Device.endpoint_url).order_by(models.Device.id)
+    )).all()
+    merged = await run_in_threadpool(opcua_metrics.collect)
+    return Response(
+        content=render_prometheus(merged, devices),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
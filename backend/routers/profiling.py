@@ -0,0 +1,51 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from profiling import profiler
+
+router = APIRouter(prefix="/profiling", tags=["profiling"])
+
+
+@router.get("/routes")
+def get_route_stats():
+    """Per-route totals and means, slowest total first."""
+    return profiler.routes()
+
+
+@router.get("/slow")
+def get_slow_requests():
+    """The slowest recent requests with their SQL statements."""
+    return profiler.slowest()
+
+
+@router.delete("")
+def reset_profiling():
+    profiler.reset()
+    return {"ok": True}
+
+
+@router.post("/sample")
+def arm_sampler(route: str, count: int = 1):
+    """Run the sampling profiler on the next ``count`` requests to ``route``.
+
+    ``route`` is either a route template (``/api/devices/{device_id}/tags``) or
+    a concrete path.
+    """
+    if count < 1:
+        raise HTTPException(status_code=400, detail="count must be at least 1")
+    profiler.arm(route, count)
+    return {"route": route, "count": count}
+
+
+@router.get("/samples")
+def list_samples():
+    return profiler.samples()
+
+
+@router.get("/samples/{sample_id}", response_class=PlainTextResponse)
+def get_sample(sample_id: str):
+    """Collapsed stacks (flamegraph.pl / speedscope format)."""
+    sample = profiler.sample(sample_id)
+    if not sample:
+        raise HTTPException(status_code=404, detail="Sample not found")
+    return sample["collapsed"]
@@ -0,0 +1,60 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+import schemas
+from responses import result_rows
+from services import search_index
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+MAX_HITS = 500
+
+
+@router.get("", response_model=schemas.SearchResult)
+async def search(
+    q: str,
+    kind: Literal["all", "tags", "nodes"] = "all",
+    device_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=MAX_HITS),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Ranked tag and scanned-node hits across all devices.
+
+    Each kind is in bm25 order; with ``kind=all`` tags and nodes alternate,
+    since ``rank`` is only comparable between hits of the same kind.
+    """
+    if not search_index.available():
+        raise HTTPException(status_code=501, detail="Full-text search needs SQLite with FTS5; "
+                                                    "use /api/tags?q= for substring filtering")
+    match = search_index.match_query(q)
+    if match is None:
+        return schemas.SearchResult(query=q, hits=[])
+
+    tag_hits, node_hits = [], []
+    if kind in ("all", "tags"):
+        tag_hits = result_rows(await db.execute(
+            search_index.tag_hits_stmt(), {"match": search_index.tag_match(match, device_id), "limit": limit},
+        ))
+    if kind in ("all", "nodes"):
+        node_hits = result_rows(await db.execute(
+            search_index.node_hits_stmt(device_id),
+            {"match": match, "limit": limit, **search_index.node_params(device_id)},
+        ))
+    hits = _interleave(tag_hits, node_hits)[:limit]
+    return schemas.SearchResult(query=q, hits=[schemas.SearchHit(**hit) for hit in hits])
+
+
+def _interleave(first: list, second: list) -> list:
+    """Alternate two ranked lists, keeping each one's order.
+
+    Ranks from the two FTS tables are not comparable (different column
+    weights and corpus statistics), so they are never sorted together.
+    """
+    merged = []
+    for pair in zip(first, second):
+        merged.extend(pair)
+    shorter = min(len(first), len(second))
+    return merged + first[shorter:] + second[shorter:]
@@ -1,8 +1,14 @@
+import threading
+import time
+from typing import Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from database import get_db
 import models
 import schemas
+from services.shared_state import shared_state
 
 router = APIRouter(prefix="/system", tags=["system"])
 
@@ -43,15 +49,82 @@ DEFAULTS = {
     "docker_tls_ca_path": "",
     "docker_tls_cert_path": "",
     "docker_tls_key_path": "",
+    "live_sampling_interval_ms": "1000",
+    "telegraf_internal_metrics": "false",
+    "telegraf_metrics_base_port": "9273",
+    "telegraf_metrics_host": "",
 }
 
 
+# The system_config table is cached per process. Writers (_set_key,
+# _delete_key) bump a version counter in shared state once their session
+# commits; each worker re-checks the counter at most every
+# CONFIG_CHECK_INTERVAL seconds and reloads when it moved, so changes made on
+# another worker show up within that interval.
+CONFIG_CHECK_INTERVAL = 1.0
+_CONFIG_VERSION_KEY = "system-config:version"
+_DIRTY = "system_config_dirty"
+
+_config_lock = threading.Lock()
+_config_cache = {"values": None, "version": 0, "checked": 0.0, "min_version": 0}
+
+
+def _cached_config() -> Tuple[Optional[dict], int]:
+    """The cached settings if still current (else None), and the version to load under."""
+    now = time.monotonic()
+    with _config_lock:
+        values, version, checked = _config_cache["values"], _config_cache["version"], _config_cache["checked"]
+    if values is not None and now - checked < CONFIG_CHECK_INTERVAL:
+        return values, version
+    current = shared_state.get_int(_CONFIG_VERSION_KEY)
+    if values is not None and current == version:
+        with _config_lock:
+            _config_cache["checked"] = now
+        return values, version
+    return None, current
+
+
+def _store_config(values: dict, version: int) -> None:
+    with _config_lock:
+        # A load that raced a local write must not overwrite its invalidation
+        if version >= _config_cache["min_version"]:
+            _config_cache.update(values=values, version=version, checked=time.monotonic())
+
+
+def _invalidate_config() -> None:
+    version = shared_state.incr(_CONFIG_VERSION_KEY)
+    with _config_lock:
+        _config_cache.update(values=None, min_version=version)
+
+
+@event.listens_for(Session, "after_commit")
+def _config_committed(session):
+    if session.info.pop(_DIRTY, False):
+        _invalidate_config()
+
+
+@event.listens_for(Session, "after_rollback")
+def _config_rolled_back(session):
+    session.info.pop(_DIRTY, None)
+
+
 def _get_config_dict(db: Session) -> dict:
-    rows = db.query(models.SystemConfig).all()
-    cfg = dict(DEFAULTS)
-    for row in rows:
-        cfg[row.key] = row.value
-    return cfg
+    values, version = _cached_config()
+    if values is None:
+        values = dict(DEFAULTS)
+        values.update(db.query(models.SystemConfig.key, models.SystemConfig.value).all())
+        _store_config(values, version)
+    return dict(values)
+
+
+async def _get_config_dict_async(db: AsyncSession) -> dict:
+    values, version = _cached_config()
+    if values is None:
+        result = await db.execute(select(models.SystemConfig.key, models.SystemConfig.value))
+        values = dict(DEFAULTS)
+        values.update(result.all())
+        _store_config(values, version)
+    return dict(values)
 
 
 def _set_key(db: Session, key: str, value: str):
@@ -61,6 +134,12 @@ def _set_key(db: Session, key: str, value: str):
     else:
         row = models.SystemConfig(key=key, value=value)
         db.add(row)
+    db.info[_DIRTY] = True
+
+
+def _delete_key(db: Session, key: str):
+    db.query(models.SystemConfig).filter(models.SystemConfig.key == key).delete()
+    db.info[_DIRTY] = True
 
 
 @router.get("/config", response_model=schemas.SystemConfigOut)
@@ -83,6 +162,7 @@ def get_config(db: Session = Depends(get_db)):
         agent_flush_jitter=cfg.get("agent_flush_jitter", "0s"),
         agent_hostname=cfg.get("agent_hostname", ""),
         agent_omit_hostname=cfg.get("agent_omit_hostname", "false").lower() == "true",
+        live_sampling_interval_ms=int(cfg.get("live_sampling_interval_ms", "1000")),
     )
 
 
@@ -105,6 +185,7 @@ def update_config(payload: schemas.SystemConfigUpdate, db: Session = Depends(get
         "agent_flush_jitter": payload.agent_flush_jitter or "0s",
         "agent_hostname": payload.agent_hostname or "",
         "agent_omit_hostname": str(payload.agent_omit_hostname).lower(),
+        "live_sampling_interval_ms": str(payload.live_sampling_interval_ms),
     }
     for key, value in fields.items():
         _set_key(db, key, value)
@@ -0,0 +1,198 @@
+"""Tags across devices: keyset-paginated listing and set-based bulk updates.
+
+Pages are cut with a cursor holding the sort value and id of the last row
+returned, so every page is an index range scan no matter how deep the client
+has scrolled (``OFFSET`` would re-read every row before the page).
+
+Bulk updates take the same kind of filter and run as one ``UPDATE ... WHERE``;
+only the devices and instances whose tags actually changed get their config
+and tag versions bumped.
+"""
+
+import base64
+import json
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, case, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import get_db, get_async_db
+import models
+import schemas
+from responses import FastJSONResponse, result_rows
+from services import versions
+from routers.devices import _tag_rows_select
+
+router = APIRouter(prefix="/tags", tags=["tags"])
+
+MAX_PAGE_SIZE = 1000
+
+_SORT_COLUMNS = {
+    "path": models.Tag.path,
+    "display_name": models.Tag.display_name,
+    "scan_class": models.ScanClass.name,
+}
+_SORT_LABELS = {"path": "path", "display_name": "display_name", "scan_class": "scan_class_name"}
+
+
+def _encode_cursor(value, tag_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, tag_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        value, tag_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(tag_id, int) or not (value is None or isinstance(value, str)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, tag_id
+
+
+def _after(col, value, tag_id: int, desc: bool):
+    """Rows strictly after ``(value, tag_id)`` in ``ORDER BY col, id``.
+
+    SQLite sorts NULLs first ascending and last descending; the row-value
+    comparison is what lets it seek the index instead of filtering a scan.
+    """
+    if value is None:
+        if desc:
+            return and_(col.is_(None), models.Tag.id < tag_id)
+        return or_(col.isnot(None), and_(col.is_(None), models.Tag.id > tag_id))
+    if desc:
+        return or_(tuple_(col, models.Tag.id) < tuple_(value, tag_id), col.is_(None))
+    return tuple_(col, models.Tag.id) > tuple_(value, tag_id)
+
+
+def _assigned(col, value: int):
+    """``col = value``, where 0 stands for unassigned (NULL)."""
+    return col.is_(None) if value == 0 else col == value
+
+
+def _filters(device_id=None, enabled=None, scan_class_id=None, telegraf_instance_id=None, q=None,
+             tag_ids=None, path_prefix=None) -> list:
+    conditions = []
+    if device_id:
+        conditions.append(models.Tag.device_id.in_(device_id))
+    if tag_ids:
+        conditions.append(models.Tag.id.in_(tag_ids))
+    if enabled is not None:
+        conditions.append(models.Tag.enabled == enabled)
+    if scan_class_id is not None:
+        conditions.append(_assigned(models.Tag.scan_class_id, scan_class_id))
+    if telegraf_instance_id is not None:
+        conditions.append(_assigned(models.Tag.telegraf_instance_id, telegraf_instance_id))
+    if path_prefix:
+        prefix = path_prefix.rstrip("/")
+        conditions.append(or_(
+            models.Tag.path == prefix, models.Tag.path.startswith(prefix + "/", autoescape=True),
+        ))
+    if q:
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append(or_(*(
+            col.ilike(pattern, escape="\\")
+            for col in (models.Tag.display_name, models.Tag.path, models.Tag.node_id, models.Tag.measurement_name)
+        )))
+    return conditions
+
+
+@router.get("", response_model=schemas.TagPage)
+async def list_tags(
+    device_id: Optional[List[int]] = Query(None),
+    enabled: Optional[bool] = None,
+    scan_class_id: Optional[int] = None,
+    telegraf_instance_id: Optional[int] = None,
+    q: Optional[str] = None,
+    sort: Literal["path", "display_name", "scan_class"] = "path",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(200, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fast: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """One page of tags; pass ``next_cursor`` back as ``cursor`` for the next one."""
+    conditions = _filters(device_id, enabled, scan_class_id, telegraf_instance_id, q)
+    col = _SORT_COLUMNS[sort]
+    desc = order == "desc"
+
+    stmt = _tag_rows_select().where(*conditions)
+    if cursor:
+        stmt = stmt.where(_after(col, *_decode_cursor(cursor), desc))
+    order_by = (col.desc(), models.Tag.id.desc()) if desc else (col, models.Tag.id)
+    rows = result_rows(await db.execute(stmt.order_by(*order_by).limit(limit + 1)))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(last[_SORT_LABELS[sort]], last["id"])
+
+    totals = {"total": None, "enabled_total": None}
+    if not cursor:
+        total, enabled_total = (await db.execute(
+            select(func.count(), func.sum(case((models.Tag.enabled == True, 1), else_=0)))
+            .select_from(models.Tag).where(*conditions)
+        )).one()
+        totals = {"total": total, "enabled_total": enabled_total or 0}
+
+    if fast:
+        return FastJSONResponse({"items": rows, "next_cursor": next_cursor, **totals})
+    return schemas.TagPage(items=[schemas.TagOut(**row) for row in rows], next_cursor=next_cursor, **totals)
+
+
+def _patch_values(patch: schemas.TagPatch, db: Session) -> dict:
+    values = patch.model_dump(exclude_none=True)
+    for field, model in (("scan_class_id", models.ScanClass), ("telegraf_instance_id", models.TelegrafInstance)):
+        if field not in values:
+            continue
+        if values[field] == 0:
+            values[field] = None
+        elif db.get(model, values[field]) is None:
+            raise HTTPException(status_code=400, detail=f"{model.__name__} {values[field]} not found")
+    return values
+
+
+@router.patch("", response_model=schemas.BulkTagUpdateResult)
+def bulk_update_tags(payload: schemas.BulkTagUpdate, db: Session = Depends(get_db)):
+    """Apply ``patch`` to every tag matching ``filter`` in one UPDATE."""
+    f = payload.filter
+    if f.device_ids == [] or f.tag_ids == []:
+        return schemas.BulkTagUpdateResult(matched=0, updated=0, devices=[], instances=[])
+    conditions = _filters(
+        device_id=f.device_ids, enabled=f.enabled, scan_class_id=f.scan_class_id,
+        telegraf_instance_id=f.telegraf_instance_id, tag_ids=f.tag_ids, path_prefix=f.path_prefix,
+    )
+    if not conditions:
+        raise HTTPException(status_code=400, detail="The filter needs at least one criterion")
+    values = _patch_values(payload.patch, db)
+    if not values:
+        raise HTTPException(status_code=400, detail="Nothing to change")
+
+    # Rows the patch leaves as they are are not written, nor their instances bumped
+    changes = or_(*(getattr(models.Tag, field).is_distinct_from(value) for field, value in values.items()))
+    groups = db.execute(
+        select(
+            models.Tag.device_id, models.Tag.telegraf_instance_id,
+            func.count(), func.sum(case((changes, 1), else_=0)),
+        ).where(*conditions).group_by(models.Tag.device_id, models.Tag.telegraf_instance_id)
+    ).all()
+    matched = sum(count for _, _, count, _ in groups)
+    touched = [(device_id, instance_id) for device_id, instance_id, _, changed in groups if changed]
+    if not touched:
+        return schemas.BulkTagUpdateResult(matched=matched, updated=0, devices=[], instances=[])
+
+    result = db.execute(
+        update(models.Tag).where(*conditions, changes).values(**values)
+        .execution_options(synchronize_session=False, versions_marked=True)
+    )
+    devices = sorted({device_id for device_id, _ in touched})
+    instances = {instance_id for _, instance_id in touched if instance_id is not None}
+    if values.get("telegraf_instance_id") is not None:
+        instances.add(values["telegraf_instance_id"])
+    versions.mark(db, *(f"device-tags:{d}" for d in devices), *(f"instance:{i}" for i in instances))
+    db.commit()
+    return schemas.BulkTagUpdateResult(
+        matched=matched, updated=result.rowcount, devices=devices, instances=sorted(instances),
+    )
@@ -1,23 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import PlainTextResponse, Response
-from sqlalchemy.orm import Session, joinedload
-from database import get_db
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from typing import Callable, Optional
+from database import get_db, SessionLocal
 import models
 import schemas
-from services import telegraf_generator
+from services import telegraf_generator, config_loading
 from services.telegraf_parser import parse_telegraf_config
-from routers.system import _get_config_dict, _set_key
+from routers.system import _get_config_dict, _set_key, _delete_key
 from routers.devices import _scan_cache
+from services import jobs
 
 router = APIRouter(prefix="/telegraf", tags=["telegraf"])
 
-
-def _load_devices(db: Session):
-    return db.query(models.Device).options(
-        joinedload(models.Device.tags).joinedload(models.Tag.scan_class),
-        joinedload(models.Device.node_includes).joinedload(models.NodeInclude.scan_class),
-        joinedload(models.Device.influxdb_config),
-    ).filter(models.Device.enabled == True).order_by(models.Device.name).all()
+# Tags inserted (and committed) per batch during an import
+IMPORT_CHUNK_SIZE = 5000
 
 
 def _get_default_influxdb(db: Session):
@@ -34,18 +32,16 @@ def _get_default_scan_class(db: Session):
 
 @router.get("/config", response_class=PlainTextResponse)
 def get_config(db: Session = Depends(get_db)):
+    system_cfg = _get_config_dict(db)
     # Check for manual override
-    override = db.query(models.SystemConfig).filter(
-        models.SystemConfig.key == "telegraf_config_override"
-    ).first()
-    if override and override.value:
+    override = system_cfg.get("telegraf_config_override")
+    if override:
         return PlainTextResponse(
-            content=override.value,
+            content=override,
             headers={"X-Config-Mode": "override"},
         )
 
-    devices = _load_devices(db)
-    system_cfg = _get_config_dict(db)
+    devices = config_loading.load_devices(db)
     default_influx = _get_default_influxdb(db)
     default_sc = _get_default_scan_class(db)
     content = telegraf_generator.generate_config(devices, system_cfg, default_influx, scan_cache=_scan_cache, default_scan_class=default_sc)
@@ -57,15 +53,13 @@ def get_config(db: Session = Depends(get_db)):
 
 @router.get("/config/download")
 def download_config(db: Session = Depends(get_db)):
+    system_cfg = _get_config_dict(db)
     # Check for manual override
-    override = db.query(models.SystemConfig).filter(
-        models.SystemConfig.key == "telegraf_config_override"
-    ).first()
-    if override and override.value:
-        content = override.value
+    override = system_cfg.get("telegraf_config_override")
+    if override:
+        content = override
     else:
-        devices = _load_devices(db)
-        system_cfg = _get_config_dict(db)
+        devices = config_loading.load_devices(db)
         default_influx = _get_default_influxdb(db)
         default_sc = _get_default_scan_class(db)
         content = telegraf_generator.generate_config(devices, system_cfg, default_influx, scan_cache=_scan_cache, default_scan_class=default_sc)
@@ -87,12 +81,8 @@ def save_override(payload: schemas.ConfigSaveRequest, db: Session = Depends(get_
 
 @router.delete("/config/override")
 def revert_override(db: Session = Depends(get_db)):
-    row = db.query(models.SystemConfig).filter(
-        models.SystemConfig.key == "telegraf_config_override"
-    ).first()
-    if row:
-        db.delete(row)
-        db.commit()
+    _delete_key(db, "telegraf_config_override")
+    db.commit()
     return {"status": "reverted"}
 
 
@@ -112,28 +102,30 @@ def import_preview(payload: schemas.ConfigSaveRequest):
     )
 
 
-@router.post("/import/confirm", response_model=schemas.ImportConfirmResponse)
-def import_confirm(payload: schemas.ImportConfirmRequest, db: Session = Depends(get_db)):
+def _import_config(payload: schemas.ImportConfirmRequest, db: Session,
+                   progress: Optional[Callable[[int, int], None]] = None) -> schemas.ImportConfirmResponse:
+    """Create InfluxDB configs, devices and tags from a previewed import.
+
+    Existing rows are looked up once up front (name -> row maps and a set of
+    node_ids per device) and new tags are bulk-inserted in chunks of
+    IMPORT_CHUNK_SIZE, each committed separately.  ``progress(done, total)``
+    is called after every chunk.
+    """
     warnings = []
     influxdb_created = 0
     influxdb_skipped = 0
     devices_created = 0
     devices_skipped = 0
-    tags_created = 0
-
-    # Map influxdb name → db id for device linking
-    influx_name_to_id = {}
 
     # Create InfluxDB configs
+    influx_by_name = {cfg.name: cfg for cfg in db.query(models.InfluxDBConfig).all()}
+    imported_influx = {}
     for cfg in payload.influxdb_configs:
-        existing = db.query(models.InfluxDBConfig).filter(
-            models.InfluxDBConfig.name == cfg.name
-        ).first()
+        existing = influx_by_name.get(cfg.name)
         if existing:
+            imported_influx[cfg.name] = existing
             if payload.skip_existing:
                 influxdb_skipped += 1
-                influx_name_to_id[cfg.name] = existing.id
-                continue
             else:
                 # Update existing
                 existing.url = cfg.url
@@ -141,9 +133,8 @@ def import_confirm(payload: schemas.ImportConfirmRequest, db: Session = Depends(
                 existing.org = cfg.org
                 existing.bucket = cfg.bucket
                 existing.version = cfg.version
-                influx_name_to_id[cfg.name] = existing.id
                 influxdb_created += 1
-                continue
+            continue
 
         new_cfg = models.InfluxDBConfig(
             name=cfg.name,
@@ -154,9 +145,11 @@ def import_confirm(payload: schemas.ImportConfirmRequest, db: Session = Depends(
             version=cfg.version,
         )
         db.add(new_cfg)
-        db.flush()
-        influx_name_to_id[cfg.name] = new_cfg.id
+        influx_by_name[cfg.name] = imported_influx[cfg.name] = new_cfg
         influxdb_created += 1
+    db.flush()
+    # Map influxdb name → db id for device linking
+    influx_name_to_id = {name: cfg.id for name, cfg in imported_influx.items()}
 
     # Get default scan class
     default_sc = db.query(models.ScanClass).filter(
@@ -164,54 +157,60 @@ def import_confirm(payload: schemas.ImportConfirmRequest, db: Session = Depends(
     ).first()
     default_sc_id = default_sc.id if default_sc else None
 
-    # Create devices + tags
+    # Create devices
+    device_ids_by_name = dict(db.query(models.Device.name, models.Device.id).all())
+    new_devices = {}
+    targets = []  # (device name, tags)
     for dev in payload.devices:
-        existing = db.query(models.Device).filter(
-            models.Device.name == dev.name
-        ).first()
-        if existing:
+        if dev.name in device_ids_by_name or dev.name in new_devices:
             if payload.skip_existing:
                 devices_skipped += 1
                 continue
-            else:
-                device = existing
-                devices_created += 1
+            devices_created += 1
         else:
-            influx_id = influx_name_to_id.get(dev.influxdb_name)
-            device = models.Device(
+            new_devices[dev.name] = models.Device(
                 name=dev.name,
                 endpoint_url=dev.endpoint_url,
                 username=dev.username,
                 password=dev.password,
                 security_policy=dev.security_policy,
-                influxdb_config_id=influx_id,
+                influxdb_config_id=influx_name_to_id.get(dev.influxdb_name),
             )
-            db.add(device)
-            db.flush()
             devices_created += 1
-
-        # Add tags
-        for tag in dev.tags:
-            existing_tag = db.query(models.Tag).filter(
-                models.Tag.device_id == device.id,
-                models.Tag.node_id == tag.node_id,
-            ).first()
-            if existing_tag:
+        targets.append((dev.name, dev.tags))
+    db.add_all(new_devices.values())
+    db.flush()
+    device_ids_by_name.update({name: d.id for name, d in new_devices.items()})
+
+    # Existing node_ids of the pre-existing devices we are adding tags to
+    existing_node_ids = {}
+    old_device_ids = {device_ids_by_name[name] for name, _ in targets if name not in new_devices}
+    if old_device_ids:
+        rows = db.query(models.Tag.device_id, models.Tag.node_id).filter(
+            models.Tag.device_id.in_(old_device_ids)
+        )
+        for device_id, node_id in rows:
+            existing_node_ids.setdefault(device_id, set()).add(node_id)
+
+    new_tags = []
+    for name, tags in targets:
+        device_id = device_ids_by_name[name]
+        seen = existing_node_ids.setdefault(device_id, set())
+        for tag in tags:
+            if tag.node_id in seen:
                 continue
-
-            new_tag = models.Tag(
-                device_id=device.id,
-                node_id=tag.node_id,
-                namespace=tag.namespace,
-                identifier=tag.identifier,
-                identifier_type=tag.identifier_type,
-                display_name=tag.display_name,
-                measurement_name=tag.measurement_name,
-                scan_class_id=default_sc_id,
-                enabled=True,
-            )
-            db.add(new_tag)
-            tags_created += 1
+            seen.add(tag.node_id)
+            new_tags.append({
+                "device_id": device_id,
+                "node_id": tag.node_id,
+                "namespace": tag.namespace,
+                "identifier": tag.identifier,
+                "identifier_type": tag.identifier_type,
+                "display_name": tag.display_name,
+                "measurement_name": tag.measurement_name,
+                "scan_class_id": default_sc_id,
+                "enabled": True,
+            })
 
     # Save passthrough sections
     passthrough_saved = False
@@ -221,12 +220,45 @@ def import_confirm(payload: schemas.ImportConfirmRequest, db: Session = Depends(
 
     db.commit()
 
+    if progress:
+        progress(0, len(new_tags))
+    for start in range(0, len(new_tags), IMPORT_CHUNK_SIZE):
+        chunk = new_tags[start:start + IMPORT_CHUNK_SIZE]
+        db.execute(insert(models.Tag), chunk)
+        db.commit()
+        if progress:
+            progress(start + len(chunk), len(new_tags))
+
     return schemas.ImportConfirmResponse(
         influxdb_created=influxdb_created,
         influxdb_skipped=influxdb_skipped,
         devices_created=devices_created,
         devices_skipped=devices_skipped,
-        tags_created=tags_created,
+        tags_created=len(new_tags),
         passthrough_saved=passthrough_saved,
         warnings=warnings,
     )
+
+
+@router.post("/import/confirm", response_model=schemas.ImportConfirmResponse)
+def import_confirm(payload: schemas.ImportConfirmRequest, db: Session = Depends(get_db)):
+    return _import_config(payload, db)
+
+
+def _import_job(ctx: jobs.JobContext, payload: schemas.ImportConfirmRequest) -> dict:
+    def progress(done: int, total: int):
+        ctx.check_cancelled()
+        ctx.progress(100 * done / total if total else 100, f"{done}/{total} tags", force=done == total)
+
+    db = SessionLocal()
+    try:
+        return _import_config(payload, db, progress=progress).model_dump()
+    finally:
+        db.close()
+
+
+@router.post("/import/jobs", response_model=schemas.JobStarted)
+def start_import_job(payload: schemas.ImportConfirmRequest):
+    """Run an import as a background job; follow it under /api/jobs/{job_id}."""
+    job_id = jobs.submit("import", _import_job, payload, title="Import Telegraf config")
+    return schemas.JobStarted(job_id=job_id)
@@ -1,32 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import PlainTextResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from database import get_db
+from database import get_db, get_async_db, SessionLocal
 import models
 import schemas
-from services import telegraf_generator
-from routers.system import _get_config_dict
-from routers.devices import _scan_cache
+from services import telegraf_generator, opcua_service, config_loading, jobs, versions
+from responses import FastJSONResponse, etag, etag_headers, not_modified
+from routers.system import _get_config_dict, _get_config_dict_async
+from routers.devices import _scan_cache, _validation_results
 
 router = APIRouter(prefix="/telegraf-instances", tags=["telegraf-instances"])
 
 
-def _load_instance(db: Session, instance_id: int):
-    inst = db.query(models.TelegrafInstance).options(
-        joinedload(models.TelegrafInstance.devices)
-        .joinedload(models.Device.tags)
-        .joinedload(models.Tag.scan_class),
-        joinedload(models.TelegrafInstance.devices)
-        .joinedload(models.Device.node_includes)
-        .joinedload(models.NodeInclude.scan_class),
-        joinedload(models.TelegrafInstance.devices)
-        .joinedload(models.Device.influxdb_config),
-    ).filter(models.TelegrafInstance.id == instance_id).first()
-    if not inst:
-        raise HTTPException(status_code=404, detail="Telegraf instance not found")
-    return inst
-
-
 def _get_default_influxdb(db: Session):
     return db.query(models.InfluxDBConfig).filter(
         models.InfluxDBConfig.is_default == True
@@ -39,6 +27,20 @@ def _get_default_scan_class(db: Session):
     ).first()
 
 
+async def _get_default_influxdb_async(db: AsyncSession):
+    result = await db.execute(
+        select(models.InfluxDBConfig).where(models.InfluxDBConfig.is_default == True).limit(1)
+    )
+    return result.scalars().first()
+
+
+async def _get_default_scan_class_async(db: AsyncSession):
+    result = await db.execute(
+        select(models.ScanClass).where(models.ScanClass.is_default == True).limit(1)
+    )
+    return result.scalars().first()
+
+
 def _instance_out(inst, db: Session) -> schemas.TelegrafInstanceOut:
     tag_count = db.query(models.Tag).filter(
         models.Tag.telegraf_instance_id == inst.id,
@@ -54,6 +56,89 @@ def _instance_out(inst, db: Session) -> schemas.TelegrafInstanceOut:
     return out
 
 
+def _same_data_type(stored: str, result: dict) -> bool:
+    """Compare a persisted Tag.data_type with the server's DataType (any of its string forms)."""
+    if not stored or not result.get("data_type"):
+        return True
+    return stored in (result["data_type"], result.get("data_type_str", ""), result.get("data_type_name", ""))
+
+
+def _validate_instance_tags(db: Session, instance_id: int, disable_broken: bool = False) -> schemas.TagValidationReport:
+    """Check every enabled tag of an instance against its live OPC UA server.
+
+    Node lookups are cached per device (see ``_validation_results``) until the
+    next scan, so repeated deploys only hit the server for nodes not yet checked.
+    """
+    tags = db.query(models.Tag).options(
+        joinedload(models.Tag.device),
+    ).filter(
+        models.Tag.telegraf_instance_id == instance_id,
+        models.Tag.enabled == True,
+    ).all()
+
+    report = schemas.TagValidationReport(instance_id=instance_id, checked=len(tags))
+    by_device = {}
+    for tag in tags:
+        by_device.setdefault(tag.device_id, []).append(tag)
+
+    broken = []
+    for device_id, device_tags in by_device.items():
+        device = device_tags[0].device
+        cached = _validation_results(device_id)
+        to_check = sorted({t.node_id for t in device_tags if t.node_id not in cached})
+        if to_check:
+            try:
+                results = opcua_service.validate_nodes(
+                    device.endpoint_url, to_check, device.username, device.password,
+                    security_policy=device.security_policy or "None",
+                )
+            except Exception as e:
+                report.device_errors.append(schemas.TagValidationDeviceError(
+                    device_id=device_id, device_name=device.name, error=str(e),
+                ))
+                continue
+            # Transient per-node errors are not cached
+            cached.update({nid: r for nid, r in results.items() if r["status"] != "error"})
+        else:
+            results = {}
+
+        for tag in device_tags:
+            result = cached.get(tag.node_id) or results.get(tag.node_id)
+            if result is None:
+                continue
+            issue = dict(
+                tag_id=tag.id, device_id=device_id, device_name=device.name,
+                node_id=tag.node_id, display_name=tag.display_name,
+            )
+            if result["status"] == "missing":
+                report.missing.append(schemas.TagValidationIssue(detail=result["message"], **issue))
+                broken.append(tag)
+            elif result["status"] == "error":
+                report.device_errors.append(schemas.TagValidationDeviceError(
+                    device_id=device_id, device_name=device.name,
+                    error=f"{tag.node_id}: {result['message']}",
+                ))
+            elif result["node_class"] != "Variable":
+                report.changed.append(schemas.TagValidationIssue(
+                    detail=f"Node is now a {result['node_class']}, not a Variable", **issue,
+                ))
+                broken.append(tag)
+            elif not _same_data_type(tag.data_type or "", result):
+                report.type_mismatch.append(schemas.TagValidationIssue(
+                    detail=f"Data type changed from {tag.data_type} to {result.get('data_type_name') or result['data_type']}",
+                    **issue,
+                ))
+            else:
+                report.ok += 1
+
+    if disable_broken and broken:
+        for tag in broken:
+            tag.enabled = False
+        db.commit()
+        report.disabled = len(broken)
+    return report
+
+
 # --- Static routes MUST come before /{instance_id} routes ---
 
 @router.get("", response_model=list[schemas.TelegrafInstanceOut])
@@ -93,43 +178,79 @@ def create_instance(payload: schemas.TelegrafInstanceCreate, db: Session = Depen
 
 
 @router.get("/configs", response_model=list[schemas.TelegrafInstanceConfigOut])
-def get_all_configs(db: Session = Depends(get_db)):
+async def get_all_configs(request: Request, response: Response, fast: bool = False,
+                          db: AsyncSession = Depends(get_async_db)):
     """Get generated configs for all instances (per-tag assignment)."""
-    instances = db.query(models.TelegrafInstance).filter(
-        models.TelegrafInstance.enabled == True
-    ).order_by(models.TelegrafInstance.name).all()
-
-    system_cfg = _get_config_dict(db)
-    default_influx = _get_default_influxdb(db)
-    default_sc = _get_default_scan_class(db)
-
-    result = []
-    for inst in instances:
-        # Get all tags assigned to this instance
-        tags = db.query(models.Tag).options(
-            joinedload(models.Tag.scan_class),
-            joinedload(models.Tag.device).joinedload(models.Device.influxdb_config),
-        ).filter(
-            models.Tag.telegraf_instance_id == inst.id,
-            models.Tag.enabled == True,
-        ).all()
+    tag = etag("configs", fast, versions.current("config", "tags", "instances"))
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    instances = (await db.execute(
+        select(models.TelegrafInstance).where(
+            models.TelegrafInstance.enabled == True
+        ).order_by(models.TelegrafInstance.name)
+    )).scalars().all()
+
+    system_cfg = await _get_config_dict_async(db)
+    default_influx = await _get_default_influxdb_async(db)
+    default_sc = await _get_default_scan_class_async(db)
+
+    # One query for every instance's tags; rendering is CPU-bound, keep it off the event loop
+    rows = (await db.execute(config_loading.all_instance_tags_stmt([inst.id for inst in instances]))).all()
+    rendered = await run_in_threadpool(
+        telegraf_generator.render_instances,
+        config_loading.group_instance_tags(rows), system_cfg,
+        config_loading.influx_target(default_influx), config_loading.scan_class_row(default_sc),
+    )
+    result = [
+        dict(instance_id=inst.id, instance_name=inst.name, **rendered[inst.id])
+        for inst in instances if inst.id in rendered
+    ]
+    if fast:
+        return FastJSONResponse(result, headers=etag_headers(tag))
+    response.headers.update(etag_headers(tag))
+    return [schemas.TelegrafInstanceConfigOut(**r) for r in result]
+
+
+def _render_configs_job(ctx: jobs.JobContext) -> list:
+    """Render every enabled instance's config (the job variant of GET /configs)."""
+    db = SessionLocal()
+    try:
+        instances = db.query(models.TelegrafInstance).filter(
+            models.TelegrafInstance.enabled == True
+        ).order_by(models.TelegrafInstance.name).all()
+        system_cfg = _get_config_dict(db)
+        default_influx = _get_default_influxdb(db)
+        default_sc = _get_default_scan_class(db)
+
+        names = {inst.id: inst.name for inst in instances}
+
+        # Fetched up front: an open SQLite read cursor would block the progress writes
+        rows = db.execute(config_loading.all_instance_tags_stmt(names)).all()
+
+        def groups():
+            for i, (instance_id, tags) in enumerate(config_loading.group_instance_tags(rows)):
+                ctx.check_cancelled()
+                ctx.progress(100 * i / len(instances), f"Rendering {names[instance_id]}")
+                yield instance_id, tags
+
+        rendered = telegraf_generator.render_instances(
+            groups(), system_cfg,
+            config_loading.influx_target(default_influx), config_loading.scan_class_row(default_sc),
+        )
+        return [
+            dict(instance_id=inst.id, instance_name=inst.name, **rendered[inst.id])
+            for inst in instances if inst.id in rendered
+        ]
+    finally:
+        db.close()
 
-        if not tags:
-            continue
 
-        config = telegraf_generator.generate_config_from_tags(
-            tags, system_cfg, default_influx,
-            scan_cache=_scan_cache, default_scan_class=default_sc,
-        )
-        device_ids = set(t.device_id for t in tags)
-        result.append(schemas.TelegrafInstanceConfigOut(
-            instance_id=inst.id,
-            instance_name=inst.name,
-            config=config,
-            device_count=len(device_ids),
-            tag_count=len(tags),
-        ))
-    return result
+@router.post("/configs/jobs", response_model=schemas.JobStarted)
+def start_render_configs_job():
+    """Render all instance configs as a background job; the job result holds the configs."""
+    job_id = jobs.submit("render", _render_configs_job, title="Render all instance configs")
+    return schemas.JobStarted(job_id=job_id)
 
 
 @router.post("/auto-create")
@@ -241,42 +362,53 @@ def delete_instance(instance_id: int, db: Session = Depends(get_db)):
     return {"ok": True}
 
 
+@router.post("/{instance_id}/validate", response_model=schemas.TagValidationReport)
+def validate_instance(instance_id: int, disable_broken: bool = False, db: Session = Depends(get_db)):
+    """Check the instance's enabled tags against the live servers before deploying."""
+    inst = db.query(models.TelegrafInstance).filter(
+        models.TelegrafInstance.id == instance_id
+    ).first()
+    if not inst:
+        raise HTTPException(status_code=404, detail="Telegraf instance not found")
+    return _validate_instance_tags(db, instance_id, disable_broken=disable_broken)
+
+
 @router.get("/{instance_id}/config", response_class=PlainTextResponse)
-def get_instance_config(instance_id: int, db: Session = Depends(get_db)):
-    inst = _load_instance(db, instance_id)
-    system_cfg = _get_config_dict(db)
-    default_influx = _get_default_influxdb(db)
-    default_sc = _get_default_scan_class(db)
-    tags = db.query(models.Tag).options(
-        joinedload(models.Tag.scan_class),
-        joinedload(models.Tag.device).joinedload(models.Device.influxdb_config),
-    ).filter(
-        models.Tag.telegraf_instance_id == instance_id,
-        models.Tag.enabled == True,
-    ).all()
-    content = telegraf_generator.generate_config_from_tags(
+async def get_instance_config(instance_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    tag = etag("config", instance_id, versions.current("config", "tags", f"instance:{instance_id}"))
+    cached = not_modified(request, tag)
+    if cached is not None:
+        return cached
+    if await db.get(models.TelegrafInstance, instance_id) is None:
+        raise HTTPException(status_code=404, detail="Telegraf instance not found")
+    system_cfg = await _get_config_dict_async(db)
+    default_influx = await _get_default_influxdb_async(db)
+    default_sc = await _get_default_scan_class_async(db)
+    tags = (await db.execute(config_loading.instance_tags_stmt(instance_id))).scalars().all()
+    content = await run_in_threadpool(
+        telegraf_generator.generate_config_from_tags,
         tags, system_cfg, default_influx,
         scan_cache=_scan_cache, default_scan_class=default_sc,
+        metrics_port=telegraf_generator.instance_metrics_port(system_cfg, instance_id),
     )
-    return PlainTextResponse(content=content)
+    return PlainTextResponse(content=content, headers=etag_headers(tag))
 
 
 @router.get("/{instance_id}/config/download")
 def download_instance_config(instance_id: int, db: Session = Depends(get_db)):
-    inst = _load_instance(db, instance_id)
+    inst = db.query(models.TelegrafInstance).filter(
+        models.TelegrafInstance.id == instance_id
+    ).first()
+    if not inst:
+        raise HTTPException(status_code=404, detail="Telegraf instance not found")
     system_cfg = _get_config_dict(db)
     default_influx = _get_default_influxdb(db)
     default_sc = _get_default_scan_class(db)
-    tags = db.query(models.Tag).options(
-        joinedload(models.Tag.scan_class),
-        joinedload(models.Tag.device).joinedload(models.Device.influxdb_config),
-    ).filter(
-        models.Tag.telegraf_instance_id == instance_id,
-        models.Tag.enabled == True,
-    ).all()
+    tags = config_loading.load_instance_tags(db, instance_id)
     content = telegraf_generator.generate_config_from_tags(
         tags, system_cfg, default_influx,
         scan_cache=_scan_cache, default_scan_class=default_sc,
+        metrics_port=telegraf_generator.instance_metrics_port(system_cfg, instance_id),
     )
     filename = f"telegraf-{inst.name}.conf"
     return Response(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Any, Optional, List
 from datetime import datetime
 
 
@@ -26,6 +26,8 @@ class SystemConfigOut(BaseModel):
     agent_flush_jitter: str
     agent_hostname: str
     agent_omit_hostname: bool
+    # Live value streaming
+    live_sampling_interval_ms: int = 1000
 
 
 class SystemConfigUpdate(BaseModel):
@@ -45,6 +47,8 @@ class SystemConfigUpdate(BaseModel):
     agent_flush_jitter: Optional[str] = "0s"
     agent_hostname: Optional[str] = ""
     agent_omit_hostname: Optional[bool] = False
+    # Live value streaming
+    live_sampling_interval_ms: Optional[int] = 1000
 
 
 # ScanClass schemas
@@ -174,6 +178,67 @@ class BulkTagSave(BaseModel):
     tags: List[TagCreate]
 
 
+class TagFilter(BaseModel):
+    """Tags to change; criteria combine with AND. 0 selects unassigned scan class/instance."""
+    device_ids: Optional[List[int]] = None
+    tag_ids: Optional[List[int]] = None
+    # Matches the path itself and everything below it
+    path_prefix: Optional[str] = None
+    scan_class_id: Optional[int] = None
+    telegraf_instance_id: Optional[int] = None
+    enabled: Optional[bool] = None
+
+
+class TagPatch(BaseModel):
+    """Fields to set; None leaves a field alone, 0 unassigns scan class/instance."""
+    scan_class_id: Optional[int] = None
+    telegraf_instance_id: Optional[int] = None
+    enabled: Optional[bool] = None
+    measurement_name: Optional[str] = None
+
+
+class BulkTagUpdate(BaseModel):
+    filter: TagFilter
+    patch: TagPatch
+
+
+class BulkTagUpdateResult(BaseModel):
+    matched: int
+    updated: int
+    devices: List[int]
+    instances: List[int]
+
+
+class SearchHit(BaseModel):
+    kind: str  # "tag" or "node" (from the device's last scan)
+    rank: float  # bm25, lower is better; comparable only between hits of the same kind
+    device_id: int
+    device_name: str
+    tag_id: Optional[int] = None
+    node_id: str
+    display_name: Optional[str] = ""
+    path: Optional[str] = ""
+    data_type: Optional[str] = ""
+    measurement_name: Optional[str] = None
+    enabled: Optional[bool] = None
+    scan_class_id: Optional[int] = None
+    telegraf_instance_id: Optional[int] = None
+    node_class: Optional[str] = None
+
+
+class SearchResult(BaseModel):
+    query: str
+    hits: List[SearchHit]
+
+
+class TagPage(BaseModel):
+    items: List[TagOut]
+    next_cursor: Optional[str] = None
+    # Totals over the filtered set; only on the first page (no cursor)
+    total: Optional[int] = None
+    enabled_total: Optional[int] = None
+
+
 # NodeInclude schemas
 class NodeIncludeBase(BaseModel):
     parent_node_id: str
@@ -263,6 +328,28 @@ class ImportConfirmResponse(BaseModel):
     warnings: List[str] = []
 
 
+class JobOut(BaseModel):
+    id: str
+    type: str
+    status: str  # queued | running | complete | error | cancelled
+    title: str = ""
+    progress: float = 0.0
+    message: str = ""
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class JobStarted(BaseModel):
+    job_id: str
+
+
 class ConfigSaveRequest(BaseModel):
     content: str
 
@@ -281,6 +368,16 @@ class InfluxTestRequest(BaseModel):
     version: Optional[int] = 2
 
 
+class WriteProbeRequest(BaseModel):
+    bucket: str  # scratch bucket; probe points are not deleted afterwards
+    batch_sizes: List[int] = [500, 1000, 5000, 10000]
+    concurrency: List[int] = [1, 2, 4]
+    step_seconds: float = 3.0
+    series: int = 1000
+    gzip: bool = True
+    outage_seconds: int = 60
+
+
 class OpcuaNodeOut(BaseModel):
     node_id: str
     namespace: int
@@ -295,6 +392,12 @@ class OpcuaNodeOut(BaseModel):
     data_type: Optional[str] = ""
 
 
+class DataTypeOut(BaseModel):
+    node_id: str
+    name: str
+    base_type: str
+
+
 # TelegrafInstance schemas
 class TelegrafInstanceBase(BaseModel):
     name: str
@@ -329,6 +432,37 @@ class TelegrafInstanceConfigOut(BaseModel):
     tag_count: int = 0
 
 
+class TagValidationIssue(BaseModel):
+    tag_id: int
+    device_id: int
+    device_name: str
+    node_id: str
+    display_name: str
+    detail: str
+
+
+class TagValidationDeviceError(BaseModel):
+    device_id: int
+    device_name: str
+    error: str
+
+
+class TagValidationReport(BaseModel):
+    """Each checked tag lands in exactly one of ok, missing, changed or
+    type_mismatch, unless device_errors says it could not be checked.
+
+    Type mismatches are warnings: those tags stay enabled and are deployed.
+    """
+    instance_id: int
+    checked: int = 0
+    ok: int = 0
+    missing: List[TagValidationIssue] = []
+    changed: List[TagValidationIssue] = []
+    type_mismatch: List[TagValidationIssue] = []
+    device_errors: List[TagValidationDeviceError] = []
+    disabled: int = 0
+
+
 class SplitSuggestion(BaseModel):
     name: str
     device_ids: List[int]
@@ -363,6 +497,9 @@ class DeploymentSettingsOut(BaseModel):
     docker_tls_ca_path: str = ""
     docker_tls_cert_path: str = ""
     docker_tls_key_path: str = ""
+    telegraf_internal_metrics: bool = False
+    telegraf_metrics_base_port: int = 9273
+    telegraf_metrics_host: str = ""
 
 
 class DeploymentSettingsUpdate(BaseModel):
@@ -375,6 +512,9 @@ class DeploymentSettingsUpdate(BaseModel):
     docker_tls_ca_path: Optional[str] = None
     docker_tls_cert_path: Optional[str] = None
     docker_tls_key_path: Optional[str] = None
+    telegraf_internal_metrics: Optional[bool] = None
+    telegraf_metrics_base_port: Optional[int] = None
+    telegraf_metrics_host: Optional[str] = None
 
 
 class DockerTestConnectionRequest(BaseModel):
@@ -0,0 +1,188 @@
+"""
+Browse results for the node tree, without a server round trip per expand.
+
+``POST /devices/{id}/browse`` answers, in order of preference:
+
+1. from the device's completed scan, when the scan listed the folder's
+   children (see ``ScanSnapshot.children``);
+2. from this worker's ``BrowseCache``: encoded responses keyed by device,
+   endpoint and node id, dropped after ``BROWSE_CACHE_TTL_S`` and evicted
+   least-recently-used beyond ``BROWSE_CACHE_MAX_MB``;
+3. live, through ``opcua_service.browse_node``, then cached.
+
+After answering, the children of the returned folders are browsed in the
+background over one session (at most ``BROWSE_PREFETCH_MAX`` of them), so the
+next expand is usually a cache hit.  A request for a folder that is being
+prefetched waits for the prefetch instead of browsing it a second time.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from responses import dumps
+from services import opcua_service
+from services.scan_cache import scan_cache
+
+logger = logging.getLogger(__name__)
+
+BROWSE_CACHE_TTL_S = float(os.environ.get("BROWSE_CACHE_TTL_S", "300"))
+BROWSE_CACHE_MAX_MB = float(os.environ.get("BROWSE_CACHE_MAX_MB", "64"))
+BROWSE_PREFETCH_MAX = int(os.environ.get("BROWSE_PREFETCH_MAX", "32"))
+
+# Prefetch sessions running at once in this worker; more are skipped, not queued
+_PREFETCH_SESSIONS = 4
+# How long a browse waits for a prefetch of the same folder
+_PREFETCH_WAIT_S = 15.0
+# Rough per-entry bookkeeping cost on top of the encoded body
+_ENTRY_OVERHEAD = 200
+
+Key = Tuple[int, str, str]
+
+
+class BrowseCache:
+    """Encoded browse responses with a TTL and an LRU memory budget."""
+
+    def __init__(self, ttl_s: float, max_bytes: int):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Key, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Key) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, key: Key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def put(self, key: Key, body: bytes) -> None:
+        size = len(body) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_s, body)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Key) -> None:
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body) + _ENTRY_OVERHEAD
+
+    def discard_device(self, device_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == device_id]:
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+browse_cache = BrowseCache(BROWSE_CACHE_TTL_S, int(BROWSE_CACHE_MAX_MB * 1024 * 1024))
+
+_inflight: Dict[Key, threading.Event] = {}
+_inflight_lock = threading.Lock()
+_prefetch_slots = threading.BoundedSemaphore(_PREFETCH_SESSIONS)
+
+
+def _snapshot(device_id: int):
+    entry = scan_cache.get(device_id)
+    if entry is None or entry["status"] != "complete":
+        return None
+    return entry["nodes"]
+
+
+def browse(device, node_id: Optional[str] = None) -> bytes:
+    """JSON ``{"nodes": [...]}`` for the children of ``node_id`` (None: Objects).
+
+    Raises RuntimeError when the live browse fails.
+    """
+    snapshot = _snapshot(device.id)
+    if snapshot is not None:
+        nodes = snapshot.children(node_id)
+        if nodes is not None:
+            _prefetch(device, nodes, snapshot)
+            return dumps({"nodes": nodes})
+
+    key = (device.id, device.endpoint_url, node_id or "")
+    body = browse_cache.get(key)
+    if body is not None:
+        return body
+    with _inflight_lock:
+        pending = _inflight.get(key)
+    if pending is not None and pending.wait(_PREFETCH_WAIT_S):
+        body = browse_cache.get(key)
+        if body is not None:
+            return body
+
+    nodes = opcua_service.browse_node(
+        device.endpoint_url, node_id, device.username, device.password,
+        security_policy=device.security_policy or "None",
+    )
+    body = dumps({"nodes": nodes})
+    browse_cache.put(key, body)
+    _prefetch(device, nodes, snapshot)
+    return body
+
+
+def _prefetch(device, nodes: List[Dict], snapshot) -> None:
+    """Browse the folders among ``nodes`` in the background, unless already known."""
+    keys = []
+    with _inflight_lock:
+        for node in nodes:
+            if node["is_variable"] or not node["has_children"]:
+                continue
+            if snapshot is not None and snapshot.is_listed(node["node_id"]):
+                continue
+            key = (device.id, device.endpoint_url, node["node_id"])
+            if key in _inflight or key in browse_cache:
+                continue
+            keys.append(key)
+            if len(keys) >= BROWSE_PREFETCH_MAX:
+                break
+        if not keys or not _prefetch_slots.acquire(blocking=False):
+            return
+        for key in keys:
+            _inflight[key] = threading.Event()
+    threading.Thread(
+        target=_run_prefetch,
+        args=(device.endpoint_url, device.username, device.password, device.security_policy or "None", keys),
+        daemon=True,
+    ).start()
+
+
+def _run_prefetch(endpoint_url: str, username: str, password: str, security_policy: str, keys: List[Key]) -> None:
+    try:
+        results = opcua_service.browse_nodes(
+            endpoint_url, [key[2] for key in keys], username, password, security_policy=security_policy,
+        )
+        for key in keys:
+            if key[2] in results:
+                browse_cache.put(key, dumps({"nodes": results[key[2]]}))
+    except Exception as e:
+        logger.debug(f"Browse prefetch on {endpoint_url} failed: {e}")
+    finally:
+        _prefetch_slots.release()
+        with _inflight_lock:
+            for key in keys:
+                _inflight.pop(key).set()
@@ -0,0 +1,215 @@
+"""Eager-loading strategies for the Telegraf config generators.
+
+The generators walk devices, their tags and branch subscriptions, and each
+tag's scan class.  Joined eager loading of two collections on one query
+(``Device.tags`` and ``Device.node_includes``) multiplies the rows: a device
+with 10k tags and 20 includes comes back as 200k rows that the ORM then
+de-duplicates.  These loaders fetch each collection with its own
+``selectinload`` query, only enabled rows, and only the columns the
+renderers read.
+
+Anything outside the projected columns is lazy-loaded on access, which an
+``AsyncSession`` cannot do, so extend the column lists when a generator
+starts reading a new attribute.
+
+Rendering every instance at once skips the ORM entirely: one projected query
+over all enabled tags, ordered by instance, is split into per-instance lists
+of plain tuples (``group_instance_tags``) that ``generate_config_from_tags``
+accepts like Tag objects and that can be pickled to worker processes.
+"""
+
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, load_only, selectinload
+
+import models
+
+TAG_COLUMNS = (
+    models.Tag.id, models.Tag.device_id, models.Tag.node_id, models.Tag.namespace,
+    models.Tag.identifier, models.Tag.identifier_type, models.Tag.display_name,
+    models.Tag.path, models.Tag.measurement_name, models.Tag.scan_class_id,
+    models.Tag.telegraf_instance_id, models.Tag.enabled,
+)
+NODE_INCLUDE_COLUMNS = (
+    models.NodeInclude.id, models.NodeInclude.device_id, models.NodeInclude.parent_path,
+    models.NodeInclude.measurement_name, models.NodeInclude.scan_class_id, models.NodeInclude.enabled,
+)
+DEVICE_COLUMNS = (
+    models.Device.id, models.Device.name, models.Device.endpoint_url, models.Device.username,
+    models.Device.password, models.Device.security_policy, models.Device.influxdb_config_id,
+    models.Device.telegraf_instance_id, models.Device.enabled,
+)
+
+
+def _device_options(path=None) -> list:
+    """Options loading what ``generate_config`` reads from a device.
+
+    ``path`` is the relationship leading to the devices (e.g.
+    ``selectinload(TelegrafInstance.devices)``); None for a Device query.
+    """
+    def start(attr):
+        return path.selectinload(attr) if path is not None else selectinload(attr)
+
+    return [
+        start(models.Device.tags.and_(models.Tag.enabled == True))
+        .load_only(*TAG_COLUMNS).selectinload(models.Tag.scan_class),
+        start(models.Device.node_includes.and_(models.NodeInclude.enabled == True))
+        .load_only(*NODE_INCLUDE_COLUMNS).selectinload(models.NodeInclude.scan_class),
+        start(models.Device.influxdb_config),
+    ]
+
+
+def load_devices(db: Session) -> List[models.Device]:
+    """Enabled devices with enabled tags and includes, for ``generate_config``."""
+    return db.query(models.Device).options(
+        load_only(*DEVICE_COLUMNS), *_device_options(),
+    ).filter(models.Device.enabled == True).order_by(models.Device.name).all()
+
+
+def load_instances(db: Session, instance_ids: Optional[Iterable[int]] = None) -> List[models.TelegrafInstance]:
+    """Instances with their devices loaded, for ``generate_instance_configs``."""
+    devices = selectinload(models.TelegrafInstance.devices)
+    query = db.query(models.TelegrafInstance).options(
+        devices.load_only(*DEVICE_COLUMNS), *_device_options(devices),
+    )
+    if instance_ids is not None:
+        query = query.filter(models.TelegrafInstance.id.in_(list(instance_ids)))
+    return query.order_by(models.TelegrafInstance.name).all()
+
+
+def instance_tags_stmt(instance_id: int):
+    """Enabled tags of an instance for ``generate_config_from_tags``.
+
+    Works on both sync and async sessions (``db.execute(...).scalars()``).
+    """
+    return select(models.Tag).options(
+        load_only(*TAG_COLUMNS),
+        selectinload(models.Tag.scan_class),
+        selectinload(models.Tag.device).load_only(*DEVICE_COLUMNS).selectinload(models.Device.influxdb_config),
+    ).where(
+        models.Tag.telegraf_instance_id == instance_id,
+        models.Tag.enabled == True,
+    ).order_by(models.Tag.device_id, models.Tag.scan_class_id, models.Tag.path)
+
+
+def load_instance_tags(db: Session, instance_id: int) -> List[models.Tag]:
+    return db.execute(instance_tags_stmt(instance_id)).scalars().all()
+
+
+class InfluxTarget(NamedTuple):
+    id: int
+    name: str
+    url: str
+    token: str
+    org: str
+    bucket: str
+
+
+class ScanClassRow(NamedTuple):
+    id: int
+    name: str
+    interval_ms: int
+
+
+class DeviceRow(NamedTuple):
+    id: int
+    name: str
+    endpoint_url: str
+    username: str
+    password: str
+    security_policy: str
+    enabled: bool
+    influxdb_config: Optional[InfluxTarget]
+
+
+class TagRow(NamedTuple):
+    device_id: int
+    device: DeviceRow
+    node_id: str
+    namespace: int
+    identifier: str
+    identifier_type: str
+    display_name: str
+    path: str
+    measurement_name: str
+    scan_class: Optional[ScanClassRow]
+
+
+def influx_target(cfg) -> Optional[InfluxTarget]:
+    if cfg is None:
+        return None
+    return InfluxTarget(cfg.id, cfg.name, cfg.url, cfg.token, cfg.org, cfg.bucket)
+
+
+def scan_class_row(sc) -> Optional[ScanClassRow]:
+    if sc is None:
+        return None
+    return ScanClassRow(sc.id, sc.name, sc.interval_ms)
+
+
+def all_instance_tags_stmt(instance_ids: Optional[Iterable[int]] = None):
+    """One projected query over the enabled tags of every (or the given) instance.
+
+    Ordered by (instance, device, scan class, path) for ``group_instance_tags``.
+    """
+    Tag, Device, ScanClass, Influx = models.Tag, models.Device, models.ScanClass, models.InfluxDBConfig
+    stmt = select(
+        Tag.telegraf_instance_id, Tag.device_id, Tag.node_id, Tag.namespace, Tag.identifier,
+        Tag.identifier_type, Tag.display_name, Tag.path, Tag.measurement_name,
+        Device.name, Device.endpoint_url, Device.username, Device.password, Device.security_policy,
+        Device.enabled,
+        ScanClass.id, ScanClass.name, ScanClass.interval_ms,
+        Influx.id, Influx.name, Influx.url, Influx.token, Influx.org, Influx.bucket,
+    ).join(Device, Tag.device_id == Device.id).outerjoin(
+        ScanClass, Tag.scan_class_id == ScanClass.id,
+    ).outerjoin(
+        Influx, Device.influxdb_config_id == Influx.id,
+    ).where(
+        Tag.enabled == True,
+        Tag.telegraf_instance_id.isnot(None),
+    )
+    if instance_ids is not None:
+        stmt = stmt.where(Tag.telegraf_instance_id.in_(list(instance_ids)))
+    return stmt.order_by(Tag.telegraf_instance_id, Tag.device_id, Tag.scan_class_id, Tag.path)
+
+
+def group_instance_tags(rows: Iterable[tuple]) -> Iterator[Tuple[int, List[TagRow]]]:
+    """Split ``all_instance_tags_stmt`` rows into ``(instance_id, tags)`` as they stream in.
+
+    Devices, scan classes and targets are shared tuples, built once each.
+    """
+    devices: Dict[int, DeviceRow] = {}
+    scan_classes: Dict[int, ScanClassRow] = {}
+    targets: Dict[int, InfluxTarget] = {}
+    current_id = None
+    tags: List[TagRow] = []
+    for row in rows:
+        (instance_id, device_id, node_id, namespace, identifier, identifier_type, display_name, path,
+         measurement_name, dev_name, endpoint_url, username, password, security_policy, dev_enabled,
+         sc_id, sc_name, sc_interval, influx_id, influx_name, url, token, org, bucket) = row
+        if instance_id != current_id:
+            if tags:
+                yield current_id, tags
+            current_id, tags = instance_id, []
+        device = devices.get(device_id)
+        if device is None:
+            target = None
+            if influx_id is not None:
+                target = targets.get(influx_id)
+                if target is None:
+                    target = targets[influx_id] = InfluxTarget(influx_id, influx_name, url, token, org, bucket)
+            device = devices[device_id] = DeviceRow(
+                device_id, dev_name, endpoint_url, username, password, security_policy, dev_enabled, target,
+            )
+        scan_class = None
+        if sc_id is not None:
+            scan_class = scan_classes.get(sc_id)
+            if scan_class is None:
+                scan_class = scan_classes[sc_id] = ScanClassRow(sc_id, sc_name, sc_interval)
+        tags.append(TagRow(
+            device_id, device, node_id, namespace, identifier, identifier_type, display_name,
+            path, measurement_name, scan_class,
+        ))
+    if tags:
+        yield current_id, tags
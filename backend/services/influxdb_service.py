@@ -1,11 +1,23 @@
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import itertools
+import math
 import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
 import urllib.request
+import uuid
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Single-writer throughput wanted over the busiest instance's point rate
+HEADROOM = 4
+
 
 def _make_ssl_context(url: str):
     if url.lower().startswith("https://"):
@@ -137,3 +149,182 @@ def list_buckets(url: str, token: str, org: str, version: int = 2) -> List[str]:
         return [b.name for b in buckets if not b.name.startswith("_")]
     except Exception as e:
         raise RuntimeError(f"Failed to list buckets: {e}")
+
+
+def write_lines(url: str, token: str, org: str, bucket: str, body: bytes,
+                version: int = 2, gzip_body: bool = False, timeout: float = 30) -> None:
+    """Write a line-protocol body (nanosecond precision); raises RuntimeError on failure."""
+    url = url.rstrip("/")
+    if version == 1:
+        target = f"{url}/write?{urllib.parse.urlencode({'db': bucket, 'precision': 'ns'})}"
+    else:
+        target = f"{url}/api/v2/write?{urllib.parse.urlencode({'org': org, 'bucket': bucket, 'precision': 'ns'})}"
+    headers = {"Content-Type": "text/plain; charset=utf-8"}
+    if token:
+        headers["Authorization"] = f"Token {token}"
+    if gzip_body:
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+    ctx = _make_ssl_context(url)
+    kwargs = {"context": ctx} if ctx else {}
+    req = urllib.request.Request(target, data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout, **kwargs) as resp:
+            resp.read()
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode("utf-8", errors="replace")[:300]
+        raise RuntimeError(f"Write failed with HTTP {e.code}: {detail}")
+    except (urllib.error.URLError, OSError) as e:
+        raise RuntimeError(f"Write failed: {getattr(e, 'reason', e)}")
+
+
+def _probe_batch(run_id: str, series: int, start: int, size: int, ts: int) -> bytes:
+    """``size`` synthetic points spread over ``series`` series, like one Telegraf batch."""
+    return "".join(
+        f"fluxforge_probe,run={run_id},series=s{(start + i) % series} "
+        f"value={(start + i) * 0.5},seq={start + i}i {ts + i}\n"
+        for i in range(size)
+    ).encode()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def probe_write_capacity(url: str, token: str, org: str, bucket: str, version: int = 2,
+                         batch_sizes: List[int] = (500, 1000, 5000, 10000),
+                         concurrency: List[int] = (1, 2, 4), step_seconds: float = 3.0,
+                         series: int = 1000, gzip_body: bool = True,
+                         on_step: Optional[Callable[[int, int, Dict], None]] = None) -> List[Dict]:
+    """Write synthetic batches for every (batch size, concurrency) pair and time them.
+
+    Each step keeps ``concurrency`` writers busy for ``step_seconds``.  Points
+    go to the ``fluxforge_probe`` measurement tagged with a per-run id, so use
+    a scratch bucket.  ``on_step(done, total, step)`` is called after each
+    step; exceptions it raises abort the probe.  A failure of the very first
+    write (bad token, missing bucket) raises RuntimeError.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    write_lines(url, token, org, bucket, _probe_batch(run_id, series, 0, 1, time.time_ns()),
+                version=version, gzip_body=gzip_body)
+
+    plan = [(size, workers) for workers in concurrency for size in batch_sizes]
+    steps = []
+    seq = itertools.count(1)
+    for done, (size, workers) in enumerate(plan, start=1):
+        latencies: List[float] = []
+        errors: List[str] = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + step_seconds
+
+        def writer():
+            while time.perf_counter() < deadline:
+                with lock:
+                    start = next(seq) * size
+                body = _probe_batch(run_id, series, start, size, time.time_ns())
+                began = time.perf_counter()
+                try:
+                    write_lines(url, token, org, bucket, body, version=version, gzip_body=gzip_body)
+                except RuntimeError as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                elapsed = time.perf_counter() - began
+                with lock:
+                    latencies.append(elapsed)
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for future in [pool.submit(writer) for _ in range(workers)]:
+                future.result()
+        wall = time.perf_counter() - began
+
+        latencies.sort()
+        step = {
+            "batch_size": size,
+            "concurrency": workers,
+            "requests": len(latencies),
+            "errors": len(errors),
+            "first_error": errors[0] if errors else None,
+            "points_per_s": round(len(latencies) * size / wall, 1) if wall else 0.0,
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 0.5) * 1000, 2),
+                "p95": round(_percentile(latencies, 0.95) * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            },
+        }
+        steps.append(step)
+        if on_step is not None:
+            on_step(done, len(plan), step)
+    return steps
+
+
+def recommend_agent_settings(steps: List[Dict], instance_rates: List[float],
+                             outage_seconds: int = 60) -> Dict:
+    """Batch size, buffer limit and flush interval for the measured target.
+
+    ``instance_rates`` are the points per second each Telegraf instance sends
+    to the target.  Telegraf writes an output's batches one at a time, so the
+    batch size comes from the single-writer steps: the smallest batch that
+    keeps ``HEADROOM`` times the busiest instance's rate (or, without rates,
+    the smallest within 10% of the best throughput).  Parallel steps are only
+    used to check the target copes with all instances writing at once.
+    """
+    notes: List[str] = []
+    sequential = [s for s in steps if s["concurrency"] == 1 and s["requests"] and not s["errors"]]
+    if not sequential:
+        return {"batch_size": None, "buffer_limit": None, "flush_interval": None,
+                "notes": ["No error-free single-writer step; cannot recommend settings"]}
+
+    peak_rate = max(instance_rates, default=0.0)
+    total_rate = sum(instance_rates)
+
+    best = max(s["points_per_s"] for s in sequential)
+    floor = HEADROOM * peak_rate if peak_rate else 0.9 * best
+    fitting = [s for s in sequential if s["points_per_s"] >= min(floor, best)]
+    chosen = min(fitting, key=lambda s: s["batch_size"])
+    batch = chosen["batch_size"]
+    p95_s = chosen["latency_ms"]["p95"] / 1000
+
+    # Aim for about one full batch per flush, but never flush faster than
+    # a few write round-trips or slower than Telegraf's 10s default
+    if peak_rate > 0:
+        flush_s = batch / peak_rate
+    else:
+        flush_s = 10.0
+    flush_s = max(1, min(10, math.ceil(max(flush_s, 4 * p95_s))))
+
+    # Ride out ``outage_seconds`` of the target being unreachable
+    buffer_limit = max(10 * batch, math.ceil(peak_rate * outage_seconds / batch) * batch)
+    if buffer_limit > 1_000_000:
+        notes.append(f"Buffering {outage_seconds}s at {peak_rate:.0f} points/s needs {buffer_limit} "
+                     f"metrics per instance; consider splitting the instance to bound its memory")
+
+    headroom = chosen["points_per_s"] / peak_rate if peak_rate else None
+    if headroom is not None and headroom < 2:
+        notes.append(f"One writer reaches {chosen['points_per_s']:.0f} points/s at batch {batch}, "
+                     f"only {headroom:.1f}x the busiest instance ({peak_rate:.0f} points/s); "
+                     f"split it across instances")
+
+    writers = len([r for r in instance_rates if r > 0])
+    parallel = [s for s in steps if s["requests"] and not s["errors"] and s["batch_size"] == batch]
+    if writers > 1 and parallel:
+        step = min(parallel, key=lambda s: (abs(s["concurrency"] - writers), -s["concurrency"]))
+        if step["points_per_s"] < 1.5 * total_rate:
+            notes.append(f"With {step['concurrency']} concurrent writers the target took "
+                         f"{step['points_per_s']:.0f} points/s against {total_rate:.0f} points/s "
+                         f"configured in total; the target itself is close to capacity")
+
+    return {
+        "batch_size": batch,
+        "buffer_limit": buffer_limit,
+        "flush_interval": f"{flush_s}s",
+        "measured_points_per_s": chosen["points_per_s"],
+        "write_p95_ms": chosen["latency_ms"]["p95"],
+        "peak_instance_points_per_s": round(peak_rate, 1),
+        "total_points_per_s": round(total_rate, 1),
+        "headroom": round(headroom, 1) if headroom is not None else None,
+        "notes": notes,
+    }
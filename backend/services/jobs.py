@@ -0,0 +1,189 @@
+"""
+Background jobs with persistent status, progress and cancellation.
+
+Heavy operations (scans, deploy-all, imports, rendering every instance's
+config) are submitted as jobs instead of blocking a request past the proxy
+timeout.  Each job is a row in the ``jobs`` table, so its status survives the
+request and is visible from every worker.  Concurrency is bounded per job type
+with cross-worker slot locks from ``shared_state``.
+
+A job function receives a ``JobContext`` as its first argument::
+
+    def work(ctx, items):
+        for i, item in enumerate(items):
+            ctx.check_cancelled()
+            ...
+            ctx.progress(100 * (i + 1) / len(items), f"{i + 1}/{len(items)} done")
+        return {"done": len(items)}   # stored as the job's JSON result
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Optional
+
+from database import SessionLocal
+import models
+from services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+# Jobs of one type running at once, across all workers
+JOB_CONCURRENCY = {
+    "scan": 4,
+    "deploy": 1,
+    "import": 1,
+    "render": 2,
+    "probe": 1,
+}
+DEFAULT_CONCURRENCY = 2
+
+TERMINAL_STATUSES = ("complete", "error", "cancelled")
+
+# Minimum seconds between progress writes to the jobs table
+_PROGRESS_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when cancellation has been requested."""
+
+
+class JobContext:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last_write = 0.0
+        self._last_cancel_check = 0.0
+        self._cancelled = False
+
+    def progress(self, percent: float, message: Optional[str] = None, force: bool = False) -> None:
+        """Record progress (0-100). Writes are throttled unless ``force``."""
+        now = time.monotonic()
+        if not force and now - self._last_write < _PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        values = {"progress": max(0.0, min(100.0, float(percent)))}
+        if message is not None:
+            values["message"] = message
+        _update(self.job_id, **values)
+
+    @property
+    def cancelled(self) -> bool:
+        now = time.monotonic()
+        if not self._cancelled and now - self._last_cancel_check >= _PROGRESS_INTERVAL:
+            self._last_cancel_check = now
+            db = SessionLocal()
+            try:
+                self._cancelled = bool(db.query(models.Job.cancel_requested).filter(
+                    models.Job.id == self.job_id
+                ).scalar())
+            finally:
+                db.close()
+        return self._cancelled
+
+    def check_cancelled(self) -> None:
+        if self.cancelled:
+            raise JobCancelled()
+
+
+def _update(job_id: str, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.Job).filter(models.Job.id == job_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _acquire_slot(ctx: JobContext, job_type: str):
+    """Wait for one of the type's concurrency slots; None if cancelled while queued."""
+    limit = JOB_CONCURRENCY.get(job_type, DEFAULT_CONCURRENCY)
+    locks = [shared_state.lock(f"job-slot:{job_type}:{i}", ttl=60) for i in range(limit)]
+    while True:
+        for lock in locks:
+            if lock.acquire(blocking=False):
+                return lock
+        if ctx.cancelled:
+            return None
+        time.sleep(0.5)
+
+
+def _run(job_id: str, job_type: str, owner, on_cancel: Optional[Callable],
+         fn: Callable, args: tuple, kwargs: dict) -> None:
+    ctx = JobContext(job_id)
+    try:
+        slot = _acquire_slot(ctx, job_type)
+        if slot is None:
+            if on_cancel is not None:
+                on_cancel()
+            _update(job_id, status="cancelled", finished_at=datetime.utcnow())
+            return
+        try:
+            _update(job_id, status="running", started_at=datetime.utcnow())
+            try:
+                result = fn(ctx, *args, **kwargs)
+            except JobCancelled:
+                _update(job_id, status="cancelled", finished_at=datetime.utcnow())
+            except Exception as e:
+                logger.exception(f"Job {job_id} ({job_type}) failed")
+                _update(job_id, status="error", error=str(e), finished_at=datetime.utcnow())
+            else:
+                _update(
+                    job_id, status="complete", progress=100.0, finished_at=datetime.utcnow(),
+                    result=json.dumps(result, default=str) if result is not None else None,
+                )
+        finally:
+            slot.release()
+    finally:
+        owner.release()
+
+
+def submit(job_type: str, fn: Callable, *args, title: str = "",
+           on_cancel: Optional[Callable] = None, **kwargs) -> str:
+    """Queue ``fn(ctx, *args, **kwargs)`` as a background job and return its id.
+
+    ``on_cancel`` is called if the job is cancelled before it starts running.
+    """
+    job_id = uuid.uuid4().hex
+    # Held for the job's whole life so orphaned rows can be detected
+    owner = shared_state.lock(f"job:{job_id}", ttl=60)
+    owner.acquire()
+    db = SessionLocal()
+    try:
+        db.add(models.Job(id=job_id, type=job_type, status="queued", title=title))
+        db.commit()
+    except Exception:
+        owner.release()
+        raise
+    finally:
+        db.close()
+    threading.Thread(
+        target=_run, args=(job_id, job_type, owner, on_cancel, fn, args, kwargs),
+        name=f"job-{job_type}-{job_id[:8]}", daemon=True,
+    ).start()
+    return job_id
+
+
+def request_cancel(db, job: models.Job) -> None:
+    if job.status not in TERMINAL_STATUSES:
+        job.cancel_requested = True
+        db.commit()
+
+
+def reap_orphans(db, jobs) -> None:
+    """Mark unfinished jobs whose worker died (owner lock expired) as failed."""
+    changed = False
+    for job in jobs:
+        if job.status not in TERMINAL_STATUSES and not shared_state.is_locked(f"job:{job.id}"):
+            job.status = "error"
+            job.error = "Job was interrupted"
+            job.finished_at = datetime.utcnow()
+            changed = True
+    if changed:
+        db.commit()
+
+
+def job_result(job: models.Job) -> Any:
+    return json.loads(job.result) if job.result else None
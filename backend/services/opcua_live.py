@@ -0,0 +1,336 @@
+"""
+Live value streaming over OPC UA subscriptions.
+
+Instead of every browser polling ``read_values``, the hub keeps one OPC UA
+subscription per device and reference-counts the monitored items on it.
+Ten operators watching the same tags cost the PLC one monitored item each,
+not ten polling loops.
+
+All OPC UA I/O runs on a dedicated background event loop.  Consumers (the
+WebSocket endpoint) receive coalesced updates: a slow browser only ever sees the
+latest value per node, never an unbounded backlog.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from services.opcua_metrics import opcua_metrics
+from services.opcua_service import _configure_client, _connect, _data_value_to_dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLING_INTERVAL_MS = 1000
+
+
+class LiveSubscriber:
+    """One consumer of live values (typically one open browser socket).
+
+    Updates are merged into ``_pending`` and signalled through an asyncio.Event
+    on the consumer's own loop, so the fan-out never blocks on a slow client.
+    """
+
+    def __init__(self, device_id: int, node_ids: Iterable[str], loop: asyncio.AbstractEventLoop):
+        self.device_id = device_id
+        self.node_ids = set(node_ids)
+        self.error: Optional[str] = None
+        self._loop = loop
+        self._event = asyncio.Event()
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict] = {}
+
+    def _push(self, values: Dict[str, Dict]) -> None:
+        with self._lock:
+            self._pending.update(values)
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    def _fail(self, message: str) -> None:
+        self.error = message
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def next_batch(self, timeout: float) -> Dict[str, Dict]:
+        """Wait up to ``timeout`` seconds and return all values changed since the last call."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._event.clear()
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        return batch
+
+
+class _DataChangeHandler:
+    def __init__(self, device_sub: "_DeviceSubscription"):
+        self._device_sub = device_sub
+
+    def datachange_notification(self, node, val, data) -> None:
+        try:
+            dv = data.monitored_item.Value
+        except AttributeError:
+            return
+        self._device_sub.publish(node.nodeid.to_string(), _data_value_to_dict(dv))
+
+    def status_change_notification(self, status) -> None:
+        self._device_sub.fail(f"Subscription status changed: {status.Status}")
+
+
+class _DeviceSubscription:
+    """One OPC UA client connection + subscription shared by all subscribers of a device."""
+
+    def __init__(self, device_id: int, endpoint_url: str, username: str, password: str,
+                 security_policy: str, sampling_interval_ms: int):
+        self.device_id = device_id
+        self.endpoint_url = endpoint_url
+        self.username = username
+        self.password = password
+        self.security_policy = security_policy
+        self.sampling_interval_ms = sampling_interval_ms
+        self.subscribers: List[LiveSubscriber] = []
+        self.failed = False
+        self._client = None
+        self._subscription = None
+        self._handles: Dict[str, int] = {}
+        self._refcounts: Dict[str, int] = {}
+        self._last_values: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    async def start(self) -> None:
+        from asyncua import Client
+
+        self._client = Client(url=self.endpoint_url, timeout=15)
+        await _configure_client(self._client, self.security_policy, self.username, self.password)
+        await _connect(self._client, self.endpoint_url)
+        self._subscription = await self._client.create_subscription(
+            self.sampling_interval_ms, _DataChangeHandler(self),
+        )
+
+    async def add(self, node_ids: Iterable[str]) -> None:
+        node_ids = list(node_ids)
+        new_ids = []
+        for nid in node_ids:
+            count = self._refcounts.get(nid, 0)
+            self._refcounts[nid] = count + 1
+            if count == 0:
+                new_ids.append(nid)
+        if not new_ids:
+            return
+
+        try:
+            nodes = [self._client.get_node(nid) for nid in new_ids]
+            handles = await self._subscription.subscribe_data_change(
+                nodes, sampling_interval=self.sampling_interval_ms,
+            )
+        except Exception:
+            # Nothing was subscribed: undo every count taken above
+            for nid in node_ids:
+                count = self._refcounts.get(nid, 0) - 1
+                if count > 0:
+                    self._refcounts[nid] = count
+                else:
+                    self._refcounts.pop(nid, None)
+            raise
+        errors = {}
+        for nid, handle in zip(new_ids, handles):
+            if isinstance(handle, int):
+                self._handles[nid] = handle
+            else:
+                errors[nid] = {"value": None, "status": f"Error: {getattr(handle, 'name', handle)}", "timestamp": None}
+        if errors:
+            with self._lock:
+                self._last_values.update(errors)
+
+    async def remove(self, node_ids: Iterable[str]) -> None:
+        handles = []
+        for nid in node_ids:
+            count = self._refcounts.get(nid, 0) - 1
+            if count > 0:
+                self._refcounts[nid] = count
+                continue
+            self._refcounts.pop(nid, None)
+            with self._lock:
+                self._last_values.pop(nid, None)
+            handle = self._handles.pop(nid, None)
+            if handle is not None:
+                handles.append(handle)
+        if handles and not self.failed:
+            await self._subscription.unsubscribe(handles)
+
+    async def close(self) -> None:
+        try:
+            if self._subscription is not None and not self.failed:
+                await self._subscription.delete()
+        except Exception:
+            pass
+        try:
+            if self._client is not None:
+                await self._client.disconnect()
+        except Exception:
+            pass
+
+    def snapshot(self, node_ids: Iterable[str]) -> Dict[str, Dict]:
+        with self._lock:
+            return {nid: self._last_values[nid] for nid in node_ids if nid in self._last_values}
+
+    def publish(self, node_id: str, value: Dict) -> None:
+        with self._lock:
+            self._last_values[node_id] = value
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            if node_id in sub.node_ids:
+                sub._push({node_id: value})
+
+    def fail(self, message: str) -> None:
+        self.failed = True
+        opcua_metrics.session_failed(self.endpoint_url, RuntimeError(message))
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for sub in subscribers:
+            sub._fail(message)
+
+
+class LiveValueHub:
+    """Owns the background event loop and the per-device subscriptions."""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._devices: Dict[int, _DeviceSubscription] = {}
+        # Serializes add/remove per device on the hub loop
+        self._device_locks: Dict[int, asyncio.Lock] = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="opcua-live", daemon=True,
+                )
+                self._thread.start()
+        return self._loop
+
+    async def _call(self, coro):
+        """Run ``coro`` on the hub loop and await it from the caller's loop."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def subscribe(
+        self,
+        device_id: int,
+        endpoint_url: str,
+        node_ids: List[str],
+        username: str = "",
+        password: str = "",
+        security_policy: str = "None",
+        sampling_interval_ms: int = DEFAULT_SAMPLING_INTERVAL_MS,
+    ) -> LiveSubscriber:
+        subscriber = LiveSubscriber(device_id, node_ids, asyncio.get_running_loop())
+        await self._call(self._subscribe(
+            subscriber, endpoint_url, username, password, security_policy, sampling_interval_ms,
+        ))
+        return subscriber
+
+    async def update(self, subscriber: LiveSubscriber, node_ids: List[str]) -> None:
+        """Replace the set of nodes a subscriber is watching (e.g. after a tree expand)."""
+        await self._call(self._update(subscriber, set(node_ids)))
+
+    async def release(self, subscriber: LiveSubscriber) -> None:
+        await self._call(self._release(subscriber))
+
+    def stats(self) -> Dict[int, Dict]:
+        """Per-device subscriber and monitored item counts (for diagnostics)."""
+        return {
+            device_id: {
+                "subscribers": len(ds.subscribers),
+                "monitored_items": len(ds._handles),
+                "sampling_interval_ms": ds.sampling_interval_ms,
+            }
+            for device_id, ds in list(self._devices.items())
+        }
+
+    async def _subscribe(self, subscriber: LiveSubscriber, endpoint_url: str, username: str,
+                         password: str, security_policy: str, sampling_interval_ms: int) -> None:
+        device_id = subscriber.device_id
+        lock = self._device_locks.setdefault(device_id, asyncio.Lock())
+        async with lock:
+            device_sub = self._devices.get(device_id)
+            if device_sub is not None and (device_sub.failed or device_sub.endpoint_url != endpoint_url):
+                # Connection died or the device was re-pointed: start over
+                await self._drop_device(device_sub)
+                device_sub = None
+
+            if device_sub is None:
+                device_sub = _DeviceSubscription(
+                    device_id, endpoint_url, username, password,
+                    security_policy, sampling_interval_ms,
+                )
+                try:
+                    await device_sub.start()
+                except Exception as e:
+                    await device_sub.close()
+                    raise RuntimeError(f"Live subscription failed: {e}")
+                self._devices[device_id] = device_sub
+                logger.info(f"Live subscription opened for device {device_id}")
+
+            try:
+                await device_sub.add(subscriber.node_ids)
+            except Exception as e:
+                device_sub.fail(str(e))
+                await self._drop_device(device_sub)
+                raise RuntimeError(f"Live subscription failed: {e}")
+            with device_sub._lock:
+                device_sub.subscribers.append(subscriber)
+            # Seed the new subscriber with values already known for shared items
+            initial = device_sub.snapshot(subscriber.node_ids)
+            if initial:
+                subscriber._push(initial)
+
+    async def _update(self, subscriber: LiveSubscriber, node_ids: set) -> None:
+        lock = self._device_locks.setdefault(subscriber.device_id, asyncio.Lock())
+        async with lock:
+            device_sub = self._devices.get(subscriber.device_id)
+            if device_sub is None or subscriber not in device_sub.subscribers:
+                return
+            added = node_ids - subscriber.node_ids
+            removed = subscriber.node_ids - node_ids
+            try:
+                await device_sub.add(added)
+                subscriber.node_ids = node_ids
+                await device_sub.remove(removed)
+            except Exception as e:
+                device_sub.fail(str(e))
+                await self._drop_device(device_sub)
+                raise RuntimeError(f"Live subscription failed: {e}")
+            initial = device_sub.snapshot(added)
+            if initial:
+                subscriber._push(initial)
+
+    async def _release(self, subscriber: LiveSubscriber) -> None:
+        device_id = subscriber.device_id
+        lock = self._device_locks.setdefault(device_id, asyncio.Lock())
+        async with lock:
+            device_sub = self._devices.get(device_id)
+            if device_sub is None:
+                return
+            with device_sub._lock:
+                if subscriber not in device_sub.subscribers:
+                    return
+                device_sub.subscribers.remove(subscriber)
+            if not device_sub.subscribers:
+                await self._drop_device(device_sub)
+                return
+            try:
+                await device_sub.remove(subscriber.node_ids)
+            except Exception:
+                logger.exception(f"Failed to remove monitored items for device {device_id}")
+
+    async def _drop_device(self, device_sub: _DeviceSubscription) -> None:
+        if self._devices.get(device_sub.device_id) is device_sub:
+            del self._devices[device_sub.device_id]
+        await device_sub.close()
+        logger.info(f"Live subscription closed for device {device_sub.device_id}")
+
+
+live_hub = LiveValueHub()
@@ -0,0 +1,407 @@
+"""
+OPC UA client metrics per endpoint.
+
+``opcua_service`` records every connect (handshake time), Browse/BrowseNext and
+Read service call, timeout and reconnect here, keyed by endpoint URL.  Scans
+also record their wall time next to the time spent waiting on the server, which
+is what tells a slow PLC apart from a slow crawler.
+
+Each worker keeps its own registry and publishes a JSON snapshot of it to
+``shared_state`` under a worker slot (throttled, and whenever a session
+closes).  Readers merge the snapshots of every slot, so the Prometheus endpoint
+and the device diagnostics view report totals across workers.  A worker that
+takes over a dead worker's slot starts from that slot's counters, so counters
+never go backwards.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from profiling import add_time
+from services.shared_state import SharedState, shared_state
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COUNTERS = (
+    "connects", "connect_failures", "reconnects", "timeouts",
+    "browse_calls", "browse_errors", "read_calls", "read_errors", "read_nodes", "scans",
+)
+HISTOGRAMS = ("connect", "browse", "read")
+
+# Minimum seconds between snapshot writes from the hot path
+_PUBLISH_INTERVAL = 5.0
+_SLOT_TTL = 60
+
+
+def is_timeout(exc: BaseException) -> bool:
+    if isinstance(exc, TimeoutError):
+        return True
+    # asyncua surfaces server-side timeouts as BadTimeout status errors
+    return "BadTimeout" in type(exc).__name__ or "BadTimeout" in str(exc)
+
+
+class Histogram:
+    def __init__(self, counts: Optional[List[int]] = None, total: float = 0.0):
+        self.counts = counts or [0] * (len(BUCKETS) + 1)
+        self.sum = total
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the bucket (like histogram_quantile)."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                if i == len(BUCKETS):
+                    return lower
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    def to_dict(self) -> Dict:
+        return {"counts": self.counts, "sum": self.sum}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Histogram":
+        if len(data["counts"]) != len(BUCKETS) + 1:
+            return cls()  # written with different buckets
+        return cls(list(data["counts"]), data["sum"])
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+
+
+class EndpointStats:
+    def __init__(self):
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.histograms: Dict[str, Histogram] = {name: Histogram() for name in HISTOGRAMS}
+        self.last_connect_s: Optional[float] = None
+        self.last_connect_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        self.last_scan: Optional[Dict] = None
+        # The previous session failed; the next successful connect is a reconnect
+        self.broken = False
+
+    def to_dict(self) -> Dict:
+        return {
+            "counters": self.counters,
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+            "last_connect_s": self.last_connect_s,
+            "last_connect_at": self.last_connect_at,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "last_scan": self.last_scan,
+            "broken": self.broken,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "EndpointStats":
+        stats = cls()
+        for name, value in data.get("counters", {}).items():
+            stats.counters[name] = value
+        for name, value in data.get("histograms", {}).items():
+            stats.histograms[name] = Histogram.from_dict(value)
+        for attr in ("last_connect_s", "last_connect_at", "last_error", "last_error_at", "last_scan", "broken"):
+            setattr(stats, attr, data.get(attr, getattr(stats, attr)))
+        return stats
+
+    def merge(self, other: "EndpointStats") -> None:
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, hist in other.histograms.items():
+            self.histograms.setdefault(name, Histogram()).merge(hist)
+        if (other.last_connect_at or 0) > (self.last_connect_at or 0):
+            self.last_connect_at, self.last_connect_s = other.last_connect_at, other.last_connect_s
+        if (other.last_error_at or 0) > (self.last_error_at or 0):
+            self.last_error_at, self.last_error = other.last_error_at, other.last_error
+        if other.last_scan and (not self.last_scan or other.last_scan["finished_at"] > self.last_scan["finished_at"]):
+            self.last_scan = other.last_scan
+
+
+class SessionStats:
+    """Server time and request count of one client session (e.g. one scan)."""
+
+    def __init__(self):
+        self.server_seconds = 0.0
+        self.requests = 0
+
+
+class OpcuaMetrics:
+    def __init__(self, state: SharedState):
+        self._state = state
+        self._stats: Dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+        self._slot = None
+        self._slot_index: Optional[int] = None
+        self._last_publish = 0.0
+
+    def _endpoint(self, endpoint_url: str) -> EndpointStats:
+        stats = self._stats.get(endpoint_url)
+        if stats is None:
+            stats = self._stats[endpoint_url] = EndpointStats()
+        return stats
+
+    def _error(self, stats: EndpointStats, exc: BaseException) -> None:
+        stats.last_error = f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+        stats.last_error_at = time.time()
+        if is_timeout(exc):
+            stats.counters["timeouts"] += 1
+        stats.broken = True
+
+    # ── Recording ────────────────────────────────────────────────────────
+
+    def connected(self, endpoint_url: str, seconds: float) -> None:
+        add_time("opcua", seconds)
+        with self._lock:
+            stats = self._endpoint(endpoint_url)
+            stats.counters["connects"] += 1
+            if stats.broken:
+                stats.counters["reconnects"] += 1
+                stats.broken = False
+            stats.histograms["connect"].observe(seconds)
+            stats.last_connect_s = seconds
+            stats.last_connect_at = time.time()
+        self.publish(force=False)
+
+    def connect_failed(self, endpoint_url: str, seconds: float, exc: BaseException) -> None:
+        add_time("opcua", seconds)
+        with self._lock:
+            stats = self._endpoint(endpoint_url)
+            stats.counters["connect_failures"] += 1
+            stats.histograms["connect"].observe(seconds)
+            self._error(stats, exc)
+        self.publish()
+
+    def call(self, endpoint_url: str, kind: str, seconds: float, nodes: int = 0,
+             exc: Optional[BaseException] = None, session: Optional[SessionStats] = None) -> None:
+        """Record one Browse/BrowseNext ("browse") or Read ("read") service call."""
+        add_time("opcua", seconds)
+        with self._lock:
+            stats = self._endpoint(endpoint_url)
+            stats.counters[f"{kind}_calls"] += 1
+            if kind == "read":
+                stats.counters["read_nodes"] += nodes
+            stats.histograms[kind].observe(seconds)
+            if exc is not None:
+                stats.counters[f"{kind}_errors"] += 1
+                self._error(stats, exc)
+        if session is not None:
+            session.server_seconds += seconds
+            session.requests += 1
+        self.publish(force=False)
+
+    def session_failed(self, endpoint_url: str, exc: BaseException) -> None:
+        """A session ended with an error (e.g. the connection dropped)."""
+        with self._lock:
+            self._error(self._endpoint(endpoint_url), exc)
+
+    def scan_finished(self, endpoint_url: str, nodes: int, seconds: float, session: SessionStats) -> None:
+        with self._lock:
+            stats = self._endpoint(endpoint_url)
+            stats.counters["scans"] += 1
+            stats.last_scan = {
+                "nodes": nodes,
+                "seconds": seconds,
+                "server_seconds": session.server_seconds,
+                "requests": session.requests,
+                "nodes_per_second": nodes / seconds if seconds > 0 else None,
+                "finished_at": time.time(),
+            }
+
+    # ── Cross-worker snapshots ───────────────────────────────────────────
+
+    def _claim_slot(self) -> Optional[int]:
+        """Hold the lowest free worker slot, adopting any counters left in it."""
+        if self._slot is not None and self._slot.held:
+            return self._slot_index
+        index = 0
+        while True:
+            lock = self._state.lock(f"opcua-metrics-slot:{index}", ttl=_SLOT_TTL)
+            if lock.acquire(blocking=False):
+                break
+            index += 1
+        previous = self._state.get_json(f"opcua-metrics:{index}") or {}
+        with self._lock:
+            for endpoint_url, data in previous.items():
+                stats = EndpointStats.from_dict(data)
+                current = self._stats.get(endpoint_url)
+                if current is not None:
+                    stats.merge(current)
+                    stats.broken = current.broken
+                self._stats[endpoint_url] = stats
+        self._slot, self._slot_index = lock, index
+        return index
+
+    def publish(self, force: bool = True) -> None:
+        """Write this worker's snapshot to shared state (at most every few seconds unless ``force``)."""
+        now = time.monotonic()
+        if not force and now - self._last_publish < _PUBLISH_INTERVAL:
+            return
+        self._last_publish = now
+        try:
+            index = self._claim_slot()
+            with self._lock:
+                snapshot = {url: stats.to_dict() for url, stats in self._stats.items()}
+            self._state.set_json(f"opcua-metrics:{index}", snapshot)
+        except Exception:
+            logger.exception("Failed to publish OPC UA metrics")
+
+    def collect(self) -> Dict[str, EndpointStats]:
+        """Merged stats of every worker, keyed by endpoint URL."""
+        self.publish()
+        merged: Dict[str, EndpointStats] = {}
+        index = 0
+        while True:
+            data = self._state.get_json(f"opcua-metrics:{index}")
+            if data is None:
+                break
+            for endpoint_url, raw in data.items():
+                stats = EndpointStats.from_dict(raw)
+                if endpoint_url in merged:
+                    merged[endpoint_url].merge(stats)
+                else:
+                    merged[endpoint_url] = stats
+            index += 1
+        return merged
+
+
+def diagnostics(stats: Optional[EndpointStats]) -> Dict:
+    """Summarize one endpoint's stats for the device diagnostics view."""
+    stats = stats or EndpointStats()
+    c = stats.counters
+
+    def latency(name: str) -> Dict:
+        hist = stats.histograms[name]
+        return {
+            "count": hist.count,
+            "mean_s": hist.sum / hist.count if hist.count else None,
+            "p50_s": hist.quantile(0.5),
+            "p95_s": hist.quantile(0.95),
+        }
+
+    scan = stats.last_scan
+    bottleneck = None
+    if scan and scan["seconds"] > 0:
+        server_share = min(1.0, scan["server_seconds"] / scan["seconds"])
+        scan = {**scan, "server_share": server_share}
+        # Sequential crawl: wall time is server round trips plus our own overhead
+        bottleneck = "server" if server_share >= 0.7 else "crawler"
+
+    return {
+        "connect": {**latency("connect"), "failures": c["connect_failures"], "last_s": stats.last_connect_s},
+        "browse": {**latency("browse"), "errors": c["browse_errors"]},
+        "read": {**latency("read"), "errors": c["read_errors"], "nodes": c["read_nodes"]},
+        "connects": c["connects"],
+        "reconnects": c["reconnects"],
+        "timeouts": c["timeouts"],
+        "scans": c["scans"],
+        "last_scan": scan,
+        "bottleneck": bottleneck,
+        "last_error": stats.last_error,
+        "last_error_at": stats.last_error_at,
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_COUNTER_HELP = {
+    "connects": "Successful OPC UA connects (session activated)",
+    "connect_failures": "Failed OPC UA connect attempts",
+    "reconnects": "Successful connects after a failed session, connect or timeout",
+    "timeouts": "OPC UA connects and service calls that timed out",
+    "browse_calls": "OPC UA Browse/BrowseNext service calls",
+    "browse_errors": "OPC UA Browse/BrowseNext service calls that failed",
+    "read_calls": "OPC UA Read service calls",
+    "read_errors": "OPC UA Read service calls that failed",
+    "read_nodes": "Node attributes requested in OPC UA Read calls",
+    "scans": "Completed address space scans",
+}
+_HISTOGRAM_HELP = {
+    "connect": "OPC UA connect/handshake time (socket, secure channel, session)",
+    "browse": "OPC UA Browse/BrowseNext call latency",
+    "read": "OPC UA Read call latency",
+}
+_SCAN_GAUGES = (
+    ("nodes", "Variables found by the last scan"),
+    ("seconds", "Wall time of the last scan"),
+    ("server_seconds", "Time the last scan spent waiting on the server"),
+    ("nodes_per_second", "Variables per second found by the last scan"),
+)
+
+
+def render_prometheus(merged: Dict[str, EndpointStats], devices: Iterable[Tuple[int, str, str]]) -> str:
+    """Prometheus text exposition (format 0.0.4) of the merged stats.
+
+    Series are labelled by endpoint; ``fluxforge_opcua_device_info`` maps
+    devices (id, name, endpoint) onto them so devices sharing an endpoint are
+    not counted twice.
+    """
+    lines = []
+    prefix = "fluxforge_opcua"
+    endpoints = sorted(merged)
+
+    lines += [f"# HELP {prefix}_device_info OPC UA device to endpoint mapping",
+              f"# TYPE {prefix}_device_info gauge"]
+    for device_id, name, endpoint_url in devices:
+        lines.append(
+            f'{prefix}_device_info{{device_id="{device_id}",device="{_escape(name)}",'
+            f'endpoint="{_escape(endpoint_url)}"}} 1'
+        )
+
+    for name in COUNTERS:
+        metric = f"{prefix}_{name}_total"
+        lines += [f"# HELP {metric} {_COUNTER_HELP[name]}", f"# TYPE {metric} counter"]
+        for url in endpoints:
+            lines.append(f'{metric}{{endpoint="{_escape(url)}"}} {merged[url].counters.get(name, 0)}')
+
+    for name in HISTOGRAMS:
+        metric = f"{prefix}_{name}_seconds"
+        lines += [f"# HELP {metric} {_HISTOGRAM_HELP[name]}", f"# TYPE {metric} histogram"]
+        for url in endpoints:
+            label = f'endpoint="{_escape(url)}"'
+            hist = merged[url].histograms[name]
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (None,), hist.counts):
+                cumulative += n
+                le = "+Inf" if bound is None else _fmt(bound)
+                lines.append(f'{metric}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {_fmt(hist.sum)}")
+            lines.append(f"{metric}_count{{{label}}} {cumulative}")
+
+    for key, help_text in _SCAN_GAUGES:
+        metric = f"{prefix}_last_scan_{key}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for url in endpoints:
+            scan = merged[url].last_scan
+            if scan and scan.get(key) is not None:
+                lines.append(f'{metric}{{endpoint="{_escape(url)}"}} {_fmt(scan[key])}')
+
+    return "\n".join(lines) + "\n"
+
+
+opcua_metrics = OpcuaMetrics(shared_state)
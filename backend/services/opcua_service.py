@@ -1,8 +1,12 @@
 import asyncio
 import logging
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict
 
+from services import opcua_types
 from services.opcua_certs import get_cert_path, get_key_path
+from services.opcua_metrics import opcua_metrics, SessionStats
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +18,10 @@ _SECURE_POLICIES = {
 }
 
 
+class ScanStopped(Exception):
+    """Raised by a scan collector hook to end the scan; passes through unchanged."""
+
+
 def _run_async(coro):
     """Run an async coroutine from sync context."""
     loop = asyncio.new_event_loop()
@@ -23,6 +31,26 @@ def _run_async(coro):
         loop.close()
 
 
+def _to_json_value(val):
+    """Convert an OPC UA variant value into something JSON-serializable."""
+    if isinstance(val, (bytes, bytearray)):
+        return val.hex()
+    if hasattr(val, 'isoformat'):
+        return val.isoformat()
+    if isinstance(val, float) and val != val:  # NaN
+        return None
+    return val
+
+
+def _data_value_to_dict(dv) -> Dict:
+    """Flatten a ua.DataValue into the {value, status, timestamp} dict the API returns."""
+    return {
+        "value": _to_json_value(dv.Value.Value if dv.Value else None),
+        "status": dv.StatusCode.name if dv.StatusCode else "Good",
+        "timestamp": dv.SourceTimestamp.isoformat() if dv.SourceTimestamp else None,
+    }
+
+
 async def _configure_client(client, security_policy: str, username: str, password: str) -> None:
     """Apply security policy and credentials to an asyncua Client before connecting."""
     if security_policy and security_policy in _SECURE_POLICIES:
@@ -33,6 +61,53 @@ async def _configure_client(client, security_policy: str, username: str, passwor
         client.set_password(password)
 
 
+def _timed_call(call, endpoint_url: str, kind: str, session: SessionStats):
+    async def timed(params, *args, **kwargs):
+        nodes = len(getattr(params, "NodesToRead", None) or ())
+        start = time.perf_counter()
+        try:
+            result = await call(params, *args, **kwargs)
+        except Exception as e:
+            opcua_metrics.call(endpoint_url, kind, time.perf_counter() - start, nodes, e, session)
+            raise
+        opcua_metrics.call(endpoint_url, kind, time.perf_counter() - start, nodes, session=session)
+        return result
+    return timed
+
+
+async def _connect(client, endpoint_url: str) -> None:
+    """``client.connect()`` with the handshake time recorded in the endpoint metrics."""
+    start = time.perf_counter()
+    try:
+        await client.connect()
+    except Exception as e:
+        opcua_metrics.connect_failed(endpoint_url, time.perf_counter() - start, e)
+        raise
+    opcua_metrics.connected(endpoint_url, time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def _session(client, endpoint_url: str):
+    """Instrumented ``async with client``: times the connect and every Browse/Read call."""
+    session = SessionStats()
+    uaclient = client.uaclient
+    for kind, name in (("browse", "browse"), ("browse", "browse_next"), ("read", "read")):
+        setattr(uaclient, name, _timed_call(getattr(uaclient, name), endpoint_url, kind, session))
+    await _connect(client, endpoint_url)
+    try:
+        yield session
+    except ScanStopped:
+        raise
+    except Exception as e:
+        opcua_metrics.session_failed(endpoint_url, e)
+        raise
+    finally:
+        try:
+            await client.disconnect()
+        finally:
+            opcua_metrics.publish()
+
+
 async def _test_connection_async(
     endpoint_url: str,
     username: str = "",
@@ -43,7 +118,7 @@ async def _test_connection_async(
         from asyncua import Client
         client = Client(url=endpoint_url, timeout=10)
         await _configure_client(client, security_policy, username, password)
-        async with client:
+        async with _session(client, endpoint_url):
             name = await client.get_server_node().read_display_name()
             return {"success": True, "message": f"Connected: {name.Text}"}
     except ImportError:
@@ -53,6 +128,67 @@ async def _test_connection_async(
         return {"success": False, "message": str(e)}
 
 
+def _node_id_parts(node_id):
+    """(namespace, identifier, identifier type) of an asyncua NodeId, as stored on tags."""
+    identifier = node_id.Identifier
+    if isinstance(identifier, int):
+        return node_id.NamespaceIndex, str(identifier), "i"
+    if isinstance(identifier, bytes):
+        return node_id.NamespaceIndex, identifier.hex(), "b"
+    return node_id.NamespaceIndex, str(identifier), "s"
+
+
+async def _browse_children(node, types: opcua_types.DataTypes) -> List[Dict]:
+    """One level of the address space below ``node``, as browse result dicts."""
+    from asyncua.ua import NodeClass
+
+    children = await node.get_children()
+    result = []
+
+    for child in children:
+        try:
+            node_class = await child.read_node_class()
+            browse_name = await child.read_browse_name()
+            display_name = await child.read_display_name()
+
+            namespace, identifier_str, identifier_type = _node_id_parts(child.nodeid)
+
+            is_variable = node_class == NodeClass.Variable
+            has_children = False
+
+            if not is_variable:
+                try:
+                    gc = await child.get_children()
+                    has_children = len(gc) > 0
+                except Exception:
+                    pass
+
+            data_type = ""
+            if is_variable:
+                try:
+                    data_type = types.name(await child.read_data_type())
+                except Exception:
+                    pass
+
+            result.append({
+                "node_id": child.nodeid.to_string(),
+                "namespace": namespace,
+                "identifier": identifier_str,
+                "identifier_type": identifier_type,
+                "browse_name": browse_name.Name or "",
+                "display_name": (display_name.Text or browse_name.Name or ""),
+                "node_class": node_class.name,
+                "is_variable": is_variable,
+                "has_children": has_children,
+                "data_type": data_type,
+                "path": "",
+            })
+        except Exception:
+            continue
+
+    return result
+
+
 async def _browse_node_async(
     endpoint_url: str,
     node_id: Optional[str],
@@ -62,75 +198,45 @@ async def _browse_node_async(
 ) -> List[Dict]:
     try:
         from asyncua import Client
-        from asyncua.ua import NodeClass
 
         client = Client(url=endpoint_url, timeout=15)
         await _configure_client(client, security_policy, username, password)
 
-        async with client:
+        async with _session(client, endpoint_url):
+            types = await opcua_types.load(client, endpoint_url)
             if node_id:
                 node = client.get_node(node_id)
             else:
                 node = client.get_objects_node()
+            return await _browse_children(node, types)
+    except ImportError:
+        raise RuntimeError("asyncua library not installed")
+    except Exception as e:
+        raise RuntimeError(f"Browse failed: {e}")
 
-            children = await node.get_children()
-            result = []
 
-            for child in children:
-                try:
-                    node_class = await child.read_node_class()
-                    browse_name = await child.read_browse_name()
-                    display_name = await child.read_display_name()
-
-                    child_nid = child.nodeid
-                    namespace = child_nid.NamespaceIndex
-                    identifier = child_nid.Identifier
-
-                    if isinstance(identifier, int):
-                        identifier_type = "i"
-                        identifier_str = str(identifier)
-                    elif isinstance(identifier, bytes):
-                        identifier_type = "b"
-                        identifier_str = identifier.hex()
-                    else:
-                        identifier_type = "s"
-                        identifier_str = str(identifier)
-
-                    is_variable = node_class == NodeClass.Variable
-                    has_children = False
-
-                    if not is_variable:
-                        try:
-                            gc = await child.get_children()
-                            has_children = len(gc) > 0
-                        except Exception:
-                            pass
+async def _browse_nodes_async(
+    endpoint_url: str,
+    node_ids: List[str],
+    username: str = "",
+    password: str = "",
+    security_policy: str = "None",
+) -> Dict[str, List[Dict]]:
+    try:
+        from asyncua import Client
 
-                    data_type = ""
-                    if is_variable:
-                        try:
-                            dt_node_id = await child.read_data_type()
-                            data_type = str(dt_node_id)
-                        except Exception:
-                            pass
-
-                    result.append({
-                        "node_id": child.nodeid.to_string(),
-                        "namespace": namespace,
-                        "identifier": identifier_str,
-                        "identifier_type": identifier_type,
-                        "browse_name": browse_name.Name or "",
-                        "display_name": (display_name.Text or browse_name.Name or ""),
-                        "node_class": node_class.name,
-                        "is_variable": is_variable,
-                        "has_children": has_children,
-                        "data_type": data_type,
-                        "path": "",
-                    })
-                except Exception:
-                    continue
+        client = Client(url=endpoint_url, timeout=15)
+        await _configure_client(client, security_policy, username, password)
 
-            return result
+        results = {}
+        async with _session(client, endpoint_url):
+            types = await opcua_types.load(client, endpoint_url)
+            for node_id in node_ids:
+                try:
+                    results[node_id] = await _browse_children(client.get_node(node_id), types)
+                except Exception as e:
+                    logger.debug(f"Browse of {node_id} on {endpoint_url} failed: {e}")
+        return results
     except ImportError:
         raise RuntimeError("asyncua library not installed")
     except Exception as e:
@@ -143,6 +249,8 @@ async def _scan_all_variables_async(
     password: str = "",
     security_policy: str = "None",
     max_depth: int = 8,
+    collector=None,
+    roots: Optional[Dict[str, str]] = None,
 ) -> List[Dict]:
     try:
         from asyncua import Client
@@ -151,9 +259,18 @@ async def _scan_all_variables_async(
         client = Client(url=endpoint_url, timeout=60)
         await _configure_client(client, security_policy, username, password)
 
-        variables = []
+        # Anything with .append() works, e.g. a ScanSnapshot to avoid a list of dicts.
+        # A collector with add_folder/folder_listed also gets the folders it can
+        # answer browses for; folder_listed runs once per browsed folder and may
+        # raise ScanStopped to end the scan.
+        variables = collector if collector is not None else []
+        add_folder = getattr(variables, "add_folder", None)
+        folder_listed = getattr(variables, "folder_listed", None)
+
+        started = time.perf_counter()
+        async with _session(client, endpoint_url) as session:
+            types = await opcua_types.load(client, endpoint_url)
 
-        async with client:
             async def browse_recursive(node, depth: int, path: str):
                 if depth > max_depth:
                     return
@@ -161,60 +278,126 @@ async def _scan_all_variables_async(
                     children = await node.get_children()
                 except Exception:
                     return
+                if folder_listed is not None:
+                    folder_listed(path, node.nodeid.to_string())
 
                 for child in children:
                     try:
-                        node_class = await child.read_node_class()
-                        display_name = await child.read_display_name()
-                        name = display_name.Text or ""
-                        current_path = f"{path}/{name}" if path else name
-
-                        child_nid = child.nodeid
-                        namespace = child_nid.NamespaceIndex
-                        identifier = child_nid.Identifier
-
-                        if isinstance(identifier, int):
-                            identifier_type = "i"
-                            identifier_str = str(identifier)
-                        elif isinstance(identifier, bytes):
-                            identifier_type = "b"
-                            identifier_str = identifier.hex()
-                        else:
-                            identifier_type = "s"
-                            identifier_str = str(identifier)
-
-                        if node_class == NodeClass.Variable:
-                            data_type = ""
-                            try:
-                                dt_node_id = await child.read_data_type()
-                                data_type = str(dt_node_id)
-                            except Exception:
-                                pass
-
-                            variables.append({
-                                "node_id": child.nodeid.to_string(),
-                                "namespace": namespace,
-                                "identifier": identifier_str,
-                                "identifier_type": identifier_type,
-                                "browse_name": name,
-                                "display_name": name,
-                                "node_class": "Variable",
-                                "is_variable": True,
-                                "has_children": False,
-                                "data_type": data_type,
-                                "path": current_path,
-                            })
-                        else:
-                            await browse_recursive(child, depth + 1, current_path)
+                        await visit(child, depth, path)
+                    except ScanStopped:
+                        raise
                     except Exception:
                         continue
 
+            async def visit(child, depth: int, path: str):
+                """Record ``child`` (found at ``depth`` below ``path``) and descend into it."""
+                node_class = await child.read_node_class()
+                display_name = await child.read_display_name()
+                name = display_name.Text or ""
+                current_path = f"{path}/{name}" if path else name
+
+                namespace, identifier_str, identifier_type = _node_id_parts(child.nodeid)
+
+                if node_class == NodeClass.Variable:
+                    data_type = ""
+                    try:
+                        data_type = types.name(await child.read_data_type())
+                    except Exception:
+                        pass
+
+                    variables.append({
+                        "node_id": child.nodeid.to_string(),
+                        "namespace": namespace,
+                        "identifier": identifier_str,
+                        "identifier_type": identifier_type,
+                        "browse_name": name,
+                        "display_name": name,
+                        "node_class": "Variable",
+                        "is_variable": True,
+                        "has_children": False,
+                        "data_type": data_type,
+                        "path": current_path,
+                    })
+                else:
+                    if add_folder is not None:
+                        add_folder({
+                            "node_id": child.nodeid.to_string(),
+                            "namespace": namespace,
+                            "identifier": identifier_str,
+                            "identifier_type": identifier_type,
+                            "browse_name": name,
+                            "node_class": node_class.name,
+                            "path": current_path,
+                        })
+                    await browse_recursive(child, depth + 1, current_path)
+
             objects_node = client.get_objects_node()
-            await browse_recursive(objects_node, 0, "")
 
+            async def parent_path(node) -> Optional[str]:
+                """Display-name path of ``node``'s parent below Objects, recording the
+                ancestors as folders; None if Objects is not reached within max_depth."""
+                chain = []
+                current = node
+                for _ in range(max_depth + 1):
+                    parent = await current.get_parent()
+                    if parent is None:
+                        return None
+                    if parent.nodeid == objects_node.nodeid:
+                        break
+                    chain.append(parent)
+                    current = parent
+                else:
+                    return None
+                path = ""
+                for ancestor in reversed(chain):
+                    name = (await ancestor.read_display_name()).Text or ""
+                    path = f"{path}/{name}" if path else name
+                    if add_folder is not None:
+                        namespace, identifier_str, identifier_type = _node_id_parts(ancestor.nodeid)
+                        add_folder({
+                            "node_id": ancestor.nodeid.to_string(),
+                            "namespace": namespace,
+                            "identifier": identifier_str,
+                            "identifier_type": identifier_type,
+                            "browse_name": name,
+                            "node_class": (await ancestor.read_node_class()).name,
+                            "path": path,
+                        })
+                return path
+
+            if roots is None:
+                await browse_recursive(objects_node, 0, "")
+            else:
+                # Resolve every root first so nested roots are crawled once, via the outermost
+                resolved = []
+                for node_id, known_path in roots.items():
+                    node = client.get_node(node_id)
+                    try:
+                        path = await parent_path(node)
+                    except Exception:
+                        path = None
+                    if path is None:  # fall back to the path the include was created with
+                        path = known_path.rpartition("/")[0]
+                    name = known_path.rpartition("/")[2]
+                    resolved.append((f"{path}/{name}" if path else name, path, node))
+                covered = []
+                for full_path, path, node in sorted(resolved, key=lambda r: r[0]):
+                    if any(full_path == c or full_path.startswith(c + "/") for c in covered):
+                        continue
+                    covered.append(full_path)
+                    try:
+                        await visit(node, path.count("/") + 1 if path else 0, path)
+                    except ScanStopped:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"Scan of {node.nodeid.to_string()} on {endpoint_url} failed: {e}")
+
+        opcua_metrics.scan_finished(endpoint_url, len(variables), time.perf_counter() - started, session)
         return variables
     except ImportError:
         raise RuntimeError("asyncua library not installed")
+    except ScanStopped:
+        raise
     except Exception as e:
         raise RuntimeError(f"Scan failed: {e}")
 
@@ -227,8 +410,125 @@ def browse_node(endpoint_url: str, node_id: Optional[str] = None, username: str
     return _run_async(_browse_node_async(endpoint_url, node_id, username, password, security_policy))
 
 
-def scan_all_variables(endpoint_url: str, username: str = "", password: str = "", security_policy: str = "None", max_depth: int = 8) -> List[Dict]:
-    return _run_async(_scan_all_variables_async(endpoint_url, username, password, security_policy, max_depth))
+def browse_nodes(endpoint_url: str, node_ids: List[str], username: str = "", password: str = "", security_policy: str = "None") -> Dict[str, List[Dict]]:
+    """Browse several nodes over one session; nodes that fail to browse are left out."""
+    return _run_async(_browse_nodes_async(endpoint_url, node_ids, username, password, security_policy))
+
+
+def scan_all_variables(endpoint_url: str, username: str = "", password: str = "", security_policy: str = "None", max_depth: int = 8, collector=None,
+                       roots: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """Every variable below Objects, or only below ``roots`` ({node_id: path}).
+
+    A scoped scan yields the same nodes and paths a full scan would under
+    those roots: each root's path is resolved through its ancestors on the
+    server (the given path is the fallback).
+    """
+    return _run_async(_scan_all_variables_async(endpoint_url, username, password, security_policy, max_depth, collector, roots))
+
+
+# Fallback chunk size when the server does not advertise MaxNodesPerRead (0 = no limit).
+_DEFAULT_NODES_PER_READ = 1000
+_MAX_READS_IN_FLIGHT = 4
+
+# endpoint_url -> MaxNodesPerRead advertised by the server
+_max_nodes_per_read: Dict[str, int] = {}
+
+
+async def _get_max_nodes_per_read(client, endpoint_url: str) -> int:
+    """Return the server's MaxNodesPerRead operation limit, cached per endpoint."""
+    if endpoint_url in _max_nodes_per_read:
+        return _max_nodes_per_read[endpoint_url]
+    from asyncua import ua
+
+    limit = _DEFAULT_NODES_PER_READ
+    try:
+        node = client.get_node(ua.NodeId(ua.ObjectIds.Server_ServerCapabilities_OperationLimits_MaxNodesPerRead))
+        value = await node.read_value()
+        if value:
+            limit = int(value)
+    except Exception:
+        pass
+    _max_nodes_per_read[endpoint_url] = limit
+    return limit
+
+
+async def _read_batched(
+    client,
+    endpoint_url: str,
+    node_ids: List[str],
+    attributes: Optional[List] = None,
+    max_in_flight: int = _MAX_READS_IN_FLIGHT,
+) -> List:
+    """Read one or more attributes of many nodes with batched Read requests.
+
+    Requests are chunked to the server's MaxNodesPerRead and up to
+    ``max_in_flight`` chunks are sent concurrently.  Returns a list aligned with
+    ``node_ids``; each entry is either a list of ua.DataValue (one per attribute)
+    or an Exception if the node id could not be parsed or its chunk failed.
+    """
+    from asyncua import ua
+
+    attributes = attributes or [ua.AttributeIds.Value]
+    results: List = [None] * len(node_ids)
+
+    parsed = []
+    for idx, nid_str in enumerate(node_ids):
+        try:
+            parsed.append((idx, ua.NodeId.from_string(nid_str)))
+        except Exception as e:
+            results[idx] = e
+
+    per_read = await _get_max_nodes_per_read(client, endpoint_url)
+    nodes_per_chunk = max(1, per_read // len(attributes))
+    chunks = [parsed[i:i + nodes_per_chunk] for i in range(0, len(parsed), nodes_per_chunk)]
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def read_chunk(chunk):
+        params = ua.ReadParameters()
+        for _, nodeid in chunk:
+            for attr in attributes:
+                rv = ua.ReadValueId()
+                rv.NodeId = nodeid
+                rv.AttributeId = attr
+                params.NodesToRead.append(rv)
+        async with semaphore:
+            try:
+                dvs = await client.uaclient.read(params)
+            except Exception as e:
+                for idx, _ in chunk:
+                    results[idx] = e
+                return
+        n_attrs = len(attributes)
+        for pos, (idx, _) in enumerate(chunk):
+            results[idx] = dvs[pos * n_attrs:(pos + 1) * n_attrs]
+
+    await asyncio.gather(*(read_chunk(chunk) for chunk in chunks))
+    return results
+
+
+def _read_results_to_dicts(node_ids: List[str], results: List) -> Dict[str, Dict]:
+    """Convert a chunk of ``_read_batched`` Value results into API dicts."""
+    from asyncua import ua
+
+    to_json = _to_json_value
+    status_error = ua.UaStatusCodeError
+    out = {}
+    for nid_str, res in zip(node_ids, results):
+        if isinstance(res, Exception):
+            out[nid_str] = {"value": None, "status": f"Error: {res}", "timestamp": None}
+            continue
+        dv = res[0]
+        code = dv.StatusCode
+        if code is not None and code.is_bad():
+            out[nid_str] = {"value": None, "status": f"Error: {status_error(code.value)}", "timestamp": None}
+            continue
+        ts = dv.SourceTimestamp
+        out[nid_str] = {
+            "value": to_json(dv.Value.Value if dv.Value else None),
+            "status": code.name if code else "Good",
+            "timestamp": ts.isoformat() if ts else None,
+        }
+    return out
 
 
 async def _read_values_async(
@@ -239,35 +539,14 @@ async def _read_values_async(
     security_policy: str = "None",
 ) -> Dict[str, Dict]:
     try:
-        from asyncua import Client, ua
+        from asyncua import Client
 
         client = Client(url=endpoint_url, timeout=15)
         await _configure_client(client, security_policy, username, password)
 
-        results = {}
-        async with client:
-            for nid_str in node_ids:
-                try:
-                    node = client.get_node(nid_str)
-                    dv = await node.read_data_value()
-                    val = dv.Value.Value
-                    # Convert non-JSON-serializable types
-                    if isinstance(val, (bytes, bytearray)):
-                        val = val.hex()
-                    elif hasattr(val, 'isoformat'):
-                        val = val.isoformat()
-                    elif isinstance(val, float):
-                        if val != val:  # NaN
-                            val = None
-                    results[nid_str] = {
-                        "value": val,
-                        "status": dv.StatusCode.name if dv.StatusCode else "Good",
-                        "timestamp": dv.SourceTimestamp.isoformat() if dv.SourceTimestamp else None,
-                    }
-                except Exception as e:
-                    results[nid_str] = {"value": None, "status": f"Error: {e}", "timestamp": None}
-
-        return results
+        async with _session(client, endpoint_url):
+            results = await _read_batched(client, endpoint_url, node_ids)
+        return _read_results_to_dicts(node_ids, results)
     except ImportError:
         raise RuntimeError("asyncua library not installed")
     except Exception as e:
@@ -276,3 +555,94 @@ async def _read_values_async(
 
 def read_values(endpoint_url: str, node_ids: List[str], username: str = "", password: str = "", security_policy: str = "None") -> Dict[str, Dict]:
     return _run_async(_read_values_async(endpoint_url, node_ids, username, password, security_policy))
+
+
+async def _validate_nodes_async(
+    endpoint_url: str,
+    node_ids: List[str],
+    username: str = "",
+    password: str = "",
+    security_policy: str = "None",
+) -> Dict[str, Dict]:
+    """Read NodeClass and DataType for each node id in batched requests.
+
+    Returns {node_id: {"status": "ok"|"missing"|"error", "node_class", "data_type", "message"}};
+    "ok" entries also carry the DataType's other string forms (``data_type_str``,
+    ``data_type_name``).
+    """
+    try:
+        from asyncua import Client, ua
+
+        client = Client(url=endpoint_url, timeout=15)
+        await _configure_client(client, security_policy, username, password)
+
+        async with _session(client, endpoint_url):
+            types = await opcua_types.load(client, endpoint_url)
+            results = await _read_batched(
+                client, endpoint_url, node_ids,
+                [ua.AttributeIds.NodeClass, ua.AttributeIds.DataType],
+            )
+
+        out = {}
+        for nid_str, res in zip(node_ids, results):
+            if isinstance(res, ua.UaStringParsingError):
+                out[nid_str] = {"status": "missing", "node_class": None, "data_type": None,
+                                "message": f"Invalid node id: {res}"}
+                continue
+            if isinstance(res, Exception):
+                out[nid_str] = {"status": "error", "node_class": None, "data_type": None,
+                                "message": str(res)}
+                continue
+            nc_dv, dt_dv = res
+            if nc_dv.StatusCode is not None and nc_dv.StatusCode.is_bad():
+                out[nid_str] = {"status": "missing", "node_class": None, "data_type": None,
+                                "message": str(ua.UaStatusCodeError(nc_dv.StatusCode.value))}
+                continue
+            data_type = None
+            if (dt_dv.StatusCode is None or dt_dv.StatusCode.is_good()) and dt_dv.Value:
+                data_type = dt_dv.Value.Value
+            out[nid_str] = {
+                "status": "ok",
+                "node_class": ua.NodeClass(nc_dv.Value.Value).name,
+                "data_type": data_type.to_string() if data_type is not None else "",
+                "data_type_str": str(data_type) if data_type is not None else "",
+                "data_type_name": types.name(data_type) if data_type is not None else "",
+                "message": "",
+            }
+        return out
+    except ImportError:
+        raise RuntimeError("asyncua library not installed")
+    except Exception as e:
+        raise RuntimeError(f"Validate nodes failed: {e}")
+
+
+async def _data_types_async(
+    endpoint_url: str,
+    username: str = "",
+    password: str = "",
+    security_policy: str = "None",
+) -> opcua_types.DataTypes:
+    try:
+        from asyncua import Client
+
+        client = Client(url=endpoint_url, timeout=15)
+        await _configure_client(client, security_policy, username, password)
+
+        async with _session(client, endpoint_url):
+            return await opcua_types.load(client, endpoint_url)
+    except ImportError:
+        raise RuntimeError("asyncua library not installed")
+    except Exception as e:
+        raise RuntimeError(f"Loading data types failed: {e}")
+
+
+def data_types(endpoint_url: str, username: str = "", password: str = "", security_policy: str = "None") -> opcua_types.DataTypes:
+    """The server's DataType names and base types, connecting only if not cached."""
+    types = opcua_types.cached(endpoint_url)
+    if types is not None:
+        return types
+    return _run_async(_data_types_async(endpoint_url, username, password, security_policy))
+
+
+def validate_nodes(endpoint_url: str, node_ids: List[str], username: str = "", password: str = "", security_policy: str = "None") -> Dict[str, Dict]:
+    return _run_async(_validate_nodes_async(endpoint_url, node_ids, username, password, security_policy))
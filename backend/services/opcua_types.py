@@ -0,0 +1,186 @@
+"""
+DataType names per OPC UA server.
+
+Variables report their DataType as a NodeId (``i=11``, ``ns=3;i=3002``).
+``DataTypes`` maps every DataType a server defines, vendor structures and
+enumerations included, to its display name and its base scalar type (the
+built-in type it is encoded as: ``Duration`` -> ``Double``, an enumeration ->
+``Int32``, any structure -> ``Structure``).
+
+The map is built once per endpoint by walking the HasSubtype hierarchy below
+BaseDataType one level per Browse request (names come with the browse
+results, so no reads), then kept in shared state for ``_TTL_S`` and in each
+worker's memory, so scans and validation resolve names without extra
+requests per variable.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+_TTL_S = 3600
+# Type nodes per Browse request
+_BROWSE_BATCH = 500
+
+_BASE_DATA_TYPE = "i=24"
+_ENUMERATION = "i=29"
+# Built-in types that values are encoded as (BaseDataType and the abstract
+# Number/Integer/UInteger are not)
+_SCALARS = {f"i={i}" for i in (*range(1, 24), 25)}
+
+
+class DataTypes:
+    """DataType NodeId string -> (name, base scalar type name)."""
+
+    def __init__(self, types: Dict[str, Tuple[str, str]]):
+        self.types = types
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def name(self, node_id) -> str:
+        """Display name of a DataType, or its NodeId string if unknown."""
+        key = node_id if isinstance(node_id, str) else node_id.to_string()
+        entry = self.types.get(key)
+        return entry[0] if entry is not None else key
+
+    def base_type(self, node_id) -> str:
+        key = node_id if isinstance(node_id, str) else node_id.to_string()
+        entry = self.types.get(key)
+        return entry[1] if entry is not None else ""
+
+    def rows(self) -> List[Dict]:
+        return [
+            {"node_id": node_id, "name": name, "base_type": base}
+            for node_id, (name, base) in sorted(self.types.items(), key=lambda item: item[1][0].lower())
+        ]
+
+
+_local: Dict[str, Tuple[float, DataTypes]] = {}
+_lock = threading.Lock()
+
+
+def _state_key(endpoint_url: str) -> str:
+    return f"datatypes:{endpoint_url}"
+
+
+def cached(endpoint_url: str) -> Optional[DataTypes]:
+    """The endpoint's DataTypes if this worker or shared state has them."""
+    now = time.time()
+    with _lock:
+        entry = _local.get(endpoint_url)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    stored = shared_state.get_json(_state_key(endpoint_url))
+    if stored is None or stored["expires_at"] <= now:
+        return None
+    types = DataTypes({node_id: tuple(value) for node_id, value in stored["types"].items()})
+    with _lock:
+        _local[endpoint_url] = (stored["expires_at"], types)
+    return types
+
+
+def _store(endpoint_url: str, types: DataTypes) -> None:
+    expires_at = time.time() + _TTL_S
+    shared_state.set_json(
+        _state_key(endpoint_url), {"expires_at": expires_at, "types": types.types}, ttl=_TTL_S,
+    )
+    with _lock:
+        _local[endpoint_url] = (expires_at, types)
+
+
+def invalidate(endpoint_url: str) -> None:
+    shared_state.delete(_state_key(endpoint_url))
+    with _lock:
+        _local.pop(endpoint_url, None)
+
+
+async def _browse_subtypes(client, node_ids: List) -> List[List]:
+    """HasSubtype children (DataType nodes only) of each node, one request per batch."""
+    from asyncua import ua
+
+    results = []
+    for start in range(0, len(node_ids), _BROWSE_BATCH):
+        params = ua.BrowseParameters()
+        params.RequestedMaxReferencesPerNode = 0
+        for node_id in node_ids[start:start + _BROWSE_BATCH]:
+            desc = ua.BrowseDescription()
+            desc.NodeId = node_id
+            desc.BrowseDirection = ua.BrowseDirection.Forward
+            desc.ReferenceTypeId = ua.NodeId(ua.ObjectIds.HasSubtype)
+            desc.IncludeSubtypes = True
+            desc.NodeClassMask = ua.NodeClass.DataType
+            desc.ResultMask = ua.BrowseResultMask.DisplayName | ua.BrowseResultMask.BrowseName
+            params.NodesToBrowse.append(desc)
+        batch = await client.uaclient.browse(params)
+        for result in batch:
+            references = list(result.References or [])
+            continuation = result.ContinuationPoint
+            while continuation:
+                next_params = ua.BrowseNextParameters()
+                next_params.ContinuationPoints = [continuation]
+                next_params.ReleaseContinuationPoints = False
+                more = await client.uaclient.browse_next(next_params)
+                if not more:
+                    break
+                references.extend(more[0].References or [])
+                continuation = more[0].ContinuationPoint
+            results.append(references)
+    return results
+
+
+async def _build(client) -> DataTypes:
+    from asyncua import ua
+
+    names = {_BASE_DATA_TYPE: "BaseDataType"}
+    parents: Dict[str, str] = {}
+    level = [ua.NodeId(ua.ObjectIds.BaseDataType)]
+    while level:
+        next_level = []
+        for parent, references in zip(level, await _browse_subtypes(client, level)):
+            parent_key = parent.to_string()
+            for ref in references:
+                key = ref.NodeId.to_string()
+                if key in names:  # a type reachable twice (servers are not always strict)
+                    continue
+                names[key] = ref.DisplayName.Text or ref.BrowseName.Name or key
+                parents[key] = parent_key
+                next_level.append(ref.NodeId)
+        level = next_level
+
+    types = {}
+    for key, name in names.items():
+        base, current = "", key
+        while current is not None:
+            if current in _SCALARS:
+                base = names.get(current, "")
+                break
+            if current == _ENUMERATION:
+                base = "Int32"
+                break
+            current = parents.get(current)
+        types[key] = (name, base)
+    return DataTypes(types)
+
+
+async def load(client, endpoint_url: str) -> DataTypes:
+    """The endpoint's DataTypes, built over ``client``'s open session if not cached.
+
+    A server whose type hierarchy cannot be browsed gets an empty map (names
+    fall back to NodeId strings) that is not cached.
+    """
+    types = cached(endpoint_url)
+    if types is not None:
+        return types
+    try:
+        types = await _build(client)
+    except Exception as e:
+        logger.warning(f"Could not load the DataTypes of {endpoint_url}: {e}")
+        return DataTypes({})
+    _store(endpoint_url, types)
+    return types
@@ -0,0 +1,105 @@
+"""
+Scan results shared across workers.
+
+``ScanCache`` keeps the familiar ``device_id -> {"status", "nodes", "error"}``
+mapping interface (plus ``scope``: "full", or "includes" for a scan limited to
+the device's NodeInclude subtrees), but the entries live in the shared-state backend so every
+worker sees the same scan status and results.  The (potentially large)
+``ScanSnapshot`` is stored as one pickled blob per completed scan; each worker
+keeps the decoded snapshot in memory and only reloads it when the scan
+version changes.
+"""
+
+import pickle
+import threading
+from typing import Dict, Optional, Tuple
+
+from services.scan_snapshot import ScanSnapshot
+from services.shared_state import SharedState, shared_state
+
+
+class ScanCache:
+    def __init__(self, state: SharedState):
+        self._state = state
+        self._local: Dict[int, Tuple[int, ScanSnapshot]] = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, device_id: int, version: int) -> ScanSnapshot:
+        with self._lock:
+            local = self._local.get(device_id)
+        if local is not None and local[0] == version:
+            return local[1]
+        raw = self._state.get(f"scan:{device_id}:nodes") if version else None
+        nodes = pickle.loads(raw) if raw is not None else ScanSnapshot()
+        with self._lock:
+            self._local[device_id] = (version, nodes)
+        return nodes
+
+    def get(self, device_id: int, default=None) -> Optional[Dict]:
+        entry = self._state.get_json(f"scan:{device_id}")
+        if entry is None:
+            with self._lock:
+                self._local.pop(device_id, None)
+            return default
+        return {
+            "status": entry["status"],
+            "nodes": self._snapshot(device_id, entry.get("version", 0)),
+            "error": entry.get("error"),
+            "scope": entry.get("scope", "full"),
+        }
+
+    def status(self, device_id: int) -> Optional[str]:
+        """Scan status without loading the nodes."""
+        entry = self._state.get_json(f"scan:{device_id}")
+        return None if entry is None else entry["status"]
+
+    def signature(self, device_id: int) -> Optional[Tuple[str, Optional[str], int]]:
+        """Status, error and snapshot version without loading the nodes.
+
+        Changes whenever the entry does; None when there is no entry.
+        """
+        entry = self._state.get_json(f"scan:{device_id}")
+        if entry is None:
+            return None
+        return entry["status"], entry.get("error"), entry.get("version", 0)
+
+    def count(self, device_id: int, scope: Optional[str] = None) -> int:
+        """Nodes found by the device's last completed scan (of ``scope``), without loading them."""
+        entry = self._state.get_json(f"scan:{device_id}")
+        if entry is None or entry["status"] != "complete":
+            return 0
+        if scope is not None and entry.get("scope", "full") != scope:
+            return 0
+        return entry.get("count", 0)
+
+    def __setitem__(self, device_id: int, entry: Dict) -> None:
+        nodes = entry.get("nodes")
+        version = 0
+        if nodes:
+            version = self._state.incr(f"scan:{device_id}:version")
+            self._state.set(
+                f"scan:{device_id}:nodes", pickle.dumps(nodes, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+            with self._lock:
+                self._local[device_id] = (version, nodes)
+        else:
+            self._state.delete(f"scan:{device_id}:nodes")
+        self._state.set_json(f"scan:{device_id}", {
+            "status": entry["status"],
+            "error": entry.get("error"),
+            "scope": entry.get("scope", "full"),
+            "count": len(nodes) if nodes else 0,
+            "version": version,
+        })
+
+    def __contains__(self, device_id: int) -> bool:
+        return self._state.get(f"scan:{device_id}") is not None
+
+    def discard(self, device_id: int) -> None:
+        self._state.delete(f"scan:{device_id}")
+        self._state.delete(f"scan:{device_id}:nodes")
+        with self._lock:
+            self._local.pop(device_id, None)
+
+
+scan_cache = ScanCache(shared_state)
@@ -0,0 +1,395 @@
+"""
+Compact, columnar storage for OPC UA scan results.
+
+A scan of a large server yields tens of thousands of node dicts whose
+``path``/``browse_name``/``display_name`` repeat the same long prefixes and
+whose ``node_class``/``data_type``/``identifier_type`` are a handful of
+literals.  ``ScanSnapshot`` stores them as:
+
+- a parent-indexed folder table (each folder path stored once as
+  ``(parent_id, segment)``), plus one interned name per node;
+- enum-coded small fields in ``array`` columns;
+- overrides only for the rare nodes whose values cannot be derived
+  (display names containing ``/``, opaque/GUID node ids, ...).
+
+It behaves like a read-only list of node dicts for existing consumers and can
+encode itself to JSON without materializing those dicts.
+
+Scans also record the folders they crossed (``add_folder``) and the ones
+whose children they listed (``folder_listed``), so ``children`` can answer a
+browse of any fully listed folder without going to the server.
+"""
+
+import json
+import sys
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+_encode = json.encoder.encode_basestring
+
+_ID_TYPES = ("i", "s", "g", "b")
+_ID_TYPE_CODES = {t: i for i, t in enumerate(_ID_TYPES)}
+
+_FLAG_VARIABLE = 1
+_FLAG_HAS_CHILDREN = 2
+
+
+class _CodeTable:
+    """Bidirectional string <-> small int mapping for enum-like columns."""
+
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+class ScanSnapshot:
+    """Read-only, list-like container of scanned nodes in columnar form."""
+
+    def __init__(self, nodes: Optional[Iterable[Dict]] = None):
+        # Folder table: folder id -> (parent folder id, last path segment)
+        self._folder_parent = array("i")
+        self._folder_name: List[str] = []
+        self._folder_ids: Dict[str, int] = {}
+        self._folder_paths: List[str] = []
+
+        # Per-node columns
+        self._folder = array("i")
+        self._name: List[str] = []
+        self._identifier: List[str] = []
+        self._namespace = array("H")
+        self._id_type = array("B")
+        self._node_class = array("B")
+        self._data_type = array("H")
+        self._flags = array("B")
+
+        self._node_classes = _CodeTable()
+        self._data_types = _CodeTable()
+
+        # Sparse overrides for values that differ from what can be derived
+        self._node_id_override: Dict[int, str] = {}
+        self._display_override: Dict[int, str] = {}
+        self._browse_override: Dict[int, str] = {}
+
+        # Folder nodes seen by the scan: folder id -> (node_id, namespace,
+        # identifier, identifier_type, browse_name, node_class); the root is -1
+        self._folder_node: Dict[int, Tuple] = {}
+        self._folder_by_node_id: Dict[str, int] = {}
+        self._listed = set()
+        self._ambiguous = set()
+
+        # JSON fragment caches (filled lazily by to_json)
+        self._json_names: Dict[str, str] = {}
+        # folder id -> (subfolder ids, node indices), built on first browse
+        self._children: Optional[Dict[int, Tuple[List[int], List[int]]]] = None
+
+        if nodes is not None:
+            self.extend(nodes)
+
+    def __getstate__(self):
+        # The JSON fragment cache is cheap to rebuild; don't ship it between workers
+        state = self.__dict__.copy()
+        state["_json_names"] = {}
+        state["_children"] = None
+        return state
+
+    def __setstate__(self, state):
+        # Snapshots pickled before folders were recorded answer no browses
+        self.__dict__.update({
+            "_folder_node": {}, "_folder_by_node_id": {}, "_listed": set(), "_ambiguous": set(),
+            "_children": None, **state,
+        })
+
+    # ── Building ─────────────────────────────────────────────────────────
+
+    def _folder_id(self, path: str) -> int:
+        if not path:
+            return -1
+        folder_id = self._folder_ids.get(path)
+        if folder_id is None:
+            parent, _, name = path.rpartition("/")
+            parent_id = self._folder_id(parent)
+            folder_id = len(self._folder_name)
+            self._folder_parent.append(parent_id)
+            self._folder_name.append(sys.intern(name))
+            self._folder_paths.append(path)
+            self._folder_ids[path] = folder_id
+        return folder_id
+
+    def append(self, node: Dict) -> None:
+        """Add one node dict as produced by ``opcua_service`` scans/browses."""
+        idx = len(self._name)
+        path = node.get("path", "") or ""
+        folder_path, _, name = path.rpartition("/")
+        name = sys.intern(name)
+
+        namespace = node.get("namespace", 0)
+        identifier = node.get("identifier", "")
+        id_type = node.get("identifier_type", "s")
+        display_name = node.get("display_name", "")
+        browse_name = node.get("browse_name", "")
+
+        self._folder.append(self._folder_id(folder_path))
+        self._name.append(name)
+        self._identifier.append(identifier)
+        self._namespace.append(namespace)
+        self._id_type.append(_ID_TYPE_CODES.get(id_type, 1))
+        self._node_class.append(self._node_classes.code(node.get("node_class", "Variable")))
+        self._data_type.append(self._data_types.code(node.get("data_type", "") or ""))
+        self._flags.append(
+            (_FLAG_VARIABLE if node.get("is_variable", True) else 0)
+            | (_FLAG_HAS_CHILDREN if node.get("has_children", False) else 0)
+        )
+
+        if id_type not in _ID_TYPE_CODES:
+            self._node_id_override[idx] = node["node_id"]
+        elif node["node_id"] != _format_node_id(namespace, id_type, identifier):
+            self._node_id_override[idx] = node["node_id"]
+        if display_name != name:
+            self._display_override[idx] = display_name
+        if browse_name != name:
+            self._browse_override[idx] = browse_name
+        self._children = None
+
+    def extend(self, nodes: Iterable[Dict]) -> None:
+        for node in nodes:
+            self.append(node)
+
+    def add_folder(self, node: Dict) -> None:
+        """Record a non-variable node (by its ``path``) the scan came across."""
+        folder_id = self._folder_id(node.get("path", "") or "")
+        known = self._folder_node.get(folder_id)
+        if known is not None:
+            if known[0] != node["node_id"]:
+                # Two nodes share a display-name path; neither level can be browsed from here
+                self._ambiguous.update((folder_id, self._folder_parent[folder_id]))
+            return
+        self._folder_node[folder_id] = (
+            node["node_id"], node.get("namespace", 0), node.get("identifier", ""),
+            node.get("identifier_type", "s"), node.get("browse_name", ""), node.get("node_class", "Object"),
+        )
+        self._folder_by_node_id[node["node_id"]] = folder_id
+        self._children = None
+
+    def folder_listed(self, path: str, node_id: str) -> None:
+        """Mark the folder at ``path`` as having all its children recorded ("" is the root)."""
+        folder_id = self._folder_id(path) if path else -1
+        self._folder_by_node_id.setdefault(node_id, folder_id)
+        self._listed.add(folder_id)
+
+    # ── Column accessors ─────────────────────────────────────────────────
+
+    def path(self, idx: int) -> str:
+        folder_id = self._folder[idx]
+        if folder_id < 0:
+            return self._name[idx]
+        return f"{self._folder_paths[folder_id]}/{self._name[idx]}"
+
+    def node_id(self, idx: int) -> str:
+        override = self._node_id_override.get(idx)
+        if override is not None:
+            return override
+        return _format_node_id(self._namespace[idx], _ID_TYPES[self._id_type[idx]], self._identifier[idx])
+
+    def is_variable(self, idx: int) -> bool:
+        return bool(self._flags[idx] & _FLAG_VARIABLE)
+
+    def node(self, idx: int) -> Dict:
+        """Materialize one node as the classic scan dict."""
+        name = self._name[idx]
+        node_class = self._node_classes.values[self._node_class[idx]]
+        flags = self._flags[idx]
+        return {
+            "node_id": self.node_id(idx),
+            "namespace": self._namespace[idx],
+            "identifier": self._identifier[idx],
+            "identifier_type": _ID_TYPES[self._id_type[idx]],
+            "browse_name": self._browse_override.get(idx, name),
+            "display_name": self._display_override.get(idx, name),
+            "node_class": node_class,
+            "is_variable": bool(flags & _FLAG_VARIABLE),
+            "has_children": bool(flags & _FLAG_HAS_CHILDREN),
+            "data_type": self._data_types.values[self._data_type[idx]],
+            "path": self.path(idx),
+        }
+
+    # ── List-like protocol ───────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._name)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for idx in range(len(self._name)):
+            yield self.node(idx)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.node(i) for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("ScanSnapshot index out of range")
+        return self.node(idx)
+
+    # ── Queries ──────────────────────────────────────────────────────────
+
+    def indices_under(self, parent_path: str) -> List[int]:
+        """Indices of nodes at ``parent_path`` or anywhere below it.
+
+        Uses the folder table instead of comparing every node's path string.
+        """
+        n_folders = len(self._folder_name)
+        target = self._folder_ids.get(parent_path)
+        result = []
+        if target is not None:
+            # Parents are always created before their children, so one
+            # forward pass marks the whole subtree.
+            inside = bytearray(n_folders)
+            inside[target] = 1
+            parents = self._folder_parent
+            for fid in range(target + 1, n_folders):
+                parent = parents[fid]
+                if parent >= 0 and inside[parent]:
+                    inside[fid] = 1
+            folders = self._folder
+            result = [i for i in range(len(folders)) if folders[i] >= 0 and inside[folders[i]]]
+
+        # A node whose own path equals parent_path (e.g. a subscribed variable)
+        folder_path, _, name = parent_path.rpartition("/")
+        parent_id = self._folder_ids.get(folder_path, -1) if folder_path else -1
+        if not folder_path or parent_id >= 0:
+            for i in range(len(self._name)):
+                if self._folder[i] == parent_id and self._name[i] == name:
+                    result.append(i)
+        return sorted(result)
+
+    def nodes_under(self, parent_path: str) -> List[Dict]:
+        return [self.node(i) for i in self.indices_under(parent_path)]
+
+    def _child_index(self) -> Dict[int, Tuple[List[int], List[int]]]:
+        if self._children is None:
+            children: Dict[int, Tuple[List[int], List[int]]] = {}
+            for fid, parent in enumerate(self._folder_parent):
+                children.setdefault(parent, ([], []))[0].append(fid)
+            for idx, fid in enumerate(self._folder):
+                children.setdefault(fid, ([], []))[1].append(idx)
+            self._children = children
+        return self._children
+
+    def is_listed(self, node_id: Optional[str]) -> bool:
+        """Whether ``children`` can answer for ``node_id`` (None is the root)."""
+        folder_id = -1 if node_id is None else self._folder_by_node_id.get(node_id)
+        return folder_id is not None and folder_id in self._listed and folder_id not in self._ambiguous
+
+    def children(self, node_id: Optional[str]) -> Optional[List[Dict]]:
+        """Browse result for a folder the scan fully listed, or None if it did not.
+
+        Folders come first, then variables, each in scan order.  Folders the
+        scan did not descend into report ``has_children`` as True.
+        """
+        if not self.is_listed(node_id):
+            return None
+        folder_id = -1 if node_id is None else self._folder_by_node_id[node_id]
+        index = self._child_index()
+        subfolders, variables = index.get(folder_id, ([], []))
+        result = []
+        for fid in subfolders:
+            info = self._folder_node.get(fid)
+            if info is None:
+                return None  # a folder known only from variable paths
+            node_id_, namespace, identifier, id_type, browse_name, node_class = info
+            sub = index.get(fid)
+            result.append({
+                "node_id": node_id_,
+                "namespace": namespace,
+                "identifier": identifier,
+                "identifier_type": id_type,
+                "browse_name": browse_name,
+                "display_name": self._folder_name[fid],
+                "node_class": node_class,
+                "is_variable": False,
+                "has_children": bool(sub and (sub[0] or sub[1])) if fid in self._listed else True,
+                "data_type": "",
+                "path": self._folder_paths[fid],
+            })
+        result.extend(self.node(idx) for idx in variables)
+        return result
+
+    # ── JSON ─────────────────────────────────────────────────────────────
+
+    def to_json(self) -> str:
+        """Encode as a JSON array of node objects.
+
+        Repeated strings (folder prefixes, names, enum values) are escaped once
+        and spliced together, which is several times faster than json.dumps on
+        materialized dicts and needs no per-node dict allocation.
+        """
+        names_cache = self._json_names
+        folder_prefix = [_encode(p + "/")[:-1] for p in self._folder_paths]
+        node_classes = [_encode(v) for v in self._node_classes.values]
+        data_types = [_encode(v) for v in self._data_types.values]
+        id_types = [_encode(t) for t in _ID_TYPES]
+        bools = ("false", "true")
+
+        def enc_name(name: str) -> str:
+            encoded = names_cache.get(name)
+            if encoded is None:
+                encoded = names_cache[name] = _encode(name)
+            return encoded
+
+        template = (
+            '{"node_id":%s,"namespace":%d,"identifier":%s,"identifier_type":%s,'
+            '"browse_name":%s,"display_name":%s,"node_class":%s,"is_variable":%s,'
+            '"has_children":%s,"data_type":%s,"path":%s}'
+        )
+        display_override = self._display_override
+        browse_override = self._browse_override
+        node_id_override = self._node_id_override
+        folders, names, identifiers = self._folder, self._name, self._identifier
+        namespaces, id_type_codes, flags_col = self._namespace, self._id_type, self._flags
+        nc_codes, dt_codes = self._node_class, self._data_type
+
+        parts = []
+        append = parts.append
+        for idx in range(len(names)):
+            name_json = enc_name(names[idx])
+            folder_id = folders[idx]
+            path_json = folder_prefix[folder_id] + name_json[1:] if folder_id >= 0 else name_json
+            identifier_json = _encode(identifiers[idx])
+            namespace = namespaces[idx]
+            id_type = id_type_codes[idx]
+            override = node_id_override.get(idx)
+            if override is not None:
+                node_id_json = _encode(override)
+            elif namespace:
+                node_id_json = f'"ns={namespace};{_ID_TYPES[id_type]}={identifier_json[1:]}'
+            else:
+                node_id_json = f'"{_ID_TYPES[id_type]}={identifier_json[1:]}'
+            display = display_override.get(idx)
+            browse = browse_override.get(idx)
+            flags = flags_col[idx]
+            append(template % (
+                node_id_json, namespace, identifier_json, id_types[id_type],
+                name_json if browse is None else _encode(browse),
+                name_json if display is None else _encode(display),
+                node_classes[nc_codes[idx]], bools[flags & _FLAG_VARIABLE],
+                bools[(flags & _FLAG_HAS_CHILDREN) >> 1], data_types[dt_codes[idx]],
+                path_json,
+            ))
+        return "[" + ",".join(parts) + "]"
+
+
+def _format_node_id(namespace: int, id_type: str, identifier: str) -> str:
+    """Rebuild the string form of a NodeId the way asyncua's to_string does."""
+    if namespace:
+        return f"ns={namespace};{id_type}={identifier}"
+    return f"{id_type}={identifier}"
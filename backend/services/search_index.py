@@ -0,0 +1,220 @@
+"""
+Full-text search over tags and scanned nodes (SQLite FTS5).
+
+Two FTS5 tables back ``/api/search``:
+
+- ``tags_fts`` indexes ``tags`` (display_name, path, node_id,
+  measurement_name) as a contentless table keyed by tag id; triggers on
+  ``tags`` keep it in sync with every write path, bulk statements included.
+  A ``device`` column holds a ``d{device_id}`` token, so filtering by device
+  is a doclist intersection inside FTS5 rather than a join.
+- ``scan_nodes_fts`` holds the nodes of each device's last completed scan.
+  Scan results live in shared state, not in the database, so the scan path
+  replaces a device's rows here when it stores a snapshot.  The rowid packs
+  ``device_id << 32 | node index``, which makes dropping or filtering one
+  device's nodes a rowid range.
+
+Queries are tokenized like the index (unicode61 splits on punctuation, so
+``Line0.Tag16`` is ``line0 tag16``); all tokens are required and the last
+one also matches as a prefix.  bm25 ranking costs time per match, so very
+broad queries are ranked within their first ``RANK_WINDOW`` matches.
+Other databases, or SQLite builds without FTS5, leave search unavailable.
+"""
+
+import logging
+import re
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+_NODE_ROWID_SHIFT = 32
+_MAX_ROWID = (1 << 63) - 1
+_INSERT_BATCH = 5000
+RANK_WINDOW = 20000
+# display_name, path, node_id, measurement_name, device
+_TAG_WEIGHTS = "10.0, 4.0, 2.0, 1.0, 0.0"
+# display_name, path, node_id
+_NODE_WEIGHTS = "10.0, 4.0, 2.0"
+_TAG_TEXT_COLUMNS = "{display_name path node_id measurement_name}"
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+_TAG_VALUES = "{0}.display_name, {0}.path, {0}.node_id, {0}.measurement_name, 'd' || {0}.device_id"
+_TAG_COLUMNS = "display_name, path, node_id, measurement_name, device"
+
+_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS tags_fts USING fts5(
+        {_TAG_COLUMNS}, content='', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS tags_fts_insert AFTER INSERT ON tags BEGIN
+        INSERT INTO tags_fts(rowid, {_TAG_COLUMNS}) VALUES (new.id, {_TAG_VALUES.format("new")});
+    END""",
+    # Contentless tables delete by re-sending the indexed values
+    f"""CREATE TRIGGER IF NOT EXISTS tags_fts_delete AFTER DELETE ON tags BEGIN
+        INSERT INTO tags_fts(tags_fts, rowid, {_TAG_COLUMNS}) VALUES ('delete', old.id, {_TAG_VALUES.format("old")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tags_fts_update
+    AFTER UPDATE OF display_name, path, node_id, measurement_name, device_id ON tags BEGIN
+        INSERT INTO tags_fts(tags_fts, rowid, {_TAG_COLUMNS}) VALUES ('delete', old.id, {_TAG_VALUES.format("old")});
+        INSERT INTO tags_fts(rowid, {_TAG_COLUMNS}) VALUES (new.id, {_TAG_VALUES.format("new")});
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS scan_nodes_fts USING fts5(
+        display_name, path, node_id, node_class UNINDEXED, data_type UNINDEXED,
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+]
+
+_available = False
+
+
+def available() -> bool:
+    return _available
+
+
+def ensure_schema(engine) -> bool:
+    """Create the FTS tables and triggers if missing; returns whether search is available.
+
+    Run after the ``tags`` table exists.  A new ``tags_fts`` is filled from
+    the existing tags.
+    """
+    global _available
+    if engine.dialect.name != "sqlite":
+        _available = False
+        return False
+    try:
+        with engine.begin() as conn:
+            existed = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tags_fts'")
+            ).first() is not None
+            for statement in _SCHEMA:
+                conn.execute(text(statement))
+            if not existed:
+                conn.execute(text("INSERT INTO tags_fts(tags_fts, rank) VALUES ('rank', :rank)"),
+                             {"rank": f"bm25({_TAG_WEIGHTS})"})
+                conn.execute(text("INSERT INTO scan_nodes_fts(scan_nodes_fts, rank) VALUES ('rank', :rank)"),
+                             {"rank": f"bm25({_NODE_WEIGHTS})"})
+                conn.execute(text(
+                    f"INSERT INTO tags_fts(rowid, {_TAG_COLUMNS}) SELECT t.id, {_TAG_VALUES.format('t')} FROM tags t"
+                ))
+    except OperationalError as e:
+        logger.warning(f"Full-text search unavailable: {e}")
+        _available = False
+        return False
+    _available = True
+    return True
+
+
+def match_query(query: str) -> Optional[str]:
+    """FTS5 MATCH expression for free text, or None when it has no tokens.
+
+    Exact tokens rank above prefix matches: the last token is searched both
+    ways, so ``motor 42`` puts Motor_42 ahead of Motor_420.
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    if len(tokens[-1]) >= 2:  # single-character prefixes are not indexed
+        terms[-1] = f'({terms[-1]} OR "{tokens[-1]}"*)'
+    return " AND ".join(terms)
+
+
+def tag_match(match: str, device_id: Optional[int] = None) -> str:
+    """``match`` restricted to the tag text columns, and optionally one device."""
+    expr = f"{_TAG_TEXT_COLUMNS} : ({match})"
+    if device_id is not None:
+        expr = f'device : "d{int(device_id)}" AND {expr}'
+    return expr
+
+
+def _node_rowid_range(device_id: int):
+    low = device_id << _NODE_ROWID_SHIFT
+    return low, low + (1 << _NODE_ROWID_SHIFT) - 1
+
+
+def index_scan(engine, device_id: int, nodes: Iterable[dict]) -> int:
+    """Replace a device's scanned nodes in the index; returns how many were indexed."""
+    if not _available:
+        return 0
+    base = device_id << _NODE_ROWID_SHIFT
+    insert = text(
+        "INSERT INTO scan_nodes_fts(rowid, display_name, path, node_id, node_class, data_type) "
+        "VALUES (:rowid, :display_name, :path, :node_id, :node_class, :data_type)"
+    )
+    count = 0
+    with engine.begin() as conn:
+        low, high = _node_rowid_range(device_id)
+        conn.execute(text("DELETE FROM scan_nodes_fts WHERE rowid BETWEEN :low AND :high"),
+                     {"low": low, "high": high})
+        batch = []
+        for idx, node in enumerate(nodes):
+            batch.append({
+                "rowid": base + idx, "display_name": node.get("display_name", ""), "path": node.get("path", ""),
+                "node_id": node.get("node_id", ""), "node_class": node.get("node_class", ""),
+                "data_type": node.get("data_type", ""),
+            })
+            if len(batch) >= _INSERT_BATCH:
+                conn.execute(insert, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            conn.execute(insert, batch)
+            count += len(batch)
+    return count
+
+
+def drop_scan(engine, device_id: int) -> None:
+    if not _available:
+        return
+    low, high = _node_rowid_range(device_id)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM scan_nodes_fts WHERE rowid BETWEEN :low AND :high"),
+                     {"low": low, "high": high})
+
+
+def _ranked(table: str, condition: str) -> str:
+    """Best-ranked rowids, ranking at most ``RANK_WINDOW`` matches (the oldest)."""
+    return f"""
+        SELECT rowid, rank FROM {table} WHERE {condition}
+        AND rowid <= coalesce(
+            (SELECT rowid FROM {table} WHERE {condition} ORDER BY rowid LIMIT 1 OFFSET {RANK_WINDOW}),
+            {_MAX_ROWID})
+        ORDER BY rank LIMIT :limit
+    """
+
+
+def tag_hits_stmt():
+    """Ranked tag hits with their device; binds ``match`` (see ``tag_match``) and ``limit``."""
+    return text(f"""
+        SELECT 'tag' AS kind, h.rank AS rank, t.device_id, d.name AS device_name, t.id AS tag_id,
+               t.node_id, t.display_name, t.path, t.measurement_name, t.data_type, t.enabled,
+               t.scan_class_id, t.telegraf_instance_id
+        FROM ({_ranked("tags_fts", "tags_fts MATCH :match")}) AS h
+        JOIN tags t ON t.id = h.rowid
+        JOIN devices d ON d.id = t.device_id
+        ORDER BY h.rank
+    """)
+
+
+def node_hits_stmt(device_id: Optional[int] = None):
+    """Ranked scanned-node hits with their device; binds ``match``, ``limit`` and ``node_params``."""
+    condition = "scan_nodes_fts MATCH :match"
+    if device_id is not None:
+        condition += " AND rowid BETWEEN :low AND :high"
+    return text(f"""
+        SELECT 'node' AS kind, h.rank AS rank, d.id AS device_id, d.name AS device_name, NULL AS tag_id,
+               n.node_id, n.display_name, n.path, n.node_class, n.data_type
+        FROM ({_ranked("scan_nodes_fts", condition)}) AS h
+        JOIN scan_nodes_fts n ON n.rowid = h.rowid
+        JOIN devices d ON d.id = (h.rowid >> {_NODE_ROWID_SHIFT})
+        ORDER BY h.rank
+    """)
+
+
+def node_params(device_id: Optional[int]) -> dict:
+    if device_id is None:
+        return {}
+    low, high = _node_rowid_range(device_id)
+    return {"low": low, "high": high}
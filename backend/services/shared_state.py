@@ -0,0 +1,375 @@
+"""
+Cross-worker shared state and locks.
+
+Anything that must be consistent across uvicorn workers (scan results, scan
+"in progress" flags, cache generations, deploy/scan locks) goes through a
+``SharedState`` backend instead of module globals.  The interface is the small
+Redis-shaped subset we need: byte values with optional TTL, ``set_nx``,
+compare-and-delete/expire and ``incr``.
+
+Backends are selected with ``STATE_URL``:
+
+- ``sqlite:///path/to/state.db`` (default: ``$DATA_DIR/shared_state.db``) —
+  a WAL-mode SQLite file shared by all workers on the host;
+- ``memory://`` — in-process only (single worker, benchmarks);
+- ``redis://host:port/db`` — Redis or any server speaking its protocol
+  (requires the ``redis`` package).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LockTimeout(RuntimeError):
+    """Raised when a shared lock could not be acquired in time."""
+
+
+class SharedState(ABC):
+    """Backend interface. Keys are strings, values are bytes."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def set_nx(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Set ``key`` only if it does not exist; return whether it was set."""
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        ...
+
+    @abstractmethod
+    def expire_if_equals(self, key: str, value: bytes, ttl: float) -> bool:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        ...
+
+    # ── Helpers built on the primitives ──────────────────────────────────
+
+    def get_json(self, key: str, default: Any = None) -> Any:
+        raw = self.get(key)
+        return default if raw is None else json.loads(raw)
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.set(key, json.dumps(value).encode(), ttl=ttl)
+
+    def get_int(self, key: str) -> int:
+        raw = self.get(key)
+        return int(raw) if raw is not None else 0
+
+    def lock(self, name: str, ttl: float = 30.0) -> "SharedLock":
+        return SharedLock(self, name, ttl=ttl)
+
+    def is_locked(self, name: str) -> bool:
+        return self.get(f"lock:{name}") is not None
+
+
+class SharedLock:
+    """A named lock held across workers.
+
+    The lock is a key holding a random owner token with a TTL, so a crashed
+    worker cannot wedge it forever.  While held, a daemon thread keeps
+    extending the TTL, which makes it safe for long scans and deploys.
+    """
+
+    def __init__(self, state: SharedState, name: str, ttl: float = 30.0):
+        self._state = state
+        self.name = name
+        self._key = f"lock:{name}"
+        self._ttl = ttl
+        self._token = uuid.uuid4().hex.encode()
+        self._held = False
+        self._stop = threading.Event()
+        self._renewer: Optional[threading.Thread] = None
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    def acquire(self, blocking: bool = True, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._state.set_nx(self._key, self._token, ttl=self._ttl):
+                self._held = True
+                self._stop.clear()
+                self._renewer = threading.Thread(
+                    target=self._renew, name=f"lock-{self.name}", daemon=True,
+                )
+                self._renewer.start()
+                return True
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                return False
+            time.sleep(0.1)
+
+    def release(self) -> None:
+        if not self._held:
+            return
+        self._held = False
+        self._stop.set()
+        self._state.delete_if_equals(self._key, self._token)
+
+    def _renew(self) -> None:
+        while not self._stop.wait(self._ttl / 3):
+            try:
+                if not self._state.expire_if_equals(self._key, self._token, self._ttl):
+                    logger.warning(f"Shared lock '{self.name}' was lost")
+                    return
+            except Exception:
+                logger.exception(f"Failed to renew shared lock '{self.name}'")
+
+    def __enter__(self) -> "SharedLock":
+        if not self._held:
+            self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+@contextmanager
+def locked(name: str, timeout: Optional[float] = None, ttl: float = 30.0):
+    """Hold the shared lock ``name`` for the duration of the block.
+
+    Raises LockTimeout if it cannot be acquired within ``timeout`` seconds.
+    """
+    lock = shared_state.lock(name, ttl=ttl)
+    if not lock.acquire(timeout=timeout):
+        raise LockTimeout(f"'{name}' is busy")
+    try:
+        yield lock
+    finally:
+        lock.release()
+
+
+class MemoryState(SharedState):
+    """Process-local backend; only correct with a single worker."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def set_nx(self, key, value, ttl=None):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if_equals(self, key, value):
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            del self._data[key]
+            return True
+
+    def expire_if_equals(self, key, value, ttl):
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            self._data[key] = (value, time.time() + ttl)
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._live(key) or 0) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+
+class SQLiteState(SharedState):
+    """File-backed backend shared by every worker process on the host."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS kv ("
+                        "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+                    )
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def _get(self, conn: sqlite3.Connection, key: str) -> Optional[bytes]:
+        row = conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def get(self, key):
+        return self._get(self._conn(), key)
+
+    def set(self, key, value, ttl=None):
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._expiry(ttl)),
+            )
+
+    def set_nx(self, key, value, ttl=None):
+        with self._write() as conn:
+            if self._get(conn, key) is not None:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._expiry(ttl)),
+            )
+            return True
+
+    def delete(self, key):
+        with self._write() as conn:
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_if_equals(self, key, value):
+        with self._write() as conn:
+            if self._get(conn, key) != value:
+                return False
+            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+            return True
+
+    def expire_if_equals(self, key, value, ttl):
+        with self._write() as conn:
+            if self._get(conn, key) != value:
+                return False
+            conn.execute("UPDATE kv SET expires_at = ? WHERE key = ?", (self._expiry(ttl), key))
+            return True
+
+    def incr(self, key):
+        with self._write() as conn:
+            value = int(self._get(conn, key) or 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, NULL)",
+                (key, str(value).encode()),
+            )
+            return value
+
+
+class RedisState(SharedState):
+    """Backend for Redis (or a compatible local stand-in)."""
+
+    _DELETE_IF_EQUALS = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) else return 0 end"
+    )
+    _EXPIRE_IF_EQUALS = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    )
+
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def set_nx(self, key, value, ttl=None):
+        return bool(self._redis.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def delete_if_equals(self, key, value):
+        return bool(self._redis.eval(self._DELETE_IF_EQUALS, 1, key, value))
+
+    def expire_if_equals(self, key, value, ttl):
+        return bool(self._redis.eval(self._EXPIRE_IF_EQUALS, 1, key, value, int(ttl * 1000)))
+
+    def incr(self, key):
+        return int(self._redis.incr(key))
+
+
+def _default_url() -> str:
+    data_dir = os.environ.get("DATA_DIR", "/app/data")
+    return f"sqlite:///{os.path.join(data_dir, 'shared_state.db')}"
+
+
+def create_state(url: Optional[str] = None) -> SharedState:
+    url = url or os.environ.get("STATE_URL") or _default_url()
+    if url.startswith("memory:"):
+        return MemoryState()
+    if url.startswith("sqlite:///"):
+        return SQLiteState(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisState(url)
+    raise ValueError(f"Unsupported STATE_URL: {url}")
+
+
+shared_state = create_state()
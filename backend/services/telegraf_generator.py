@@ -1,4 +1,16 @@
-from typing import List, Dict, Any
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+
+# Worker processes for render_instances (0 = render in the calling thread)
+RENDER_PROCESSES = int(os.environ.get("RENDER_PROCESSES", "0"))
+# Instances smaller than this are rendered inline even with a pool
+RENDER_POOL_MIN_TAGS = 2000
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
 
 
 def generate_config(
@@ -7,8 +19,13 @@ def generate_config(
     default_influxdb: Any = None,
     scan_cache: Dict[int, Dict] = None,
     default_scan_class: Any = None,
+    metrics_port: Optional[int] = None,
 ) -> str:
-    """Generate a Telegraf configuration file from device and tag data."""
+    """Generate a Telegraf configuration file from device and tag data.
+
+    With ``metrics_port``, the config also exposes Telegraf's own internal
+    metrics on that port (see ``_internal_metrics_lines``).
+    """
 
     config_path = system_config.get("telegraf_config_path", "/etc/telegraf/telegraf.conf")
     influxdb_url = system_config.get("influxdb_url", "http://localhost:8086")
@@ -70,6 +87,9 @@ def generate_config(
         lines.append(f'  bucket = "{influxdb_default_bucket}"')
         if influxdb_url.startswith("https"):
             lines.append("  insecure_skip_verify = true")
+        if metrics_port:
+            lines.append('  alias = "default"')
+            lines.append('  namedrop = ["internal_*"]')
         lines.append("")
     else:
         for cfg in influx_targets.values():
@@ -80,6 +100,9 @@ def generate_config(
             lines.append(f'  bucket = "{cfg.bucket}"')
             if cfg.url.startswith("https"):
                 lines.append("  insecure_skip_verify = true")
+            if metrics_port:
+                lines.append(f'  alias = "{cfg.name}"')
+                lines.append('  namedrop = ["internal_*"]')
             lines.append("")
 
     # OPC UA inputs per device
@@ -106,21 +129,18 @@ def generate_config(
                                  " could not be expanded (no scan data available)")
             else:
                 for ni in enabled_includes:
-                    prefix = ni.parent_path + "/"
-                    for node in cached_nodes:
-                        node_path = node.get("path", "")
-                        if node_path.startswith(prefix) or node_path == ni.parent_path:
-                            expanded_from_includes.append({
-                                "node_id": node["node_id"],
-                                "display_name": node["display_name"],
-                                "namespace": node["namespace"],
-                                "identifier": node["identifier"],
-                                "identifier_type": node.get("identifier_type", "s"),
-                                "measurement_name": ni.measurement_name,
-                                "scan_class": ni.scan_class,
-                                "scan_class_id": ni.scan_class_id,
-                                "path": node.get("path", ""),
-                            })
+                    for node in _nodes_under(cached_nodes, ni.parent_path):
+                        expanded_from_includes.append({
+                            "node_id": node["node_id"],
+                            "display_name": node["display_name"],
+                            "namespace": node["namespace"],
+                            "identifier": node["identifier"],
+                            "identifier_type": node.get("identifier_type", "s"),
+                            "measurement_name": ni.measurement_name,
+                            "scan_class": ni.scan_class,
+                            "scan_class_id": ni.scan_class_id,
+                            "path": node.get("path", ""),
+                        })
 
         # Build combined tag list grouped by scan class
         by_scan_class: Dict[str, List[Any]] = {}
@@ -157,6 +177,9 @@ def generate_config(
 
             lines.append("[[inputs.opcua]]")
             lines.append(f'  name = "{safe_name}_{sc_name}"')
+            if metrics_port:
+                # Distinguishes the opcua inputs in internal_gather metrics
+                lines.append(f'  alias = "{safe_name}_{sc_name}"')
             lines.append(f'  endpoint = "{device.endpoint_url}"')
             if device.username:
                 lines.append(f'  username = "{device.username}"')
@@ -204,6 +227,9 @@ def generate_config(
 
         lines.append("")
 
+    if metrics_port:
+        lines.extend(_internal_metrics_lines(metrics_port))
+
     # Append passthrough sections (imported non-OPC-UA config)
     passthrough = system_config.get("telegraf_passthrough", "")
     if passthrough and passthrough.strip():
@@ -223,6 +249,7 @@ def generate_config_from_tags(
     default_influxdb: Any = None,
     scan_cache: Dict[int, Dict] = None,
     default_scan_class: Any = None,
+    metrics_port: Optional[int] = None,
 ) -> str:
     """Generate a Telegraf config from a flat list of Tag objects (per-tag instance assignment).
 
@@ -292,6 +319,9 @@ def generate_config_from_tags(
         lines.append(f'  bucket = "{influxdb_default_bucket}"')
         if influxdb_url.startswith("https"):
             lines.append("  insecure_skip_verify = true")
+        if metrics_port:
+            lines.append('  alias = "default"')
+            lines.append('  namedrop = ["internal_*"]')
         lines.append("")
     else:
         for cfg in influx_targets.values():
@@ -302,6 +332,9 @@ def generate_config_from_tags(
             lines.append(f'  bucket = "{cfg.bucket}"')
             if cfg.url.startswith("https"):
                 lines.append("  insecure_skip_verify = true")
+            if metrics_port:
+                lines.append(f'  alias = "{cfg.name}"')
+                lines.append('  namedrop = ["internal_*"]')
             lines.append("")
 
     # OPC UA inputs per device
@@ -325,6 +358,9 @@ def generate_config_from_tags(
 
             lines.append("[[inputs.opcua]]")
             lines.append(f'  name = "{safe_name}_{sc_name}"')
+            if metrics_port:
+                # Distinguishes the opcua inputs in internal_gather metrics
+                lines.append(f'  alias = "{safe_name}_{sc_name}"')
             lines.append(f'  endpoint = "{device.endpoint_url}"')
             if device.username:
                 lines.append(f'  username = "{device.username}"')
@@ -364,6 +400,9 @@ def generate_config_from_tags(
 
         lines.append("")
 
+    if metrics_port:
+        lines.extend(_internal_metrics_lines(metrics_port))
+
     # Passthrough sections
     passthrough = system_config.get("telegraf_passthrough", "")
     if passthrough and passthrough.strip():
@@ -386,6 +425,8 @@ def generate_instance_configs(
 ) -> Dict[int, Dict[str, Any]]:
     """Generate configs for each TelegrafInstance.
 
+    Load ``instances`` with ``config_loading.load_instances``.
+
     Returns {instance_id: {"name": str, "config": str, "device_count": int, "tag_count": int}}
     """
     result = {}
@@ -397,6 +438,7 @@ def generate_instance_configs(
         config = generate_config(
             devices, system_config, default_influxdb,
             scan_cache=scan_cache, default_scan_class=default_scan_class,
+            metrics_port=instance_metrics_port(system_config, instance.id),
         )
         result[instance.id] = {
             "name": instance.name,
@@ -407,6 +449,56 @@ def generate_instance_configs(
     return result
 
 
+def _render_pool(processes: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=processes, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _render_tags(tags, system_config, default_influxdb, default_scan_class, metrics_port) -> str:
+    return generate_config_from_tags(
+        tags, system_config, default_influxdb,
+        default_scan_class=default_scan_class, metrics_port=metrics_port,
+    )
+
+
+def render_instances(
+    groups: Iterable[Tuple[int, List[Any]]],
+    system_config: Dict[str, str],
+    default_influxdb: Any = None,
+    default_scan_class: Any = None,
+    processes: int = RENDER_PROCESSES,
+) -> Dict[int, Dict[str, Any]]:
+    """Render ``(instance_id, tags)`` groups, e.g. from ``config_loading.group_instance_tags``.
+
+    With ``processes`` > 1, instances of ``RENDER_POOL_MIN_TAGS`` tags or more
+    are rendered in a process pool while the next groups are still being
+    read; tags and defaults must then be picklable (``config_loading`` rows).
+
+    Returns {instance_id: {"config": str, "device_count": int, "tag_count": int}}
+    """
+    result: Dict[int, Dict[str, Any]] = {}
+    pending = {}
+    pool = _render_pool(processes) if processes > 1 else None
+    for instance_id, tags in groups:
+        result[instance_id] = {
+            "device_count": len(set(t.device_id for t in tags)),
+            "tag_count": len(tags),
+        }
+        args = (tags, system_config, default_influxdb, default_scan_class,
+                instance_metrics_port(system_config, instance_id))
+        if pool is not None and len(tags) >= RENDER_POOL_MIN_TAGS:
+            pending[instance_id] = pool.submit(_render_tags, *args)
+        else:
+            result[instance_id]["config"] = _render_tags(*args)
+    for instance_id, future in pending.items():
+        result[instance_id]["config"] = future.result()
+    return result
+
+
 def suggest_splits(
     devices: List[Any],
     max_tags_per_instance: int = 5000,
@@ -494,6 +586,43 @@ def suggest_splits(
     return suggestions
 
 
+def instance_metrics_port(system_config: Dict[str, str], instance_id: int) -> Optional[int]:
+    """Port of an instance's internal-metrics endpoint, or None when the option is off.
+
+    Instances run with host networking, so each gets its own port
+    (``telegraf_metrics_base_port`` + instance id).
+    """
+    if system_config.get("telegraf_internal_metrics", "false").lower() != "true":
+        return None
+    return int(system_config.get("telegraf_metrics_base_port", "9273")) + instance_id
+
+
+def _internal_metrics_lines(port: int) -> List[str]:
+    """Telegraf's self-metrics, served only to the local Prometheus endpoint."""
+    return [
+        "[[inputs.internal]]",
+        "  collect_memstats = false",
+        "",
+        "[[outputs.prometheus_client]]",
+        f'  listen = ":{port}"',
+        "  metric_version = 2",
+        '  collectors_exclude = ["gocollector", "process"]',
+        '  namepass = ["internal_*"]',
+        "",
+    ]
+
+
+def _nodes_under(cached_nodes, parent_path: str) -> List[Dict]:
+    """Scan-cache nodes at or below ``parent_path`` (ScanSnapshot or plain list)."""
+    if hasattr(cached_nodes, "nodes_under"):
+        return cached_nodes.nodes_under(parent_path)
+    prefix = parent_path + "/"
+    return [
+        node for node in cached_nodes
+        if node.get("path", "").startswith(prefix) or node.get("path", "") == parent_path
+    ]
+
+
 def _ms_to_duration(ms: int) -> str:
     if ms < 1000:
         return f"{ms}ms"
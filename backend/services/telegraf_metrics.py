@@ -0,0 +1,273 @@
+"""Scrape Telegraf's own metrics from deployed instances.
+
+With ``telegraf_internal_metrics`` enabled, every generated config carries
+``[[inputs.internal]]`` and a ``prometheus_client`` output on the instance's
+metrics port (see ``telegraf_generator.instance_metrics_port``).  This module
+scrapes those endpoints and turns them into per-instance summaries:
+
+- gather time of each opcua input against its scan-class interval
+- metrics dropped, buffer fullness and write errors per output
+
+Counters are compared against the previous scrape (kept in shared state, so
+any worker sees the same deltas) and problems are returned as warnings.
+"""
+
+import logging
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_TIMEOUT = 3
+
+# Gather time as a share of the input interval
+OVERRUN_RISK = 0.8
+OVERRUN = 1.0
+# Output buffer fullness
+BUFFER_WARN = 0.8
+
+_LINE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)(?:\s+\d+)?$")
+_LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+_UNESCAPE = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+
+
+def parse_prometheus(text: str) -> List[Tuple[str, Dict[str, str], float]]:
+    """Samples of a Prometheus text exposition as ``(name, labels, value)``."""
+    samples = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        name, raw_labels, raw_value = match.groups()
+        try:
+            value = float(raw_value)
+        except ValueError:
+            continue
+        labels = {
+            key: re.sub(r'\\[\\"n]', lambda m: _UNESCAPE[m.group(0)], val)
+            for key, val in _LABEL_RE.findall(raw_labels or "")
+        }
+        samples.append((name, labels, value))
+    return samples
+
+
+def metrics_host(system_config: Dict[str, str]) -> str:
+    """Host the instances' metrics ports are reachable on from this process.
+
+    Telegraf containers run with host networking, so the ports are on the
+    Docker host: the remote daemon's host in remote mode, otherwise the local
+    host (``host.docker.internal`` when FluxForge itself runs in a container).
+    """
+    host = system_config.get("telegraf_metrics_host", "").strip()
+    if host:
+        return host
+    if system_config.get("docker_connection_mode", "local") == "remote":
+        remote = urllib.parse.urlparse(system_config.get("docker_remote_host", ""))
+        if remote.hostname:
+            return remote.hostname
+    if os.path.exists("/.dockerenv"):
+        return "host.docker.internal"
+    return "127.0.0.1"
+
+
+def scrape(url: str, timeout: float = SCRAPE_TIMEOUT) -> List[Tuple[str, Dict[str, str], float]]:
+    req = urllib.request.Request(url, headers={"Accept": "text/plain"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return parse_prometheus(resp.read().decode("utf-8", errors="replace"))
+
+
+def summarize(samples: Iterable[Tuple[str, Dict[str, str], float]],
+              intervals_ms: Dict[str, int]) -> Dict:
+    """Per-input and per-output figures from one scrape.
+
+    ``intervals_ms`` maps input aliases (``{device}_{scan class}``) to their
+    configured interval.
+    """
+    inputs: Dict[str, Dict] = {}
+    outputs: Dict[str, Dict] = {}
+    agent: Dict[str, float] = {}
+    for name, labels, value in samples:
+        if name.startswith("internal_gather_"):
+            if labels.get("input") != "opcua":
+                continue
+            key = labels.get("alias") or labels.get("input", "")
+            field = name[len("internal_gather_"):]
+            inputs.setdefault(key, {})[field] = inputs.get(key, {}).get(field, 0) + value
+        elif name.startswith("internal_write_"):
+            if labels.get("output") == "prometheus_client":
+                continue
+            key = labels.get("alias") or labels.get("output", "")
+            outputs.setdefault(key, {"output": labels.get("output", "")})[name[len("internal_write_"):]] = value
+        elif name.startswith("internal_agent_"):
+            agent[name[len("internal_agent_"):]] = value
+
+    input_rows = []
+    for alias, fields in sorted(inputs.items()):
+        interval_ms = intervals_ms.get(alias)
+        gather_ms = fields.get("gather_time_ns", 0) / 1e6
+        input_rows.append({
+            "alias": alias,
+            "interval_ms": interval_ms,
+            "gather_time_ms": round(gather_ms, 3),
+            "utilization": round(gather_ms / interval_ms, 3) if interval_ms else None,
+            "metrics_gathered": int(fields.get("metrics_gathered", 0)),
+            "errors": int(fields.get("errors", 0)),
+        })
+
+    output_rows = []
+    for alias, fields in sorted(outputs.items()):
+        limit = fields.get("buffer_limit", 0)
+        output_rows.append({
+            "alias": alias,
+            "output": fields["output"],
+            "buffer_size": int(fields.get("buffer_size", 0)),
+            "buffer_limit": int(limit),
+            "buffer_fullness": round(fields.get("buffer_size", 0) / limit, 3) if limit else None,
+            "metrics_written": int(fields.get("metrics_written", 0)),
+            "metrics_dropped": int(fields.get("metrics_dropped", 0)),
+            "errors": int(fields.get("errors", 0)),
+            "write_time_ms": round(fields.get("write_time_ns", 0) / 1e6, 3),
+        })
+    return {"inputs": input_rows, "outputs": output_rows,
+            "agent": {k: int(v) for k, v in sorted(agent.items())}}
+
+
+def _counters(summary: Dict) -> Dict[str, int]:
+    counters = {}
+    for row in summary["inputs"]:
+        counters[f"in:{row['alias']}:errors"] = row["errors"]
+        counters[f"in:{row['alias']}:metrics_gathered"] = row["metrics_gathered"]
+    for row in summary["outputs"]:
+        for field in ("metrics_dropped", "errors", "metrics_written"):
+            counters[f"out:{row['alias']}:{field}"] = row[field]
+    return counters
+
+
+def _apply_deltas(instance_id: int, summary: Dict, now: float) -> Optional[float]:
+    """Add ``*_delta`` fields against the previous scrape; returns its age in seconds.
+
+    A counter lower than before means Telegraf restarted; the current value
+    is then taken as the delta.
+    """
+    key = f"telegraf-metrics:{instance_id}"
+    previous = shared_state.get_json(key) or {}
+    counters = _counters(summary)
+    shared_state.set_json(key, {"at": now, "counters": counters}, ttl=3600)
+    prev_counters = previous.get("counters")
+    if prev_counters is None:
+        return None
+
+    def delta(name: str, value: int) -> int:
+        before = prev_counters.get(name)
+        if before is None:
+            return 0
+        return value - before if value >= before else value
+
+    for row in summary["inputs"]:
+        row["errors_delta"] = delta(f"in:{row['alias']}:errors", row["errors"])
+        row["metrics_gathered_delta"] = delta(f"in:{row['alias']}:metrics_gathered", row["metrics_gathered"])
+    for row in summary["outputs"]:
+        for field in ("metrics_dropped", "errors", "metrics_written"):
+            row[f"{field}_delta"] = delta(f"out:{row['alias']}:{field}", row[field])
+    return now - previous.get("at", now)
+
+
+def _warnings(summary: Dict) -> List[Dict]:
+    warnings = []
+    for row in summary["inputs"]:
+        util = row["utilization"]
+        if util is not None and util >= OVERRUN:
+            warnings.append({
+                "severity": "error", "kind": "overrun", "subject": row["alias"],
+                "message": f"{row['alias']}: gather takes {row['gather_time_ms']:.0f} ms "
+                           f"for a {row['interval_ms']} ms interval",
+            })
+        elif util is not None and util >= OVERRUN_RISK:
+            warnings.append({
+                "severity": "warning", "kind": "overrun_risk", "subject": row["alias"],
+                "message": f"{row['alias']}: gather uses {util:.0%} of its {row['interval_ms']} ms interval",
+            })
+        if row.get("errors_delta"):
+            warnings.append({
+                "severity": "warning", "kind": "gather_errors", "subject": row["alias"],
+                "message": f"{row['alias']}: {row['errors_delta']} gather errors since the last check",
+            })
+    for row in summary["outputs"]:
+        if row.get("metrics_dropped_delta"):
+            warnings.append({
+                "severity": "error", "kind": "dropped", "subject": row["alias"],
+                "message": f"{row['alias']}: {row['metrics_dropped_delta']} metrics dropped since the last check",
+            })
+        if row["buffer_fullness"] is not None and row["buffer_fullness"] >= BUFFER_WARN:
+            warnings.append({
+                "severity": "warning", "kind": "buffer", "subject": row["alias"],
+                "message": f"{row['alias']}: output buffer {row['buffer_fullness']:.0%} full "
+                           f"({row['buffer_size']}/{row['buffer_limit']})",
+            })
+        if row.get("errors_delta"):
+            warnings.append({
+                "severity": "warning", "kind": "write_errors", "subject": row["alias"],
+                "message": f"{row['alias']}: {row['errors_delta']} write errors since the last check",
+            })
+    return warnings
+
+
+def _split_hint(summary: Dict, warnings: List[Dict]) -> Optional[str]:
+    overrun = [w["subject"] for w in warnings if w["kind"] in ("overrun", "overrun_risk")]
+    if overrun:
+        return (f"{len(overrun)} of {len(summary['inputs'])} inputs are close to or over their interval; "
+                f"consider moving them to a separate instance or a slower scan class")
+    if any(w["kind"] in ("dropped", "buffer") for w in warnings):
+        return ("The outputs cannot keep up; consider splitting the instance or raising "
+                "agent_metric_buffer_limit / agent_metric_batch_size")
+    return None
+
+
+def collect_instance(instance_id: int, name: str, url: str, intervals_ms: Dict[str, int]) -> Dict:
+    """Scrape and summarize one instance; unreachable endpoints are reported, not raised."""
+    result = {"instance_id": instance_id, "instance_name": name, "url": url}
+    try:
+        samples = scrape(url)
+    except (urllib.error.URLError, OSError) as e:
+        reason = getattr(e, "reason", e)
+        return {**result, "reachable": False, "error": str(reason), "warnings": [], "split_hint": None}
+
+    now = time.time()
+    summary = summarize(samples, intervals_ms)
+    since = _apply_deltas(instance_id, summary, now)
+    warnings = _warnings(summary)
+    return {
+        **result,
+        "reachable": True,
+        "scraped_at": now,
+        "seconds_since_previous": round(since, 1) if since is not None else None,
+        **summary,
+        "warnings": warnings,
+        "split_hint": _split_hint(summary, warnings),
+    }
+
+
+def collect(targets: List[Dict]) -> List[Dict]:
+    """Scrape several instances concurrently.
+
+    Each target is a dict with ``instance_id``, ``instance_name``, ``url`` and
+    ``intervals_ms``.
+    """
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(targets), 16)) as pool:
+        return list(pool.map(
+            lambda t: collect_instance(t["instance_id"], t["instance_name"], t["url"], t["intervals_ms"]),
+            targets,
+        ))
@@ -1,9 +1,24 @@
 """Parse an existing telegraf.conf and extract InfluxDB targets, OPC-UA devices/tags,
-and passthrough sections (everything else)."""
+and passthrough sections (everything else).
+
+Parsing is two-tier: the whole file goes through the stdlib ``tomllib`` to
+pull out outputs and OPC-UA nodes, and only the source ranges of passthrough
+sections are handed to ``tomlkit`` for round-tripping.  ``tomlkit`` is
+style-preserving but tens of times slower and far more memory-hungry, which
+matters for legacy configs with tens of thousands of nodes.  The full-``tomlkit`` path is kept as a
+fallback for files ``tomllib`` rejects or the section splitter cannot handle.
+"""
+
+import re
+import tomllib
+from typing import List, Optional, Tuple
 
 import tomlkit
 from tomlkit.items import AoT, Table, Array
 
+# Sections consumed by the importer; everything else is passthrough
+_SKIP_SECTIONS = {("agent",), ("outputs", "influxdb_v2"), ("outputs", "influxdb"), ("inputs", "opcua")}
+
 
 def parse_telegraf_config(toml_string: str) -> dict:
     """Parse a Telegraf TOML config string.
@@ -15,7 +30,17 @@ def parse_telegraf_config(toml_string: str) -> dict:
         passthrough_sections - raw TOML string for non-OPC-UA / non-InfluxDB sections
         warnings          - list of warning strings
     """
-    warnings = []
+    try:
+        data = tomllib.loads(toml_string)
+        passthrough_doc = tomlkit.parse(_passthrough_source(toml_string))
+    except Exception:
+        # tomllib is stricter than tomlkit in a few corners; keep the old behaviour
+        return _parse_telegraf_config_tomlkit(toml_string)
+    return _build_result(data, passthrough_doc)
+
+
+def _parse_telegraf_config_tomlkit(toml_string: str) -> dict:
+    """Single-tier parse of the whole document with tomlkit."""
     try:
         doc = tomlkit.parse(toml_string)
     except Exception as e:
@@ -25,10 +50,31 @@ def parse_telegraf_config(toml_string: str) -> dict:
             "passthrough_sections": "",
             "warnings": [f"TOML parse error: {e}"],
         }
+    return _build_result(doc, doc)
+
+
+def _build_result(doc, passthrough_doc) -> dict:
+    warnings = []
+    influxdb_configs, devices = _extract_targets(doc, warnings)
+
+    # --- Collect passthrough sections (everything not agent, outputs.influxdb*, inputs.opcua) ---
+    passthrough_parts = _extract_passthrough(passthrough_doc)
+
+    if not influxdb_configs and not devices:
+        warnings.append("No InfluxDB outputs or OPC-UA inputs found in the config")
+
+    return {
+        "influxdb_configs": influxdb_configs,
+        "devices": devices,
+        "passthrough_sections": "\n".join(passthrough_parts),
+        "warnings": warnings,
+    }
+
 
+def _extract_targets(doc, warnings: list) -> tuple:
+    """InfluxDB outputs and OPC-UA devices from a parsed document (tomllib or tomlkit)."""
     influxdb_configs = []
     devices = []
-    passthrough_parts = []
 
     # --- Extract outputs.influxdb_v2 ---
     outputs = doc.get("outputs", {})
@@ -182,18 +228,89 @@ def parse_telegraf_config(toml_string: str) -> dict:
                 "tags": tags,
             })
 
-    # --- Collect passthrough sections (everything not agent, outputs.influxdb*, inputs.opcua) ---
-    passthrough_parts = _extract_passthrough(doc)
+    return influxdb_configs, devices
 
-    if not influxdb_configs and not devices:
-        warnings.append("No InfluxDB outputs or OPC-UA inputs found in the config")
 
-    return {
-        "influxdb_configs": influxdb_configs,
-        "devices": devices,
-        "passthrough_sections": "\n".join(passthrough_parts),
-        "warnings": warnings,
-    }
+# A header made of bare keys only; anything fancier is parsed with tomllib
+_SIMPLE_HEADER_RE = re.compile(
+    r"\[\[?\s*([A-Za-z0-9_-]+(?:\s*\.\s*[A-Za-z0-9_-]+)*)\s*\]\]?\s*(?:#.*)?$"
+)
+_TOKEN_RE = re.compile(r'"""|\'\'\'|"(?:[^"\\]|\\.)*"|\'[^\']*\'|#|[\[\]{}]')
+_ML_END_RE = {'"""': re.compile(r'(?<!\\)(?:\\\\)*"""'), "'''": re.compile("'''")}
+
+
+def _header_path(line: str) -> Optional[Tuple[str, ...]]:
+    """Key path of a ``[table]`` / ``[[array.of.tables]]`` header line, else None."""
+    m = _SIMPLE_HEADER_RE.match(line)
+    if m:
+        return tuple(k.strip() for k in m.group(1).split("."))
+    try:
+        node = tomllib.loads(line)
+    except tomllib.TOMLDecodeError:
+        return None
+    path = []
+    while isinstance(node, dict) and len(node) == 1:
+        key, node = next(iter(node.items()))
+        path.append(key)
+        if isinstance(node, list):
+            node = node[-1] if node else {}
+    return tuple(path) if path else None
+
+
+def _split_sections(toml_string: str) -> List[Tuple[Tuple[str, ...], int, int]]:
+    """Split TOML source into ``(header path, start, end)`` character ranges.
+
+    The first range has the empty path and holds the root table.  Headers are
+    only recognised outside strings and bracketed values, so a line of a
+    multi-line array or string can never be mistaken for one.
+    """
+    sections = []
+    path, start = (), 0
+    depth = 0
+    ml = None  # open multi-line string delimiter
+    pos = 0
+    for line in toml_string.split("\n"):
+        line_len = len(line) + 1
+        if ml is None and depth == 0:
+            stripped = line.strip()
+            if stripped.startswith("["):
+                header = _header_path(stripped)
+                if header is not None:
+                    sections.append((path, start, pos))
+                    path, start = header, pos
+                    pos += line_len
+                    continue
+        i = 0
+        while True:
+            if ml is not None:
+                m = _ML_END_RE[ml].search(line, i)
+                if m is None:
+                    break
+                i, ml = m.end(), None
+            m = _TOKEN_RE.search(line, i)
+            if m is None:
+                break
+            tok, i = m.group(), m.end()
+            if tok == "#":
+                break
+            if tok in ('"""', "'''"):
+                ml = tok
+            elif tok in ("[", "{"):
+                depth += 1
+            elif tok in ("]", "}"):
+                depth -= 1
+        pos += line_len
+    sections.append((path, start, min(pos, len(toml_string))))
+    return sections
+
+
+def _passthrough_source(toml_string: str) -> str:
+    """Concatenated source of every section the importer does not consume."""
+    return "".join(
+        toml_string[start:end] if toml_string[start:end].endswith("\n") else toml_string[start:end] + "\n"
+        for path, start, end in _split_sections(toml_string)
+        if start < end and path[:1] not in _SKIP_SECTIONS and path[:2] not in _SKIP_SECTIONS
+    )
 
 
 def _name_from_endpoint(endpoint: str) -> str:
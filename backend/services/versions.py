@@ -0,0 +1,98 @@
+"""
+Data version counters for conditional GETs.
+
+Every committed change to the tables the config and tag endpoints read from
+bumps a counter in shared state, so all workers agree on the current
+versions and an ``ETag`` can be built from a few integer reads, without
+querying or rendering anything:
+
+- ``config``: system settings, InfluxDB targets, scan classes, devices and
+  Telegraf instances (renamed, re-targeted, enabled...); read by everything
+- ``tags``: bulk tag statements whose rows are not known (``Query.delete``,
+  ``insert(Tag)`` with a parameter list...); read by everything tag-derived
+- ``device-tags:{id}`` / ``instance:{id}``: ORM tag changes, by the device
+  and the instance(s) the tag belongs or belonged to
+- ``instances``: bumped with any ``instance:{id}``, for the all-configs view
+
+Changes are collected from each flush and bumped once the session commits;
+a rollback discards them.  Writers that know better can add keys with
+``mark`` and run their bulk statements with
+``execution_options(versions_marked=True)`` to skip the table-wide bump.
+"""
+
+from typing import Iterable, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+import models
+from services.shared_state import shared_state
+
+_PENDING = "version_keys"
+
+_CONFIG_MODELS = (
+    models.SystemConfig, models.InfluxDBConfig, models.ScanClass, models.Device, models.TelegrafInstance,
+)
+
+
+def _key(name: str) -> str:
+    return f"version:{name}"
+
+
+def current(*names: str) -> Tuple[int, ...]:
+    """Current values of the given counters (0 for never bumped)."""
+    return tuple(shared_state.get_int(_key(name)) for name in names)
+
+
+def bump(*names: str) -> None:
+    for name in names:
+        shared_state.incr(_key(name))
+
+
+def mark(session: Session, *names: str) -> None:
+    """Bump ``names`` when ``session`` commits."""
+    pending = session.info.setdefault(_PENDING, set())
+    for name in names:
+        pending.add(name)
+        if name.startswith("instance:"):
+            pending.add("instances")
+
+
+def _attr_values(obj, attr: str) -> Iterable:
+    """Old and new values of an attribute, without loading anything."""
+    return [v for v in inspect(obj).attrs[attr].history.sum() if v is not None]
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, _CONFIG_MODELS):
+            mark(session, "config")
+        elif isinstance(obj, models.Tag):
+            mark(session, *(f"device-tags:{v}" for v in _attr_values(obj, "device_id")))
+            mark(session, *(f"instance:{v}" for v in _attr_values(obj, "telegraf_instance_id")))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if orm_execute_state.execution_options.get("versions_marked"):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    if issubclass(mapper.class_, _CONFIG_MODELS):
+        mark(orm_execute_state.session, "config")
+    elif mapper.class_ is models.Tag:
+        mark(orm_execute_state.session, "tags")
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    bump(*session.info.pop(_PENDING, ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    session.info.pop(_PENDING, None)
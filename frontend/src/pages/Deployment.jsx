@@ -132,6 +132,9 @@ export default function Deployment() {
       docker_tls_ca_path: settings.docker_tls_ca_path || '',
       docker_tls_cert_path: settings.docker_tls_cert_path || '',
       docker_tls_key_path: settings.docker_tls_key_path || '',
+      telegraf_internal_metrics: settings.telegraf_internal_metrics || false,
+      telegraf_metrics_base_port: settings.telegraf_metrics_base_port || 9273,
+      telegraf_metrics_host: settings.telegraf_metrics_host || '',
     })
     setTestResult(null)
     setSettingsOpen(true)
@@ -587,6 +590,43 @@ export default function Deployment() {
                 }
               </p>
             </div>
+
+            <label className="flex items-center gap-2 text-sm text-gray-400 cursor-pointer">
+              <input
+                type="checkbox"
+                checked={settingsForm.telegraf_internal_metrics || false}
+                onChange={(e) => setSettingsForm(f => ({ ...f, telegraf_internal_metrics: e.target.checked }))}
+                className="checkbox checkbox-sm"
+              />
+              Expose Telegraf internal metrics
+            </label>
+
+            {settingsForm.telegraf_internal_metrics && (
+              <div className="grid grid-cols-2 gap-3 pl-6">
+                <div>
+                  <label className="block text-xs font-medium text-gray-400 mb-1">Base Port</label>
+                  <input
+                    type="number"
+                    value={settingsForm.telegraf_metrics_base_port || ''}
+                    onChange={(e) => setSettingsForm(f => ({ ...f, telegraf_metrics_base_port: parseInt(e.target.value) || 9273 }))}
+                    className="input w-full text-sm"
+                  />
+                </div>
+                <div>
+                  <label className="block text-xs font-medium text-gray-400 mb-1">Metrics Host</label>
+                  <input
+                    type="text"
+                    value={settingsForm.telegraf_metrics_host || ''}
+                    onChange={(e) => setSettingsForm(f => ({ ...f, telegraf_metrics_host: e.target.value }))}
+                    className="input w-full text-sm"
+                    placeholder="auto"
+                  />
+                </div>
+                <p className="col-span-2 text-xs text-gray-500">
+                  Each instance serves its metrics on base port + instance id. Redeploy instances after changing this.
+                </p>
+              </div>
+            )}
           </div>
 
           <div className="flex justify-end gap-2 pt-2 border-t border-gray-700">
@@ -7,7 +7,7 @@ import {
 } from 'lucide-react'
 import {
   listDevices, getDeviceTags, saveDeviceTags, listScanClasses,
-  patchTag, deleteTag, getScanStatus, startScan, readTagValues,
+  patchTag, bulkUpdateTags, deleteTag, getScanStatus, startScan, openLiveValues,
   getDeviceNodeIncludes, createNodeInclude, patchNodeInclude, deleteNodeInclude as deleteNodeIncludeApi,
   listTelegrafInstances,
 } from '../services/api'
@@ -231,7 +231,7 @@ export default function TagManagement() {
   // Live values
   const [liveValues, setLiveValues] = useState({})  // { "node_id": { value, status, timestamp } }
   const [liveEnabled, setLiveEnabled] = useState(false)
-  const liveIntervalRef = useRef(null)
+  const liveSocketsRef = useRef(new Map())  // device_id -> live value socket
 
   // Column resize — tree layout
   const { widths: treeColWidths, onMouseDown: onTreeColResize } = useResizableColumns([
@@ -450,43 +450,49 @@ export default function TagManagement() {
   // Build tree from filtered data
   const tree = useMemo(() => buildTree(filtered), [filtered])
 
-  // Live value polling — only poll tags visible in expanded tree branches
-  const fetchLiveValues = useCallback(async () => {
-    if (!devices.length || !mergedTags.length) return
+  // Live values — one WebSocket per device, only for tags visible in expanded tree branches
+  const liveNodeIdsByDevice = useMemo(() => {
+    const byDevice = new Map()
+    if (!liveEnabled || !devices.length || !mergedTags.length) return byDevice
     const tagsToRead = groupBy === 'tree'
       ? getVisibleLeafTags(tree, expanded)
       : mergedTags
-    if (!tagsToRead.length) return
-    const byDevice = new Map()
     for (const t of tagsToRead) {
       if (!byDevice.has(t.device_id)) byDevice.set(t.device_id, [])
       byDevice.get(t.device_id).push(t.node_id)
     }
-    const allValues = {}
-    await Promise.all([...byDevice.entries()].map(async ([deviceId, nodeIds]) => {
-      try {
-        const vals = await readTagValues(deviceId, nodeIds)
-        Object.assign(allValues, vals)
-      } catch { /* device offline — skip */ }
-    }))
-    setLiveValues(allValues)
-  }, [devices, mergedTags, groupBy, tree, expanded])
+    return byDevice
+  }, [liveEnabled, devices, mergedTags, groupBy, tree, expanded])
 
   useEffect(() => {
-    if (liveIntervalRef.current) {
-      clearInterval(liveIntervalRef.current)
-      liveIntervalRef.current = null
-    }
-    if (liveEnabled) {
-      fetchLiveValues()
-      liveIntervalRef.current = setInterval(fetchLiveValues, 5000)
-    } else {
-      setLiveValues({})
+    const sockets = liveSocketsRef.current
+    for (const [deviceId, socket] of sockets.entries()) {
+      if (!liveNodeIdsByDevice.has(deviceId)) {
+        socket.close()
+        sockets.delete(deviceId)
+      }
     }
-    return () => {
-      if (liveIntervalRef.current) clearInterval(liveIntervalRef.current)
+    for (const [deviceId, nodeIds] of liveNodeIdsByDevice.entries()) {
+      if (sockets.has(deviceId)) {
+        sockets.get(deviceId).update(nodeIds)
+      } else {
+        sockets.set(deviceId, openLiveValues(
+          deviceId, nodeIds,
+          vals => setLiveValues(prev => ({ ...prev, ...vals })),
+          () => { /* device offline — skip */ },
+        ))
+      }
     }
-  }, [liveEnabled, fetchLiveValues])
+  }, [liveNodeIdsByDevice])
+
+  useEffect(() => {
+    if (!liveEnabled) setLiveValues({})
+  }, [liveEnabled])
+
+  useEffect(() => () => {
+    for (const socket of liveSocketsRef.current.values()) socket.close()
+    liveSocketsRef.current.clear()
+  }, [])
 
   // Build node include lookup map: "deviceId:path" -> include record
   const nodeIncludeMap = useMemo(() => {
@@ -720,9 +726,10 @@ export default function TagManagement() {
   }
 
   const handleBulkScanClass = async () => {
-    const scId = bulkScanClass === '__none__' ? null : bulkScanClass ? Number(bulkScanClass) : null
-    const tags = getSelectedTags().filter(t => t.is_collected && t.saved_tag_id)
-    await Promise.all(tags.map(t => patchTag(t.device_id, t.saved_tag_id, { scan_class_id: scId })))
+    if (!bulkScanClass) return
+    const scId = bulkScanClass === '__none__' ? 0 : Number(bulkScanClass)
+    const tagIds = getSelectedTags().filter(t => t.is_collected && t.saved_tag_id).map(t => t.saved_tag_id)
+    if (tagIds.length) await bulkUpdateTags({ tag_ids: tagIds }, { scan_class_id: scId })
     setSelected(new Set())
     setBulkScanClass('')
     await loadAll()
@@ -731,16 +738,16 @@ export default function TagManagement() {
   const handleBulkInstance = async () => {
     const instId = bulkInstance === '__none__' ? 0 : bulkInstance ? Number(bulkInstance) : null
     if (instId === null) return
-    const tags = getSelectedTags().filter(t => t.is_collected && t.saved_tag_id)
-    await Promise.all(tags.map(t => patchTag(t.device_id, t.saved_tag_id, { telegraf_instance_id: instId })))
+    const tagIds = getSelectedTags().filter(t => t.is_collected && t.saved_tag_id).map(t => t.saved_tag_id)
+    if (tagIds.length) await bulkUpdateTags({ tag_ids: tagIds }, { telegraf_instance_id: instId })
     setSelected(new Set())
     setBulkInstance('')
     await loadAll()
   }
 
   const handleBulkEnable = async (enabled) => {
-    const tags = getSelectedTags().filter(t => t.is_collected && t.saved_tag_id)
-    await Promise.all(tags.map(t => patchTag(t.device_id, t.saved_tag_id, { enabled })))
+    const tagIds = getSelectedTags().filter(t => t.is_collected && t.saved_tag_id).map(t => t.saved_tag_id)
+    if (tagIds.length) await bulkUpdateTags({ tag_ids: tagIds }, { enabled })
     setSelected(new Set())
     await loadAll()
   }
@@ -1220,7 +1227,7 @@ export default function TagManagement() {
             }`}
           >
             <Activity size={16} className={liveEnabled ? 'animate-pulse' : ''} />
-            {liveEnabled ? 'Live (5s)' : 'Live Values'}
+            {liveEnabled ? 'Live' : 'Live Values'}
           </button>
           <button
             onClick={refreshAllScans}
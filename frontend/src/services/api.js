@@ -14,23 +14,55 @@ export const testSystemInfluxdb = () => api.post('/system/config/test-influxdb')
 export const getMetrics = () => api.get('/metrics').then(r => r.data)
 
 // Devices
-export const listDevices = () => api.get('/devices').then(r => r.data)
+export const listDevices = () => api.get('/devices', { params: { fast: true } }).then(r => r.data)
 export const createDevice = (data) => api.post('/devices', data).then(r => r.data)
 export const getDevice = (id) => api.get(`/devices/${id}`).then(r => r.data)
 export const updateDevice = (id, data) => api.put(`/devices/${id}`, data).then(r => r.data)
 export const deleteDevice = (id) => api.delete(`/devices/${id}`).then(r => r.data)
 export const testDeviceConnection = (id) => api.post(`/devices/${id}/test-connection`).then(r => r.data)
 export const testDeviceConnectionRaw = (data) => api.post('/devices/test-connection', data).then(r => r.data)
+// [{ node_id, name, base_type }] for every DataType the device's server defines
+export const getDeviceDataTypes = (id, refresh = false) =>
+  api.get(`/devices/${id}/data-types`, { params: refresh ? { refresh: true } : {} }).then(r => r.data)
 export const browseNode = (id, nodeId) =>
   api.post(`/devices/${id}/browse`, null, { params: nodeId ? { node_id: nodeId } : {} }).then(r => r.data)
-export const startScan = (id) => api.post(`/devices/${id}/scan`).then(r => r.data)
+// scope: 'full' (default) or 'includes' to crawl only the device's node include subtrees
+export const startScan = (id, scope) =>
+  api.post(`/devices/${id}/scan`, null, { params: scope ? { scope } : {} }).then(r => r.data)
 export const getScanStatus = (id) => api.get(`/devices/${id}/scan`).then(r => r.data)
+export const getDeviceDiagnostics = (id) => api.get(`/devices/${id}/diagnostics`).then(r => r.data)
 export const clearScan = (id) => api.delete(`/devices/${id}/scan`).then(r => r.data)
 export const readTagValues = (id, nodeIds) => api.post(`/devices/${id}/read-values`, nodeIds).then(r => r.data)
-export const getDeviceTags = (id) => api.get(`/devices/${id}/tags`).then(r => r.data)
+// Live values over a shared OPC UA subscription. Returns { update(nodeIds), close() }.
+export const openLiveValues = (id, nodeIds, onValues, onError) => {
+  const proto = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
+  const ws = new WebSocket(`${proto}//${window.location.host}/api/devices/${id}/live`)
+  let pending = nodeIds
+  ws.onopen = () => ws.send(JSON.stringify({ node_ids: pending }))
+  ws.onmessage = (e) => {
+    const msg = JSON.parse(e.data)
+    if (msg.values) onValues(msg.values)
+    else if (msg.error && onError) onError(msg.error)
+  }
+  return {
+    update: (ids) => {
+      pending = ids
+      if (ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify({ node_ids: ids }))
+    },
+    close: () => ws.close(),
+  }
+}
+export const getDeviceTags = (id) => api.get(`/devices/${id}/tags`, { params: { fast: true } }).then(r => r.data)
+// One keyset page of tags across devices; pass next_cursor back as params.cursor
+export const listTags = (params) =>
+  api.get('/tags', { params: { fast: true, ...params }, paramsSerializer: { indexes: null } }).then(r => r.data)
 export const saveDeviceTags = (id, tags) => api.put(`/devices/${id}/tags`, { tags }).then(r => r.data)
 export const patchTag = (deviceId, tagId, data) =>
   api.patch(`/devices/${deviceId}/tags/${tagId}`, data).then(r => r.data)
+// Set-based update: filter { device_ids, tag_ids, path_prefix, scan_class_id, telegraf_instance_id, enabled }
+export const bulkUpdateTags = (filter, patch) => api.patch('/tags', { filter, patch }).then(r => r.data)
+// Ranked full-text search; params { kind: 'all' | 'tags' | 'nodes', device_id, limit }
+export const searchTags = (q, params) => api.get('/search', { params: { q, ...params } }).then(r => r.data)
 export const deleteTag = (deviceId, tagId) =>
   api.delete(`/devices/${deviceId}/tags/${tagId}`).then(r => r.data)
 
@@ -56,11 +88,13 @@ export const deleteInfluxConfig = (id) => api.delete(`/influxdb/${id}`).then(r =
 export const testInfluxConfig = (id) => api.post(`/influxdb/${id}/test`).then(r => r.data)
 export const testInfluxConnectionRaw = (data) => api.post('/influxdb/test-connection', data).then(r => r.data)
 export const listBuckets = (id) => api.get(`/influxdb/${id}/buckets`).then(r => r.data)
+export const startWriteProbe = (id, data) => api.post(`/influxdb/${id}/write-probe`, data).then(r => r.data)
 
 // Telegraf
 export const getTelegrafConfig = () => api.get('/telegraf/config')
 export const previewTelegrafImport = (content) => api.post('/telegraf/import/preview', { content }).then(r => r.data)
 export const confirmTelegrafImport = (data) => api.post('/telegraf/import/confirm', data).then(r => r.data)
+export const startTelegrafImportJob = (data) => api.post('/telegraf/import/jobs', data).then(r => r.data)
 export const saveTelegrafOverride = (content) => api.put('/telegraf/config/override', { content }).then(r => r.data)
 export const revertTelegrafOverride = () => api.delete('/telegraf/config/override').then(r => r.data)
 
@@ -71,18 +105,39 @@ export const getTelegrafInstance = (id) => api.get(`/telegraf-instances/${id}`).
 export const updateTelegrafInstance = (id, data) => api.put(`/telegraf-instances/${id}`, data).then(r => r.data)
 export const deleteTelegrafInstance = (id) => api.delete(`/telegraf-instances/${id}`).then(r => r.data)
 export const getTelegrafInstanceConfig = (id) => api.get(`/telegraf-instances/${id}/config`)
-export const getAllInstanceConfigs = () => api.get('/telegraf-instances/configs').then(r => r.data)
+export const getAllInstanceConfigs = () => api.get('/telegraf-instances/configs', { params: { fast: true } }).then(r => r.data)
 export const autoCreateInstances = () => api.post('/telegraf-instances/auto-create').then(r => r.data)
+export const validateTelegrafInstance = (id, disableBroken = false) =>
+  api.post(`/telegraf-instances/${id}/validate`, null, { params: { disable_broken: disableBroken } }).then(r => r.data)
 export const getSplitSuggestions = () => api.get('/telegraf-instances/suggest-splits').then(r => r.data)
 
 // Deployment
 export const getDeploymentStatus = () => api.get('/deployment/status').then(r => r.data)
-export const deployInstance = (id) => api.post(`/deployment/instances/${id}/deploy`).then(r => r.data)
+export const deployInstance = (id, params = {}) => api.post(`/deployment/instances/${id}/deploy`, null, { params }).then(r => r.data)
 export const instanceAction = (id, action) => api.post(`/deployment/instances/${id}/action`, { action }).then(r => r.data)
 export const getInstanceLogs = (id, tail = 200) => api.get(`/deployment/instances/${id}/logs`, { params: { tail } }).then(r => r.data)
+export const getInstanceThroughput = (id) => api.get(`/deployment/instances/${id}/throughput`).then(r => r.data)
+export const getThroughput = () => api.get('/deployment/throughput').then(r => r.data)
 export const deployAll = () => api.post('/deployment/deploy-all').then(r => r.data)
 export const getDeploymentSettings = () => api.get('/deployment/settings').then(r => r.data)
 export const updateDeploymentSettings = (data) => api.put('/deployment/settings', data).then(r => r.data)
 export const testDockerConnection = (data) => api.post('/deployment/test-docker', data).then(r => r.data)
 
 export default api
+
+// Background jobs
+export const listJobs = (params) => api.get('/jobs', { params }).then(r => r.data)
+export const getJob = (id) => api.get(`/jobs/${id}`).then(r => r.data)
+export const cancelJob = (id) => api.post(`/jobs/${id}/cancel`).then(r => r.data)
+export const watchJob = (id, onUpdate) => {
+  const source = new EventSource(`/api/jobs/${id}/events`)
+  source.onmessage = (e) => {
+    const job = JSON.parse(e.data)
+    onUpdate(job)
+    if (['complete', 'error', 'cancelled'].includes(job.status)) source.close()
+  }
+  source.onerror = () => source.close()
+  return () => source.close()
+}
+export const startDeployAllJob = (params) => api.post('/deployment/deploy-all/jobs', null, { params }).then(r => r.data)
+export const startRenderConfigsJob = () => api.post('/telegraf-instances/configs/jobs').then(r => r.data)
@@ -4,5 +4,6 @@ set -e
 # Start nginx in the background
 nginx -g "daemon off;" &
 
-# Start the FastAPI backend in the foreground
-exec uvicorn main:app --host 127.0.0.1 --port 8000
+# Start the FastAPI backend in the foreground. Shared state (scan results,
+# locks) lives in $DATA_DIR/shared_state.db, so several workers are safe.
+exec uvicorn main:app --host 127.0.0.1 --port 8000 --workers "${WORKERS:-1}"